@@ -1,19 +1,70 @@
 # 1. Importaciones
-from flask import Flask, render_template, request, redirect, url_for, send_file, flash, session
-import barcode
-from barcode.writer import ImageWriter
-from io import BytesIO
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from reportlab.lib.utils import ImageReader
+from __future__ import annotations
+
+from flask import Flask, render_template, request, redirect, url_for, send_file, flash, session, jsonify, Response
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import dump_options_header
+from itsdangerous import BadSignature, Signer
+from io import BytesIO, TextIOWrapper
 from reportlab.lib.units import mm, cm
-from reportlab.lib.colors import black, HexColor
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
 import os
+import re
+import importlib
 import zipfile
+import threading
+import math
+import time
+import uuid
+import json
+import hashlib
+import shutil
+import csv
+import sqlite3
+import logging
+import unicodedata
+import multiprocessing
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Tuple, Optional
+from functools import lru_cache
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Tuple, Optional
+from urllib.parse import quote
+
+from simbologias import SIMBOLOGIA_DEFECTO, SIMBOLOGIAS, codificar_codigo, obtener_simbologia
+
+class ModuloPerezoso:
+    """
+    Módulo que se importa en el primer acceso a uno de sus atributos.
+    ReportLab y Pillow solo se cargan cuando se dibuja algo,
+    así un worker arranca sin pagar su importación si no llega a generar.
+    """
+    
+    def __init__(self, nombre: str):
+        self._nombre = nombre
+        self._modulo = None
+    
+    def cargar(self):
+        if self._modulo is None:
+            self._modulo = importlib.import_module(self._nombre)
+        return self._modulo
+    
+    def __getattr__(self, atributo: str):
+        return getattr(self.cargar(), atributo)
+
+# Dependencias pesadas de dibujo (ver precalentar)
+Image = ModuloPerezoso('PIL.Image')
+ImageDraw = ModuloPerezoso('PIL.ImageDraw')
+ImageFont = ModuloPerezoso('PIL.ImageFont')
+canvas = ModuloPerezoso('reportlab.pdfgen.canvas')
+rl_utils = ModuloPerezoso('reportlab.lib.utils')
+colores = ModuloPerezoso('reportlab.lib.colors')
+pdfmetrics = ModuloPerezoso('reportlab.pdfbase.pdfmetrics')
+MODULOS_PEREZOSOS = (Image, ImageDraw, ImageFont, canvas, rl_utils, colores, pdfmetrics)
 
 # 2. Configuración de constantes con sistema de compensación
 class LabelConfig:
@@ -50,12 +101,80 @@ class LabelConfig:
     SPACING_ADJUSTMENT_X = 0 * mm
     SPACING_ADJUSTMENT_Y = 0 * mm
     
+    # MODO DE RENDERIZADO DEL CÓDIGO DE BARRAS
+    # 'vector': barras y texto dibujados directamente en el PDF
+    # 'raster': imagen PNG (Pillow) rasterizada desde la misma geometría
+    MODO_RENDER_BARCODE = os.environ.get('MODO_RENDER_BARCODE', 'vector')
+    
+    # Reutilizar etiquetas, marco y páginas completas como Form XObjects del PDF
+    USAR_FORM_XOBJECTS = os.environ.get('USAR_FORM_XOBJECTS', '1') != '0'
+    
+    # Procesos para generar en paralelo los PDFs de código de barras (0 o 1 = secuencial)
+    PDF_WORKERS = int(os.environ.get('PDF_WORKERS', '0'))
+    
+    # Páginas máximas por archivo: las tiradas más grandes se dividen en volúmenes
+    # para que la memoria de cada PDF no crezca con la cantidad pedida (0 = sin límite)
+    PAGINAS_POR_VOLUMEN = int(os.environ.get('PAGINAS_POR_VOLUMEN', '500'))
+    
+    # IMPRESORAS TÉRMICAS (salida ZPL/EPL)
+    # Resolución del cabezal: 203 dpi (8 puntos/mm) o 300 dpi (12 puntos/mm)
+    TERMICA_DPI = int(os.environ.get('TERMICA_DPI', '203'))
+    # Separación entre etiquetas del rollo, en mm (EPL la necesita explícita)
+    TERMICA_GAP_MM = 3
+    
+    # Vistas previas PNG de las hojas generadas
+    VISTA_PREVIA_ANCHO = 400
+    VISTA_PREVIA_ANCHO_MAX = 1200
+    
+    # ENTREGA DE ARCHIVOS
+    # 'disco': los PDFs se escriben en pdfs_generados/
+    # 'memoria': los PDFs se generan en un buffer y se sirven sin tocar el disco. El almacén
+    # es del proceso que generó el lote: solo sirve con un único worker (gunicorn.conf.py no
+    # arranca con más) y un archivo expulsado del LRU ya no se puede descargar (410)
+    MODO_ENTREGA = os.environ.get('MODO_ENTREGA', 'disco')
+    
+    # Caché de PDFs direccionada por contenido (vacío = desactivada)
+    CACHE_ARTEFACTOS_DIR = os.environ.get('CACHE_ARTEFACTOS_DIR', os.path.join('pdfs_generados', 'cache'))
+    
+    # ZIPs de "descargar todo" ya armados, por conjunto de PDFs (vacío = armarlos al vuelo cada vez)
+    CACHE_ZIPS_DIR = os.environ.get('CACHE_ZIPS_DIR', os.path.join('pdfs_generados', 'zips'))
+    
+    # CICLO DE VIDA DE LOS ARCHIVOS EN DISCO (pdfs_generados/ y las cachés de PDFs y de ZIPs)
+    # Se borran los que llevan ARTEFACTOS_TTL segundos sin descargarse y, si el total
+    # supera la cuota, los usados hace más tiempo (0 = sin cuota / sin barrido periódico)
+    ARTEFACTOS_TTL = int(os.environ.get('ARTEFACTOS_TTL', str(24 * 3600)))
+    ARTEFACTOS_CUOTA_BYTES = int(os.environ.get('ARTEFACTOS_CUOTA_BYTES', str(2 * 1024 * 1024 * 1024)))
+    ARTEFACTOS_INTERVALO_BARRIDO = int(os.environ.get('ARTEFACTOS_INTERVALO_BARRIDO', '300'))
+    
+    # Sesiones guardadas en el servidor (SQLite); vacío = cookie firmada de Flask
+    SESIONES_DB = os.environ.get('SESIONES_DB', 'sesiones.sqlite3')
+    SESIONES_TTL = int(os.environ.get('SESIONES_TTL', str(24 * 3600)))
+    
+    # Estado de los trabajos de generación, compartido por todos los workers (vacío = solo en
+    # la memoria de cada proceso). Los trabajos terminados se olvidan pasado TRABAJOS_TTL segundos
+    TRABAJOS_DB = os.environ.get('TRABAJOS_DB', SESIONES_DB)
+    TRABAJOS_TTL = int(os.environ.get('TRABAJOS_TTL', '3600'))
+    
+    # Catálogo de productos ya impresos o importados, para reimprimir por SKU (vacío = desactivado)
+    CATALOGO_DB = os.environ.get('CATALOGO_DB', 'catalogo.sqlite3')
+    
     # LÍMITES DE CARACTERES PARA VALIDACIÓN
     MAX_NOMBRE_PRODUCTO = 60
     MAX_VALOR = 10
     MAX_SKU = 15
     MAX_OTRO = 40
     
+    # LÍMITES DEL LOTE (verificación previa, antes de dibujar nada)
+    MAX_ETIQUETAS_LOTE = int(os.environ.get('MAX_ETIQUETAS_LOTE', '200000'))
+    MAX_PAGINAS_LOTE = int(os.environ.get('MAX_PAGINAS_LOTE', '5000'))
+    MAX_BYTES_LOTE = int(os.environ.get('MAX_BYTES_LOTE', str(512 * 1024 * 1024)))
+    # Ancho mínimo de barra (mm) que un lector resuelve de forma fiable en impresión láser
+    MIN_MODULO_MM = float(os.environ.get('MIN_MODULO_MM', '0.15'))
+    
+    # Importación masiva desde CSV/XLSX
+    MAX_FILAS_IMPORTACION = int(os.environ.get('MAX_FILAS_IMPORTACION', '10000'))
+    MAX_ERRORES_MOSTRADOS = 20
+    
     BARCODE_CONFIG = {
         "write_text": True,
         "module_height": 8.5,
@@ -67,142 +186,702 @@ class LabelConfig:
     }
     
     @classmethod
-    def get_layout_info(cls):
-        """Retorna información detallada del layout para debugging"""
-        info = {
-            "Página": f"{cls.PAGE_WIDTH/cm:.2f} × {cls.PAGE_HEIGHT/cm:.2f} cm",
-            "Área imprimible": f"{cls.PRINTER_PRINTABLE_WIDTH/cm:.2f} × {cls.PRINTER_PRINTABLE_HEIGHT/cm:.2f} cm",
-            "Márgenes impresora (L,R,T,B)": f"{cls.PRINTER_MARGIN_LEFT/mm:.1f}, {cls.PRINTER_MARGIN_RIGHT/mm:.1f}, {cls.PRINTER_MARGIN_TOP/mm:.1f}, {cls.PRINTER_MARGIN_BOTTOM/mm:.1f} mm",
-            "Etiqueta": f"{cls.LABEL_WIDTH/mm:.1f} × {cls.LABEL_HEIGHT/mm:.1f} mm",
-            "Grid": f"{cls.LABELS_PER_ROW} × {cls.LABELS_PER_COL}",
-            "Ajuste fino (X,Y)": f"{cls.FINE_TUNE_X/mm:.1f}, {cls.FINE_TUNE_Y/mm:.1f} mm"
+    def firma_render(cls) -> Dict:
+        """Opciones de dibujo que cambian un PDF generado (la hoja la aporta LayoutHoja.firma)"""
+        return {
+            'barcode': cls.BARCODE_CONFIG,
+            'render_barcode': cls.MODO_RENDER_BARCODE,
+            'form_xobjects': cls.USAR_FORM_XOBJECTS,
         }
-        return info
 
-def generar_barcode(codigo: str) -> BytesIO:
-    """Genera código de barras optimizado"""
-    try:
-        barcode_class = barcode.get_barcode_class('code128')
-        barcode_instance = barcode_class(codigo, writer=ImageWriter())
-        
-        buffer = BytesIO()
-        barcode_instance.write(buffer, options=LabelConfig.BARCODE_CONFIG)
-        buffer.seek(0)
-        
-        return buffer
-    except Exception as e:
-        raise ValueError(f"Error generando código de barras para '{codigo}': {str(e)}")
+# 2.1 Registro (logging) e instrumentación
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper(),
+                    format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+logger = logging.getLogger('generador_etiquetas')
+
+BUCKETS_SEGUNDOS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _formatear_etiquetas(etiquetas: Tuple) -> str:
+    if not etiquetas:
+        return ''
+    pares = ','.join(f'{k}="{str(v)}"' for k, v in etiquetas)
+    return '{' + pares + '}'
 
-def calcular_layout() -> Tuple[float, float, float, float]:
+# Verdadero dentro de los procesos del pool de PDFs (ver obtener_pool_procesos): lo que
+# se registra allí queda pendiente y viaja con el resultado al proceso principal
+_en_pool_procesos = False
+
+def marcar_proceso_pool(configuracion: Optional[Dict] = None) -> None:
     """
-    Calcula las posiciones de layout con compensación de márgenes
+    Inicializador de los procesos del pool. Los procesos no heredan la memoria
+    del principal (ver obtener_pool_procesos): se les pasa la configuración
+    vigente de LabelConfig, que puede haber cambiado después de importar.
     """
-    total_labels_width = LabelConfig.LABELS_PER_ROW * LabelConfig.LABEL_WIDTH
-    total_labels_height = LabelConfig.LABELS_PER_COL * LabelConfig.LABEL_HEIGHT
-    
-    available_width = LabelConfig.PRINTER_PRINTABLE_WIDTH
-    available_height = LabelConfig.PRINTER_PRINTABLE_HEIGHT
+    global _en_pool_procesos
+    _en_pool_procesos = True
+    for nombre, valor in (configuracion or {}).items():
+        setattr(LabelConfig, nombre, valor)
+
+class RegistroMetricas:
+    """
+    Contadores, gauges e histogramas en memoria con exportación en formato de
+    texto de Prometheus.
     
-    extra_margin_x = (available_width - total_labels_width) / 2
-    extra_margin_y = (available_height - total_labels_height) / 2
+    En un proceso hijo del pool (otro pid) las observaciones se acumulan como
+    pendientes y viajan con el resultado para aplicarse en el proceso principal.
+    """
     
-    start_x = LabelConfig.PRINTER_MARGIN_LEFT + extra_margin_x + LabelConfig.FINE_TUNE_X
-    start_y = LabelConfig.PAGE_HEIGHT - LabelConfig.PRINTER_MARGIN_TOP - extra_margin_y - LabelConfig.LABEL_HEIGHT + LabelConfig.FINE_TUNE_Y
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._definiciones = {}
+        self._valores = {}
+        self._pendientes = []
+    
+    def definir(self, nombre: str, tipo: str, ayuda: str) -> None:
+        self._definiciones[nombre] = (tipo, ayuda)
+    
+    def _registrar(self, operacion: str, nombre: str, valor: float, etiquetas: Tuple) -> None:
+        if _en_pool_procesos:
+            self._pendientes.append((operacion, nombre, valor, etiquetas))
+            return
+        with self._lock:
+            if operacion == 'sumar':
+                self._valores[(nombre, etiquetas)] = self._valores.get((nombre, etiquetas), 0) + valor
+            elif operacion == 'fijar':
+                self._valores[(nombre, etiquetas)] = valor
+            else:
+                serie = self._valores.get((nombre, etiquetas))
+                if serie is None:
+                    serie = self._valores[(nombre, etiquetas)] = [[0] * len(BUCKETS_SEGUNDOS), 0.0, 0]
+                for i, limite in enumerate(BUCKETS_SEGUNDOS):
+                    if valor <= limite:
+                        serie[0][i] += 1
+                serie[1] += valor
+                serie[2] += 1
+    
+    def incrementar(self, nombre: str, valor: float = 1, **etiquetas) -> None:
+        self._registrar('sumar', nombre, valor, tuple(sorted(etiquetas.items())))
+    
+    def fijar(self, nombre: str, valor: float, **etiquetas) -> None:
+        self._registrar('fijar', nombre, valor, tuple(sorted(etiquetas.items())))
+    
+    def observar(self, nombre: str, valor: float, **etiquetas) -> None:
+        self._registrar('observar', nombre, valor, tuple(sorted(etiquetas.items())))
+    
+    def drenar_pendientes(self) -> List[Tuple]:
+        """Observaciones hechas en un proceso hijo, para enviarlas al principal"""
+        pendientes, self._pendientes = self._pendientes, []
+        return pendientes
+    
+    def aplicar(self, pendientes: List[Tuple]) -> None:
+        for operacion, nombre, valor, etiquetas in pendientes:
+            self._registrar(operacion, nombre, valor, etiquetas)
+    
+    def exportar(self, adicionales: Optional[List[Tuple]] = None) -> str:
+        """Texto de exposición de Prometheus; `adicionales` son (nombre, tipo, ayuda, valor)"""
+        lineas = []
+        with self._lock:
+            valores = dict(self._valores)
+        for nombre, (tipo, ayuda) in self._definiciones.items():
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} {tipo}")
+            for (nombre_serie, etiquetas), valor in sorted(valores.items(), key=lambda kv: kv[0]):
+                if nombre_serie != nombre:
+                    continue
+                if tipo != 'histogram':
+                    lineas.append(f"{nombre}{_formatear_etiquetas(etiquetas)} {valor}")
+                    continue
+                buckets, suma, cuenta = valor
+                for limite, acumulado in zip(BUCKETS_SEGUNDOS, buckets):
+                    lineas.append(f"{nombre}_bucket{_formatear_etiquetas(etiquetas + (('le', limite),))} {acumulado}")
+                lineas.append(f"{nombre}_bucket{_formatear_etiquetas(etiquetas + (('le', '+Inf'),))} {cuenta}")
+                lineas.append(f"{nombre}_sum{_formatear_etiquetas(etiquetas)} {suma}")
+                lineas.append(f"{nombre}_count{_formatear_etiquetas(etiquetas)} {cuenta}")
+        for nombre, tipo, ayuda, valor in adicionales or []:
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} {tipo}")
+            lineas.append(f"{nombre} {valor}")
+        return '\n'.join(lineas) + '\n'
+
+metricas = RegistroMetricas()
+metricas.definir('etiquetas_etapa_segundos', 'histogram', 'Duración de cada etapa de la generación')
+metricas.definir('etiquetas_lote_segundos', 'histogram', 'Duración total de la generación de un lote')
+metricas.definir('etiquetas_generadas_total', 'counter', 'Etiquetas dibujadas en PDFs')
+metricas.definir('etiquetas_paginas_total', 'counter', 'Páginas de PDF generadas')
+metricas.definir('etiquetas_bytes_escritos_total', 'counter', 'Bytes de PDF escritos')
+metricas.definir('etiquetas_por_segundo', 'gauge', 'Etiquetas por segundo del último lote generado')
+metricas.definir('etiquetas_cache_artefactos_total', 'counter', 'Consultas a la caché de PDFs por resultado')
+metricas.definir('etiquetas_cache_zips_total', 'counter', 'Descargas de ZIP por resultado de la caché de ZIPs')
+metricas.definir('etiquetas_artefactos_eliminados_total', 'counter', 'Archivos generados borrados del disco por motivo')
+
+@contextmanager
+def medir_etapa(etapa: str, **etiquetas):
+    """Registra la duración del bloque en el histograma de etapas"""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        metricas.observar('etiquetas_etapa_segundos', time.perf_counter() - inicio, etapa=etapa, **etiquetas)
+
+def medir_envio(respuesta: Response) -> Response:
+    """
+    Registra la etapa 'envio' cuando el servidor termina de escribir el cuerpo:
+    send_file y los ZIP al vuelo solo preparan un iterador, así que medir la
+    llamada daría ~0
+    """
+    inicio = time.perf_counter()
+    respuesta.call_on_close(
+        lambda: metricas.observar('etiquetas_etapa_segundos', time.perf_counter() - inicio, etapa='envio'))
+    return respuesta
+
+def registrar_pdf_generado(tipo_etiqueta: str, etiquetas: int, destino, layout) -> None:
+    """Actualiza los contadores de volumen después de c.save()"""
+    if isinstance(destino, str):
+        tamaño = os.path.getsize(destino)
+    else:
+        tamaño = destino.getbuffer().nbytes
+    metricas.incrementar('etiquetas_generadas_total', etiquetas, tipo=tipo_etiqueta)
+    metricas.incrementar('etiquetas_paginas_total', layout.paginas(etiquetas), tipo=tipo_etiqueta)
+    metricas.incrementar('etiquetas_bytes_escritos_total', tamaño, tipo=tipo_etiqueta)
+    logger.debug("PDF generado: %s (%d etiquetas, %d bytes)", destino if isinstance(destino, str) else '<memoria>',
+                 etiquetas, tamaño)
+
+class CacheLRU:
+    """
+    Caché LRU en memoria compartida por todo el proceso.
     
-    print(f"\n=== DEBUG LAYOUT ===")
-    print(f"Área imprimible: {available_width/cm:.2f} × {available_height/cm:.2f} cm")
-    print(f"Espacio etiquetas: {total_labels_width/cm:.2f} × {total_labels_height/cm:.2f} cm")
-    print(f"Margen extra: X={extra_margin_x/mm:.1f}mm, Y={extra_margin_y/mm:.1f}mm")
-    print(f"Inicio: X={start_x/cm:.2f}cm, Y={start_y/cm:.2f}cm")
-    print(f"===================\n")
+    Cada entrada declara su tamaño en bytes; al superar el presupuesto se
+    expulsan las entradas usadas hace más tiempo.
+    """
     
-    return LabelConfig.PRINTER_MARGIN_LEFT, LabelConfig.PRINTER_MARGIN_TOP, start_x, start_y
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def obtener(self, clave: Tuple):
+        """Retorna el recurso guardado o None, marcándolo como usado recientemente"""
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self.misses += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.hits += 1
+            return entrada[0]
+    
+    def guardar(self, clave: Tuple, recurso, tamaño: int) -> None:
+        """Guarda un recurso y expulsa entradas LRU hasta respetar el presupuesto"""
+        if tamaño > self.max_bytes:
+            return
+        with self._lock:
+            anterior = self._entradas.pop(clave, None)
+            if anterior is not None:
+                self._bytes -= anterior[1]
+            self._entradas[clave] = (recurso, tamaño)
+            self._bytes += tamaño
+            while self._bytes > self.max_bytes:
+                _, (_, tamaño_expulsado) = self._entradas.popitem(last=False)
+                self._bytes -= tamaño_expulsado
+                self.evictions += 1
+    
+    def __contains__(self, clave) -> bool:
+        with self._lock:
+            return clave in self._entradas
+    
+    def limpiar(self) -> None:
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+    
+    def estadisticas(self) -> Dict:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entradas': len(self._entradas),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+# Códigos de barras renderizados: bytes PNG (modo raster) o geometría vectorial
+cache_barcodes = CacheLRU(int(os.environ.get('CACHE_BARCODES_BYTES', 32 * 1024 * 1024)))
 
-def calcular_posicion_etiqueta(index: int, start_x: float, start_y: float) -> Tuple[float, float, int, int]:
-    """Calcula posición exacta de una etiqueta"""
-    fila = index // LabelConfig.LABELS_PER_ROW
-    columna = index % LabelConfig.LABELS_PER_ROW
+def clave_cache_barcode(modo: str, codigo: str, simbologia: str = 'code128') -> Tuple:
+    """Clave de caché: simbología, modo, valor y la configuración efectiva del código"""
+    return (simbologia, modo, codigo, tuple(sorted(LabelConfig.BARCODE_CONFIG.items())))
+
+def generar_barcode(codigo: str, simbologia: str = SIMBOLOGIA_DEFECTO) -> BytesIO:
+    """
+    PNG del código (modo raster), rasterizado desde la geometría vectorial:
+    todas las simbologías, Code128 incluido, salen de codificar_codigo y
+    BARCODE_CONFIG las calibra igual en los dos modos.
+    """
+    clave = clave_cache_barcode('raster', codigo, simbologia)
+    datos = cache_barcodes.obtener(clave)
+    if datos is None:
+        # Resolución con un número entero de píxeles por módulo (a 300 dpi, 0,30 mm serían 3,5 px)
+        module_width = LabelConfig.BARCODE_CONFIG['module_width']
+        dpi = max(1, math.ceil(module_width * 300 / 25.4)) * 25.4 / module_width
+        datos = rasterizar_geometria(generar_barcode_vectorial(codigo, simbologia), dpi)
+        cache_barcodes.guardar(clave, datos, len(datos))
+    return BytesIO(datos)
+
+def rasterizar_geometria(geometria: Dict, dpi: float = 300) -> bytes:
+    """PNG en blanco y negro de una geometría de generar_barcode_vectorial"""
+    escala = dpi / 25.4
+    alto_px = round(geometria['alto'] * escala)
+    imagen = Image.new('1', (round(geometria['ancho'] * escala), alto_px), 1)
+    dibujo = ImageDraw.Draw(imagen)
+    for x, y, ancho, alto in geometria['barras']:
+        # La geometría se mide desde abajo; la imagen, desde arriba
+        dibujo.rectangle([round(x * escala), alto_px - round((y + alto) * escala),
+                          round((x + ancho) * escala) - 1, alto_px - round(y * escala) - 1], fill=0)
+    if geometria['texto']:
+        fuente = fuente_vista_previa(max(1, round(geometria['tamaño_fuente'] * escala)))
+        dibujo.text((geometria['x_texto'] * escala, alto_px - geometria['y_texto'] * escala),
+                    geometria['texto'], fill=0, font=fuente, anchor='md')
+    buffer = BytesIO()
+    imagen.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+def generar_barcode_vectorial(codigo: str, simbologia: str = SIMBOLOGIA_DEFECTO) -> Dict:
+    """
+    Genera la geometría vectorial (en mm) del código usando las mismas medidas
+    que ImageWriter, para que BARCODE_CONFIG siga calibrando el resultado.
+    barras: rectángulos (x, y, ancho, alto); en un código 2D cada módulo mide
+    module_width de lado. El margen nunca es menor que la zona silenciosa de la
+    simbología. El resultado se comparte desde la caché: no debe modificarse.
+    """
+    clave = clave_cache_barcode('vector', codigo, simbologia)
+    geometria = cache_barcodes.obtener(clave)
+    if geometria is not None:
+        return geometria
+    
+    modulos = codificar_codigo(codigo, simbologia)
+    simbolo = obtener_simbologia(simbologia)
+    
+    config = LabelConfig.BARCODE_CONFIG
+    module_width = config['module_width']
+    quiet_zone = max(config['quiet_zone'], simbolo.zona_silencio * module_width)
+    texto = simbolo.texto(codigo) if config.get('write_text', True) else ''
+    font_size = config['font_size'] if texto else 0
+    margen = 1.0  # margin_top / margin_bottom fijos de python-barcode
+    
+    if modulos.filas > 1:
+        module_height = modulos.filas * module_width
+        y_barras = quiet_zone
+        margen = quiet_zone
+        barras = tuple((quiet_zone + inicio * module_width, y_barras + (modulos.filas - 1 - fila) * module_width,
+                        largo * module_width, module_width)
+                       for fila, inicio, largo in modulos.barras)
+    else:
+        module_height = config['module_height']
+        y_barras = margen + (font_size * 0.352777778 / 2 + config['text_distance'] if font_size else 0)
+        barras = tuple((quiet_zone + inicio * module_width, y_barras, largo * module_width, module_height)
+                       for _, inicio, largo in modulos.barras)
+    
+    ancho = 2 * quiet_zone + modulos.ancho * module_width
+    alto = 2 * margen + module_height
+    fuente_mm = font_size * 0.352777778
+    if font_size:
+        alto += fuente_mm / 2 + config['text_distance']
+    
+    # Coordenadas medidas desde la esquina inferior izquierda (sistema de ReportLab)
+    geometria = {
+        'barras': barras,
+        'ancho': ancho,
+        'alto': alto,
+        'texto': texto,
+        'x_texto': ancho / 2,
+        'y_texto': alto - margen - module_height - config['text_distance'],
+        'tamaño_fuente': fuente_mm,
+    }
+    # Tamaño aproximado en memoria: cada barra es una tupla de cuatro floats
+    cache_barcodes.guardar(clave, geometria, 512 + 180 * len(barras) + len(codigo))
+    return geometria
+
+class LayoutHoja:
+    """
+    Geometría precompilada de un perfil de hoja: origen de cada espacio de
+    etiqueta, marco de corte y medidas derivadas. Se construye una vez al
+    arrancar; generar un PDF solo consulta estas tablas.
+    """
     
-    x = start_x + columna * (LabelConfig.LABEL_WIDTH + LabelConfig.SPACING_ADJUSTMENT_X)
-    y = start_y - fila * (LabelConfig.LABEL_HEIGHT + LabelConfig.SPACING_ADJUSTMENT_Y)
+    PADDING = 1.5 * mm
+    
+    def __init__(self, nombre: str, descripcion: str, page_width: float, page_height: float,
+                 printable_width: float, printable_height: float, label_width: float, label_height: float,
+                 labels_per_row: int, labels_per_col: int, fine_tune_x: float = 0, fine_tune_y: float = 0,
+                 spacing_x: float = 0, spacing_y: float = 0):
+        self.nombre = nombre
+        self.descripcion = descripcion
+        self.page_width = page_width
+        self.page_height = page_height
+        self.printable_width = printable_width
+        self.printable_height = printable_height
+        self.label_width = label_width
+        self.label_height = label_height
+        self.labels_per_row = labels_per_row
+        self.labels_per_col = labels_per_col
+        self.fine_tune_x = fine_tune_x
+        self.fine_tune_y = fine_tune_y
+        self.spacing_x = spacing_x
+        self.spacing_y = spacing_y
+        self.por_pagina = labels_per_row * labels_per_col
+        self.medidas_etiqueta = f"{label_width/mm:g}x{label_height/mm:g}mm"
+        
+        # Compensación de márgenes de la impresora
+        self.margin_left = (page_width - printable_width) / 2
+        self.margin_top = (page_height - printable_height) / 2
+        
+        total_labels_width = labels_per_row * label_width + (labels_per_row - 1) * spacing_x
+        total_labels_height = labels_per_col * label_height + (labels_per_col - 1) * spacing_y
+        self.extra_margin_x = (printable_width - total_labels_width) / 2
+        self.extra_margin_y = (printable_height - total_labels_height) / 2
+        
+        self.start_x = self.margin_left + self.extra_margin_x + fine_tune_x
+        self.start_y = page_height - self.margin_top - self.extra_margin_y - label_height + fine_tune_y
+        
+        # Origen (esquina inferior izquierda) de cada espacio, en orden de llenado
+        paso_x = label_width + spacing_x
+        paso_y = label_height + spacing_y
+        self.posiciones = tuple(
+            (round(self.start_x + columna * paso_x, 1), round(self.start_y - fila * paso_y, 1))
+            for fila in range(labels_per_col)
+            for columna in range(labels_per_row)
+        )
+        
+        # Marco: rectángulo exterior y líneas interiores
+        ancho_total = total_labels_width
+        alto_total = total_labels_height
+        y_superior = self.start_y + label_height
+        self.marco_rect = (self.start_x, self.start_y - alto_total + label_height, ancho_total, alto_total)
+        # (con espaciado entre etiquetas, cada separación tiene sus dos bordes)
+        bordes_x = sorted({self.start_x + col * paso_x - d
+                           for col in range(1, labels_per_row) for d in (0, spacing_x)})
+        bordes_y = sorted({y_superior - row * paso_y + d
+                           for row in range(1, labels_per_col) for d in (0, spacing_y)}, reverse=True)
+        self.marco_lineas = tuple(
+            [(x, y_superior, x, y_superior - alto_total) for x in bordes_x] +
+            [(self.start_x, y, self.start_x + ancho_total, y) for y in bordes_y]
+        )
+        
+        # Área útil dentro de cada etiqueta
+        self.ancho_util = label_width - 2 * self.PADDING
+        self.alto_util = label_height - 2 * self.PADDING
+    
+    def paginas(self, etiquetas: int) -> int:
+        return math.ceil(etiquetas / self.por_pagina)
+    
+    def firma(self) -> Dict:
+        """Medidas que cambian el PDF resultante (para claves de caché)"""
+        return {
+            'pagina': (self.page_width, self.page_height),
+            'area_imprimible': (self.printable_width, self.printable_height),
+            'etiqueta': (self.label_width, self.label_height),
+            'grid': (self.labels_per_row, self.labels_per_col),
+            'ajuste_fino': (self.fine_tune_x, self.fine_tune_y),
+            'espaciado': (self.spacing_x, self.spacing_y),
+        }
     
-    return round(x, 1), round(y, 1), fila, columna
+    def info(self) -> Dict:
+        """Información del layout para debugging"""
+        return {
+            "Perfil": f"{self.nombre} ({self.descripcion})",
+            "Página": f"{self.page_width/cm:.2f} × {self.page_height/cm:.2f} cm",
+            "Área imprimible": f"{self.printable_width/cm:.2f} × {self.printable_height/cm:.2f} cm",
+            "Etiqueta": f"{self.label_width/mm:.1f} × {self.label_height/mm:.1f} mm",
+            "Grid": f"{self.labels_per_row} × {self.labels_per_col}",
+            "Margen extra": f"X={self.extra_margin_x/mm:.1f}mm, Y={self.extra_margin_y/mm:.1f}mm",
+            "Inicio": f"X={self.start_x/cm:.2f}cm, Y={self.start_y/cm:.2f}cm",
+        }
+
+# Perfiles de hoja disponibles. El estándar toma sus medidas (y la calibración) de LabelConfig.
+PERFILES_HOJA = {
+    'carta_35x25': {
+        'descripcion': "Carta, 66 etiquetas de 35×25 mm (6×11)",
+        'page_width': LabelConfig.PAGE_WIDTH,
+        'page_height': LabelConfig.PAGE_HEIGHT,
+        'printable_width': LabelConfig.PRINTER_PRINTABLE_WIDTH,
+        'printable_height': LabelConfig.PRINTER_PRINTABLE_HEIGHT,
+        'label_width': LabelConfig.LABEL_WIDTH,
+        'label_height': LabelConfig.LABEL_HEIGHT,
+        'labels_per_row': LabelConfig.LABELS_PER_ROW,
+        'labels_per_col': LabelConfig.LABELS_PER_COL,
+        'fine_tune_x': LabelConfig.FINE_TUNE_X,
+        'fine_tune_y': LabelConfig.FINE_TUNE_Y,
+        'spacing_x': LabelConfig.SPACING_ADJUSTMENT_X,
+        'spacing_y': LabelConfig.SPACING_ADJUSTMENT_Y,
+    },
+    'carta_66x25': {
+        'descripcion': "Carta, 30 etiquetas de 66.7×25.4 mm (3×10)",
+        'page_width': 21.59 * cm,
+        'page_height': 27.94 * cm,
+        'printable_width': 20.5 * cm,
+        'printable_height': 26.9 * cm,
+        'label_width': 66.7 * mm,
+        'label_height': 25.4 * mm,
+        'labels_per_row': 3,
+        'labels_per_col': 10,
+        'spacing_x': 3.2 * mm,
+    },
+    'carta_38x21': {
+        'descripcion': "Carta, 60 etiquetas de 38.1×21.2 mm (5×12)",
+        'page_width': 21 * cm,
+        'page_height': 27.9 * cm,
+        'printable_width': 20.5 * cm,
+        'printable_height': 26.9 * cm,
+        'label_width': 38.1 * mm,
+        'label_height': 21.2 * mm,
+        'labels_per_row': 5,
+        'labels_per_col': 12,
+        'spacing_x': 2.5 * mm,
+    },
+}
+
+PERFIL_HOJA_DEFECTO = os.environ.get('PERFIL_HOJA', 'carta_35x25')
+
+LAYOUTS_HOJA = {nombre: LayoutHoja(nombre, **perfil) for nombre, perfil in PERFILES_HOJA.items()}
+
+def obtener_layout(perfil: Optional[str] = None) -> LayoutHoja:
+    """Layout compilado del perfil pedido (o el por defecto)"""
+    layout = LAYOUTS_HOJA.get(perfil or PERFIL_HOJA_DEFECTO)
+    if layout is None:
+        raise ValueError(f"Perfil de hoja desconocido: '{perfil}'")
+    return layout
 
-def dibujar_marco_completo(c: canvas.Canvas, start_x: float, start_y: float) -> None:
+def dibujar_marco_completo(c: canvas.Canvas, layout: LayoutHoja) -> None:
     """Dibuja el marco completo del área de etiquetas"""
-    c.setStrokeColor(black)
+    c.setStrokeColor(colores.black)
     c.setLineWidth(0.5)
     
-    ancho_total = LabelConfig.LABELS_PER_ROW * (LabelConfig.LABEL_WIDTH + LabelConfig.SPACING_ADJUSTMENT_X)
-    alto_total = LabelConfig.LABELS_PER_COL * (LabelConfig.LABEL_HEIGHT + LabelConfig.SPACING_ADJUSTMENT_Y)
-    y_superior = start_y + LabelConfig.LABEL_HEIGHT
-    
-    c.rect(start_x, start_y - alto_total + LabelConfig.LABEL_HEIGHT, 
-           ancho_total, alto_total, stroke=1, fill=0)
-    
-    for col in range(1, LabelConfig.LABELS_PER_ROW):
-        x = start_x + col * (LabelConfig.LABEL_WIDTH + LabelConfig.SPACING_ADJUSTMENT_X)
-        c.line(x, y_superior, x, y_superior - alto_total)
-    
-    for row in range(1, LabelConfig.LABELS_PER_COL):
-        y = y_superior - row * (LabelConfig.LABEL_HEIGHT + LabelConfig.SPACING_ADJUSTMENT_Y)
-        c.line(start_x, y, start_x + ancho_total, y)
+    c.rect(*layout.marco_rect, stroke=1, fill=0)
+    for linea in layout.marco_lineas:
+        c.line(*linea)
 
-def dibujar_guias_calibracion(c: canvas.Canvas, start_x: float, start_y: float):
+def dibujar_guias_calibracion(c: canvas.Canvas, layout: LayoutHoja):
     """Dibuja guías de calibración en las esquinas (opcional, para pruebas)"""
-    c.setStrokeColor(HexColor("#FF0000"))
+    c.setStrokeColor(colores.HexColor("#FF0000"))
     c.setLineWidth(0.3)
     
     marca = 5 * mm
+    y_superior = layout.start_y + layout.label_height
     
-    c.line(start_x, start_y + LabelConfig.LABEL_HEIGHT, 
-           start_x + marca, start_y + LabelConfig.LABEL_HEIGHT)
-    c.line(start_x, start_y + LabelConfig.LABEL_HEIGHT, 
-           start_x, start_y + LabelConfig.LABEL_HEIGHT - marca)
+    c.line(layout.start_x, y_superior, layout.start_x + marca, y_superior)
+    c.line(layout.start_x, y_superior, layout.start_x, y_superior - marca)
     
-    end_x = start_x + LabelConfig.LABELS_PER_ROW * LabelConfig.LABEL_WIDTH
-    c.line(end_x - marca, start_y + LabelConfig.LABEL_HEIGHT, 
-           end_x, start_y + LabelConfig.LABEL_HEIGHT)
-    c.line(end_x, start_y + LabelConfig.LABEL_HEIGHT, 
-           end_x, start_y + LabelConfig.LABEL_HEIGHT - marca)
+    end_x = layout.start_x + layout.labels_per_row * layout.label_width
+    c.line(end_x - marca, y_superior, end_x, y_superior)
+    c.line(end_x, y_superior, end_x, y_superior - marca)
 
-def generar_pdf_codigo_barras(codigo: str, cantidad: int, output_path: str) -> None:
-    """Genera PDF con etiquetas de código de barras"""
-    if cantidad <= 0:
-        raise ValueError("La cantidad debe ser mayor a 0")
+CAMPOS_PERSONALIZADOS = ('nombre_producto', 'sku', 'valor', 'otro', 'codigo', 'simbologia')
+
+def clave_etiqueta_personalizada(datos: Dict) -> Tuple:
+    """Identifica el contenido visible de una etiqueta personalizada"""
+    return tuple(datos.get(campo, '') for campo in CAMPOS_PERSONALIZADOS)
+
+def clave_codigo(producto: Dict) -> Tuple[str, str]:
+    """(código, simbología) de un producto con código de barras"""
+    return producto['codigo'], producto.get('simbologia') or SIMBOLOGIA_DEFECTO
+
+def dividir_en_volumenes(productos: List[Dict], layout: LayoutHoja) -> Iterator[List[Dict]]:
+    """
+    Reparte los productos (en orden) en volúmenes de a lo más PAGINAS_POR_VOLUMEN
+    páginas. Un producto que cruza el límite se parte en copias con la cantidad de
+    cada tramo; los cortes caen siempre en fin de página, así las páginas quedan
+    iguales que en un documento único. Se generan bajo demanda.
+    """
+    if LabelConfig.PAGINAS_POR_VOLUMEN <= 0:
+        yield productos
+        return
     
-    margin_x, margin_y, start_x, start_y = calcular_layout()
+    capacidad = LabelConfig.PAGINAS_POR_VOLUMEN * layout.por_pagina
+    volumen = []
+    libres = capacidad
+    for producto in productos:
+        restantes = producto['cantidad']
+        while restantes > 0:
+            tramo = min(restantes, libres)
+            volumen.append(producto if tramo == producto['cantidad'] else dict(producto, cantidad=tramo))
+            restantes -= tramo
+            libres -= tramo
+            if libres == 0:
+                yield volumen
+                volumen = []
+                libres = capacidad
+    if volumen:
+        yield volumen
+
+def colocar_etiquetas(c: canvas.Canvas, tandas: List[Tuple], layout: LayoutHoja,
+                      dibujar_etiqueta: Callable, progreso: Optional[Callable] = None) -> None:
+    """
+    Distribuye tandas de etiquetas idénticas en páginas sucesivas.
     
-    try:
-        c = canvas.Canvas(output_path, pagesize=(LabelConfig.PAGE_WIDTH, LabelConfig.PAGE_HEIGHT))
-        
-        barcode_buffer = generar_barcode(codigo)
-        barcode_image = ImageReader(barcode_buffer)
-        img_width, img_height = barcode_image.getSize()
-        
-        for i in range(cantidad):
-            pos_in_page = i % LabelConfig.TOTAL_LABELS_PER_PAGE
+    tandas: lista de (clave, datos, cantidad) en orden de impresión.
+    dibujar_etiqueta(c, datos, x, y) dibuja una etiqueta en la posición dada.
+    progreso(etiquetas) se llama al cerrar cada página con el total colocado.
+    
+    Con USAR_FORM_XOBJECTS cada etiqueta distinta, el marco y cada página llena
+    de una sola etiqueta se definen una vez como Form XObject y luego solo se
+    referencian, así el costo crece con etiquetas distintas y no con copias.
+    """
+    por_pagina = layout.por_pagina
+    posiciones = layout.posiciones
+    
+    if not LabelConfig.USAR_FORM_XOBJECTS:
+        i = 0
+        for clave, datos, cantidad in tandas:
+            for _ in range(cantidad):
+                pos_in_page = i % por_pagina
+                if pos_in_page == 0:
+                    if i > 0:
+                        c.showPage()
+                        if progreso:
+                            progreso(i)
+                    dibujar_marco_completo(c, layout)
+                x, y = posiciones[pos_in_page]
+                dibujar_etiqueta(c, datos, x, y)
+                i += 1
+        if progreso:
+            progreso(i)
+        return
+    
+    formularios = {}
+    
+    def form_marco() -> str:
+        if 'marco' not in formularios:
+            c.beginForm('marco')
+            dibujar_marco_completo(c, layout)
+            c.endForm()
+            formularios['marco'] = 'marco'
+        return formularios['marco']
+    
+    def form_etiqueta(clave, datos) -> str:
+        if ('etiqueta', clave) not in formularios:
+            nombre = f"etiqueta{len(formularios)}"
+            c.beginForm(nombre, lowerx=0, lowery=0,
+                        upperx=layout.label_width, uppery=layout.label_height)
+            dibujar_etiqueta(c, datos, 0, 0)
+            c.endForm()
+            formularios[('etiqueta', clave)] = nombre
+        return formularios[('etiqueta', clave)]
+    
+    def form_pagina(clave, datos) -> str:
+        if ('pagina', clave) not in formularios:
+            etiqueta = form_etiqueta(clave, datos)
+            marco = form_marco()
+            nombre = f"pagina{len(formularios)}"
+            c.beginForm(nombre)
+            c.doForm(marco)
+            for x, y in posiciones:
+                colocar_form(etiqueta, x, y)
+            c.endForm()
+            formularios[('pagina', clave)] = nombre
+        return formularios[('pagina', clave)]
+    
+    def colocar_form(nombre: str, x: float, y: float) -> None:
+        c.saveState()
+        c.translate(x, y)
+        c.doForm(nombre)
+        c.restoreState()
+    
+    i = 0
+    for clave, datos, cantidad in tandas:
+        restantes = cantidad
+        while restantes > 0:
+            pos_in_page = i % por_pagina
             
             if pos_in_page == 0:
                 if i > 0:
                     c.showPage()
-                dibujar_marco_completo(c, start_x, start_y)
+                    if progreso:
+                        progreso(i)
+                if restantes >= por_pagina:
+                    # Página completa de la misma etiqueta: una sola referencia
+                    c.doForm(form_pagina(clave, datos))
+                    i += por_pagina
+                    restantes -= por_pagina
+                    continue
+                c.doForm(form_marco())
             
-            x, y, fila, columna = calcular_posicion_etiqueta(pos_in_page, start_x, start_y)
-            colocar_codigo_barras(c, barcode_image, img_width, img_height, x, y)
-        
-        c.save()
-        print(f"✓ PDF generado: {output_path}")
-        
+            x, y = posiciones[pos_in_page]
+            colocar_form(form_etiqueta(clave, datos), x, y)
+            i += 1
+            restantes -= 1
+    
+    if progreso:
+        progreso(i)
+
+def generar_pdf_codigo_barras(codigo: str, cantidad: int, output_path: str,
+                              layout: Optional[LayoutHoja] = None,
+                              simbologia: str = SIMBOLOGIA_DEFECTO) -> None:
+    """Genera PDF con etiquetas de código de barras"""
+    if cantidad <= 0:
+        raise ValueError("La cantidad debe ser mayor a 0")
+    
+    try:
+        generar_pdf_codigo_barras_masivo([{'codigo': codigo, 'cantidad': cantidad, 'simbologia': simbologia}],
+                                         output_path, layout=layout)
     except Exception as e:
         raise RuntimeError(f"Error generando PDF: {str(e)}")
 
-def colocar_codigo_barras(c: canvas.Canvas, barcode_image: ImageReader, 
-                         img_width: int, img_height: int, x: float, y: float) -> None:
+def generar_pdf_codigo_barras_masivo(productos: List[Dict], output_path: str,
+                                     progreso: Optional[Callable] = None,
+                                     layout: Optional[LayoutHoja] = None) -> None:
+    """
+    Genera un ÚNICO PDF con las etiquetas de código de barras de todos los
+    productos, una tras otra, llenando cada hoja antes de pasar a la siguiente
+    """
+    if not productos:
+        raise ValueError("No hay productos para generar")
+    
+    total_etiquetas = sum(p['cantidad'] for p in productos)
+    layout = layout or obtener_layout()
+    
+    c = canvas.Canvas(output_path, pagesize=(layout.page_width, layout.page_height))
+    
+    # Un código de barras por código distinto, aunque se repita en varios productos
+    barcodes = {}
+    with medir_etapa('barcode', modo=LabelConfig.MODO_RENDER_BARCODE):
+        for producto in productos:
+            clave = clave_codigo(producto)
+            if clave in barcodes:
+                continue
+            if LabelConfig.MODO_RENDER_BARCODE == 'vector':
+                barcodes[clave] = generar_barcode_vectorial(*clave)
+            else:
+                barcode_image = rl_utils.ImageReader(generar_barcode(*clave))
+                barcodes[clave] = (barcode_image, *barcode_image.getSize())
+    
+    def dibujar_etiqueta(c: canvas.Canvas, clave: Tuple[str, str], x: float, y: float) -> None:
+        if LabelConfig.MODO_RENDER_BARCODE == 'vector':
+            dibujar_codigo_barras_vectorial(c, barcodes[clave], x, y, layout)
+        else:
+            barcode_image, img_width, img_height = barcodes[clave]
+            colocar_codigo_barras(c, barcode_image, img_width, img_height, x, y, layout)
+    
+    tandas = [(clave_codigo(p), clave_codigo(p), p['cantidad']) for p in productos]
+    with medir_etapa('dibujo', tipo='codigo_barras'):
+        colocar_etiquetas(c, tandas, layout, dibujar_etiqueta, progreso)
+    
+    with medir_etapa('guardado', tipo='codigo_barras'):
+        c.save()
+    registrar_pdf_generado('codigo_barras', total_etiquetas, output_path, layout)
+
+def colocar_codigo_barras(c: canvas.Canvas, barcode_image: rl_utils.ImageReader, 
+                         img_width: int, img_height: int, x: float, y: float,
+                         layout: Optional[LayoutHoja] = None) -> None:
     """Coloca el código de barras centrado en la etiqueta"""
-    padding = 1.5 * mm
-    available_width = LabelConfig.LABEL_WIDTH - 2 * padding
-    available_height = LabelConfig.LABEL_HEIGHT - 2 * padding
+    layout = layout or obtener_layout()
+    padding = layout.PADDING
+    available_width = layout.ancho_util
+    available_height = layout.alto_util
     
     scale_x = available_width / img_width
     scale_y = available_height / img_height
@@ -218,100 +897,161 @@ def colocar_codigo_barras(c: canvas.Canvas, barcode_image: ImageReader,
                width=final_width, height=final_height, 
                preserveAspectRatio=True)
 
-def dividir_texto_por_ancho(c: canvas.Canvas, texto: str, fuente: str, tamaño: int, ancho_maximo: float) -> list:
+def dibujar_codigo_barras_vectorial(c: canvas.Canvas, barcode_vectorial: Dict, x: float, y: float,
+                                    layout: Optional[LayoutHoja] = None) -> None:
+    """Dibuja el código de barras como rectángulos y texto, centrado en la etiqueta"""
+    layout = layout or obtener_layout()
+    dibujar_geometria_codigo(c, barcode_vectorial, x + layout.PADDING, y + layout.PADDING,
+                             layout.ancho_util, layout.alto_util)
+
+def dibujar_geometria_codigo(c: canvas.Canvas, barcode_vectorial: Dict, x: float, y: float,
+                             available_width: float, available_height: float) -> None:
+    """Dibuja una geometría de generar_barcode_vectorial escalada y centrada en la caja dada"""
+    # Misma escala que colocar_codigo_barras, expresada en puntos por mm
+    scale_x = available_width / barcode_vectorial['ancho']
+    scale_y = available_height / barcode_vectorial['alto']
+    scale = min(scale_x, scale_y) * 0.95
+    
+    final_width = barcode_vectorial['ancho'] * scale
+    final_height = barcode_vectorial['alto'] * scale
+    
+    barcode_x = x + (available_width - final_width) / 2
+    barcode_y = y + (available_height - final_height) / 2
+    
+    c.setFillColor(colores.black)
+    
+    path = c.beginPath()
+    for barra_x, barra_y, barra_ancho, barra_alto in barcode_vectorial['barras']:
+        path.rect(barcode_x + barra_x * scale, barcode_y + barra_y * scale, barra_ancho * scale, barra_alto * scale)
+    c.drawPath(path, stroke=0, fill=1)
+    
+    if barcode_vectorial['texto']:
+        tamaño = barcode_vectorial['tamaño_fuente'] * scale
+        # y_texto marca el borde inferior del texto; se sube el descendente de Helvetica
+        baseline = barcode_y + barcode_vectorial['y_texto'] * scale + tamaño * 0.207
+        c.setFont('Helvetica', tamaño)
+        c.drawCentredString(barcode_x + barcode_vectorial['x_texto'] * scale, baseline, barcode_vectorial['texto'])
+
+_tablas_anchos = {}
+
+def tabla_anchos(fuente: str, tamaño: float) -> Dict[str, float]:
+    """Tabla de anchos de glifo por fuente y tamaño, completada a medida que aparecen caracteres"""
+    clave = (fuente, tamaño)
+    tabla = _tablas_anchos.get(clave)
+    if tabla is None:
+        tabla = _tablas_anchos.setdefault(clave, {})
+    return tabla
+
+def medir_texto(texto: str, fuente: str, tamaño: float) -> float:
+    """
+    Ancho del texto sumando anchos de glifo cacheados. Las fuentes estándar
+    de ReportLab no aplican kerning, así que coincide con stringWidth.
+    """
+    tabla = tabla_anchos(fuente, tamaño)
+    ancho = 0.0
+    for caracter in texto:
+        ancho_glifo = tabla.get(caracter)
+        if ancho_glifo is None:
+            ancho_glifo = tabla[caracter] = pdfmetrics.stringWidth(caracter, fuente, tamaño)
+        ancho += ancho_glifo
+    return ancho
+
+def dividir_texto_por_ancho(texto: str, fuente: str, tamaño: int, ancho_maximo: float) -> list:
     """Divide un texto en múltiples líneas según el ancho máximo disponible"""
     palabras = texto.split()
     lineas = []
     linea_actual = ""
+    ancho_actual = 0.0
+    ancho_espacio = medir_texto(" ", fuente, tamaño)
     
+    # Se acumula el ancho de la línea en vez de volver a medirla completa por palabra
     for palabra in palabras:
+        ancho_palabra = medir_texto(palabra, fuente, tamaño)
         if linea_actual:
-            linea_prueba = linea_actual + " " + palabra
+            ancho_prueba = ancho_actual + ancho_espacio + ancho_palabra
         else:
-            linea_prueba = palabra
-            
-        ancho_prueba = c.stringWidth(linea_prueba, fuente, tamaño)
+            ancho_prueba = ancho_palabra
         
         if ancho_prueba <= ancho_maximo:
-            linea_actual = linea_prueba
+            linea_actual = f"{linea_actual} {palabra}" if linea_actual else palabra
+            ancho_actual = ancho_prueba
         else:
             if linea_actual:
                 lineas.append(linea_actual)
             linea_actual = palabra
+            ancho_actual = ancho_palabra
     
     if linea_actual:
         lineas.append(linea_actual)
     
     return lineas if lineas else [texto]
 
-def generar_pdf_personalizado(datos: Dict, cantidad: int, output_path: str) -> None:
+def generar_pdf_personalizado(datos: Dict, cantidad: int, output_path: str,
+                              layout: Optional[LayoutHoja] = None) -> None:
     """Genera PDF con etiquetas personalizadas"""
     if cantidad <= 0:
         raise ValueError("La cantidad debe ser mayor a 0")
     
-    margin_x, margin_y, start_x, start_y = calcular_layout()
+    layout = layout or obtener_layout()
     
     try:
-        c = canvas.Canvas(output_path, pagesize=(LabelConfig.PAGE_WIDTH, LabelConfig.PAGE_HEIGHT))
+        c = canvas.Canvas(output_path, pagesize=(layout.page_width, layout.page_height))
         
-        for i in range(cantidad):
-            pos_in_page = i % LabelConfig.TOTAL_LABELS_PER_PAGE
-            
-            if pos_in_page == 0:
-                if i > 0:
-                    c.showPage()
-                dibujar_marco_completo(c, start_x, start_y)
-            
-            x, y, fila, columna = calcular_posicion_etiqueta(pos_in_page, start_x, start_y)
-            dibujar_etiqueta_personalizada(c, datos, x, y)
+        def dibujar_etiqueta(c: canvas.Canvas, datos: Dict, x: float, y: float) -> None:
+            dibujar_etiqueta_personalizada(c, datos, x, y, layout)
         
-        c.save()
-        print(f"✓ PDF generado: {output_path}")
+        with medir_etapa('dibujo', tipo='personalizado'):
+            colocar_etiquetas(c, [(clave_etiqueta_personalizada(datos), datos, cantidad)],
+                              layout, dibujar_etiqueta)
+        
+        with medir_etapa('guardado', tipo='personalizado'):
+            c.save()
+        registrar_pdf_generado('personalizado', cantidad, output_path, layout)
         
     except Exception as e:
         raise RuntimeError(f"Error generando PDF: {str(e)}")
 
-def dibujar_etiqueta_personalizada(c: canvas.Canvas, datos: Dict, x: float, y: float) -> None:
-    """Dibuja una etiqueta personalizada con los datos centrados y saltos de línea automáticos"""
+@lru_cache(maxsize=4096)
+def calcular_layout_etiqueta_personalizada(campos: Tuple, ancho_etiqueta: float,
+                                           alto_etiqueta: float) -> Tuple:
+    """
+    Calcula una sola vez por contenido las líneas de una etiqueta personalizada:
+    tuplas (fuente, tamaño, texto, dx, dy) relativas a la esquina de la etiqueta,
+    con los saltos de línea automáticos y el texto centrado. Si la etiqueta
+    lleva código, el texto se centra en el espacio que queda a su izquierda.
+    """
+    nombre_producto, sku, valor, otro, codigo, _ = campos
+    if codigo:
+        ancho_etiqueta = caja_codigo_personalizado(ancho_etiqueta, alto_etiqueta)[0]
     padding = 1.5 * mm
-    ancho_util = LabelConfig.LABEL_WIDTH - 2 * padding
-    alto_util = LabelConfig.LABEL_HEIGHT - 2 * padding
-    
-    center_x = x + LabelConfig.LABEL_WIDTH / 2
+    ancho_util = ancho_etiqueta - 2 * padding
+    alto_util = alto_etiqueta - 2 * padding
     
-    c.setFillColor(black)
     line_height = 2.8 * mm
     
     lineas = []
     
     # Nombre del producto CON SALTOS DE LÍNEA AUTOMÁTICOS
-    if datos.get('nombre_producto'):
-        nombre = datos['nombre_producto'].strip().upper()
-        c.setFont('Helvetica-Bold', 7)
-        lineas_nombre = dividir_texto_por_ancho(c, nombre, 'Helvetica-Bold', 7, ancho_util * 0.9)
-        for linea in lineas_nombre:
+    if nombre_producto:
+        nombre = nombre_producto.strip().upper()
+        for linea in dividir_texto_por_ancho(nombre, 'Helvetica-Bold', 7, ancho_util * 0.9):
             lineas.append(('Helvetica-Bold', 7, linea))
     
     # SKU
-    if datos.get('sku'):
-        sku = f"SKU: {datos['sku']}"
-        lineas.append(('Helvetica', 6, sku))
+    if sku:
+        lineas.append(('Helvetica', 6, f"SKU: {sku}"))
     
     # Valor
-    if datos.get('valor'):
-        valor = f"${datos['valor']}"
-        lineas.append(('Helvetica-Bold', 7, valor))
+    if valor:
+        lineas.append(('Helvetica-Bold', 7, f"${valor}"))
     
     # Otro CON SALTOS DE LÍNEA AUTOMÁTICOS
-    if datos.get('otro'):
-        otro = datos['otro'].strip()
-        c.setFont('Helvetica', 6)
-        lineas_otro = dividir_texto_por_ancho(c, otro, 'Helvetica', 6, ancho_util * 0.9)
-        for linea in lineas_otro:
+    if otro:
+        for linea in dividir_texto_por_ancho(otro.strip(), 'Helvetica', 6, ancho_util * 0.9):
             lineas.append(('Helvetica', 6, linea))
     
     if not lineas:
-        return
+        return ()
     
     altura_total = len(lineas) * line_height
     
@@ -319,29 +1059,996 @@ def dibujar_etiqueta_personalizada(c: canvas.Canvas, datos: Dict, x: float, y: f
     if altura_total > max_altura:
         line_height = max_altura / len(lineas)
     
-    text_y = y + (alto_util + altura_total) / 2 - line_height / 2
+    dy = (alto_util + altura_total) / 2 - line_height / 2
     
+    layout = []
     for fuente, tamaño, texto in lineas:
-        c.setFont(fuente, tamaño)
-        text_width = c.stringWidth(texto, fuente, tamaño)
-        text_x = center_x - text_width / 2
-        c.drawString(text_x, text_y, texto)
-        text_y -= line_height
+        dx = ancho_etiqueta / 2 - medir_texto(texto, fuente, tamaño) / 2
+        layout.append((fuente, tamaño, texto, dx, dy))
+        dy -= line_height
+    return tuple(layout)
+
+def caja_codigo_personalizado(ancho_etiqueta: float, alto_etiqueta: float) -> Tuple[float, float, float]:
+    """(dx, dy, lado) del cuadrado que ocupa el código (QR) a la derecha de una etiqueta personalizada"""
+    padding = 1.5 * mm
+    lado = min(alto_etiqueta - 2 * padding, (ancho_etiqueta - 2 * padding) * 0.45)
+    return ancho_etiqueta - padding - lado, (alto_etiqueta - lado) / 2, lado
+
+def dibujar_etiqueta_personalizada(c: canvas.Canvas, datos: Dict, x: float, y: float,
+                                   layout: Optional[LayoutHoja] = None) -> None:
+    """Dibuja una etiqueta personalizada reproduciendo su layout precalculado"""
+    layout = layout or obtener_layout()
+    lineas = calcular_layout_etiqueta_personalizada(
+        clave_etiqueta_personalizada(datos), layout.label_width, layout.label_height)
+    
+    c.setFillColor(colores.black)
+    fuente_actual = None
+    for fuente, tamaño, texto, dx, dy in lineas:
+        if (fuente, tamaño) != fuente_actual:
+            c.setFont(fuente, tamaño)
+            fuente_actual = (fuente, tamaño)
+        c.drawString(x + dx, y + dy, texto)
+    
+    if datos.get('codigo'):
+        dx, dy, lado = caja_codigo_personalizado(layout.label_width, layout.label_height)
+        dibujar_geometria_codigo(c, generar_barcode_vectorial(datos['codigo'], datos.get('simbologia')),
+                                 x + dx, y + dy, lado, lado)
+
+# Salida directa para impresoras térmicas: texto ZPL (Zebra) o EPL (Eltron).
+# Una etiqueta por producto con la cantidad como orden de impresión, usando
+# las simbologías y las fuentes propias de la impresora; no se genera ningún PDF.
+FORMATOS_SALIDA = ('pdf', 'zpl', 'epl')
+
+def tipo_mime(nombre_archivo: str) -> str:
+    """Tipo MIME de un archivo generado según su extensión"""
+    if nombre_archivo.endswith('.pdf'):
+        return 'application/pdf'
+    return 'text/plain'
+
+# Fuentes residentes EPL 1-5: (ancho, alto) de cada carácter en puntos, por dpi
+FUENTES_EPL = {
+    203: {1: (10, 12), 2: (12, 16), 3: (14, 20), 4: (16, 24), 5: (34, 48)},
+    300: {1: (14, 20), 2: (18, 28), 3: (22, 36), 4: (26, 44), 5: (66, 96)},
+}
+
+def a_puntos_termica(medida: float) -> int:
+    """Convierte una medida de ReportLab (1/72") a puntos del cabezal"""
+    return round(medida * LabelConfig.TERMICA_DPI / 72)
+
+def geometria_termica_codigo_barras(codigo: str, layout: LayoutHoja, simbologia: str = SIMBOLOGIA_DEFECTO,
+                                    caja: Optional[Tuple[int, int, int, int]] = None) -> Dict:
+    """
+    Posición y tamaño del código de barras en puntos, con las medidas de
+    BARCODE_CONFIG y el ajuste fino del layout, centrado en la etiqueta o en
+    la caja (x, y, ancho, alto) en puntos. Un código 2D usa el módulo más
+    grande con el que entra en la caja junto con su zona silenciosa.
+    """
+    config = LabelConfig.BARCODE_CONFIG
+    ancho = a_puntos_termica(layout.label_width)
+    alto = a_puntos_termica(layout.label_height)
+    padding = a_puntos_termica(layout.PADDING)
+    caja_x, caja_y, caja_ancho, caja_alto = caja or (padding, padding, ancho - 2 * padding, alto - 2 * padding)
+    
+    modulos = codificar_codigo(codigo, simbologia)
+    if modulos.filas > 1:
+        lado = modulos.ancho + 2 * obtener_simbologia(simbologia).zona_silencio
+        modulo = max(1, min(caja_ancho, caja_alto) // lado)
+        alto_barras = modulos.filas * modulo
+        alto_texto = separacion = 0
+    else:
+        modulo = max(1, a_puntos_termica(config['module_width'] * mm))
+        while modulo > 1 and modulos.ancho * modulo > caja_ancho:
+            modulo -= 1
+        alto_texto = a_puntos_termica(config['font_size']) if config.get('write_text', True) else 0
+        separacion = a_puntos_termica(1 * mm) if alto_texto else 0
+        alto_barras = min(a_puntos_termica(config['module_height'] * mm), caja_alto - alto_texto - separacion)
+    
+    return {
+        'ancho': ancho,
+        'alto': alto,
+        'x': max(0, caja_x + (caja_ancho - modulos.ancho * modulo) // 2 + a_puntos_termica(layout.fine_tune_x)),
+        'y': max(0, caja_y + (caja_alto - alto_barras - alto_texto - separacion) // 2
+                 - a_puntos_termica(layout.fine_tune_y)),
+        'modulo': modulo,
+        'alto_barras': alto_barras,
+        'texto': bool(alto_texto),
+        'modulos': modulos,
+    }
+
+def cajas_termica(g: Dict) -> Iterator[Tuple[int, int, int, int]]:
+    """Corridas del código como cajas (x, y, ancho, alto) en puntos, para impresoras sin la simbología"""
+    modulo = g['modulo']
+    alto_fila = modulo if g['modulos'].filas > 1 else g['alto_barras']
+    for fila, inicio, largo in g['modulos'].barras:
+        yield g['x'] + inicio * modulo, g['y'] + fila * alto_fila, largo * modulo, alto_fila
+
+def zpl_simbolo(codigo: str, simbologia: str, g: Dict) -> List[str]:
+    """Campo ZPL del código: el comando nativo de la simbología o sus cajas con ^GB"""
+    simbolo = obtener_simbologia(simbologia)
+    dato = texto_zpl(simbolo.dato_termica(codigo))
+    texto = 'Y' if g['texto'] else 'N'
+    if simbolo.zpl_comando == 'BC':
+        return [f"^FO{g['x']},{g['y']}^BY{g['modulo']}^BCN,{g['alto_barras']},{texto},N,N,A^FH^FD{dato}^FS"]
+    if simbolo.zpl_comando in ('BE', 'BU'):
+        extra = ',Y' if simbolo.zpl_comando == 'BU' else ''
+        return [f"^FO{g['x']},{g['y']}^BY{g['modulo']}^{simbolo.zpl_comando}N,{g['alto_barras']},{texto},N{extra}"
+                f"^FH^FD{dato}^FS"]
+    if simbolo.zpl_comando == 'BQ':
+        # Modelo 2, corrección M y modo automático, como el QR de las etiquetas PDF
+        return [f"^FO{g['x']},{g['y']}^BQN,2,{min(g['modulo'], 10)}^FH^FDMA,{dato}^FS"]
+    return [f"^FO{x},{y}^GB{ancho},{alto},{min(ancho, alto)}^FS" for x, y, ancho, alto in cajas_termica(g)]
+
+def epl_simbolo(codigo: str, simbologia: str, g: Dict) -> List[str]:
+    """Comando EPL del código: el nativo de la simbología o sus cajas con LO"""
+    simbolo = obtener_simbologia(simbologia)
+    if simbolo.epl_comando is None:
+        return [f"LO{x},{y},{ancho},{alto}" for x, y, ancho, alto in cajas_termica(g)]
+    return [f"B{g['x']},{g['y']},0,{simbolo.epl_comando},{g['modulo']},{g['modulo']},{g['alto_barras']},"
+            f"{'B' if g['texto'] else 'N'},\"{texto_epl(simbolo.dato_termica(codigo))}\""]
+
+def texto_zpl(texto: str) -> str:
+    """Escapa un campo para ^FH (indicador '_'): los caracteres de control de ZPL van en hexadecimal"""
+    return texto.replace('_', '_5F').replace('^', '_5E').replace('~', '_7E')
+
+def texto_epl(texto: str) -> str:
+    """Escapa un campo entre comillas de EPL"""
+    return texto.replace('\\', '\\\\').replace('"', '\\"')
+
+def zpl_codigo_barras(producto: Dict, layout: LayoutHoja) -> List[str]:
+    """Formato ZPL de una etiqueta de código de barras, impresa `cantidad` veces"""
+    codigo, simbologia = clave_codigo(producto)
+    g = geometria_termica_codigo_barras(codigo, layout, simbologia)
+    return [
+        '^XA',
+        '^CI28',
+        f"^PW{g['ancho']}",
+        f"^LL{g['alto']}",
+        *zpl_simbolo(codigo, simbologia, g),
+        f"^PQ{producto['cantidad']}",
+        '^XZ',
+    ]
+
+def epl_codigo_barras(producto: Dict, layout: LayoutHoja) -> List[str]:
+    """Formato EPL de una etiqueta de código de barras, impresa `cantidad` veces"""
+    codigo, simbologia = clave_codigo(producto)
+    g = geometria_termica_codigo_barras(codigo, layout, simbologia)
+    return [
+        '',
+        'N',
+        f"q{g['ancho']}",
+        f"Q{g['alto']},{a_puntos_termica(LabelConfig.TERMICA_GAP_MM * mm)}",
+        *epl_simbolo(codigo, simbologia, g),
+        f"P{producto['cantidad']}",
+    ]
+
+def geometria_termica_personalizada(producto: Dict, layout: LayoutHoja) -> Optional[Dict]:
+    """Geometría del código de una etiqueta personalizada (en su cuadrado), o None si no lleva"""
+    if not producto.get('codigo'):
+        return None
+    dx, dy, lado = caja_codigo_personalizado(layout.label_width, layout.label_height)
+    # dy se mide desde abajo; las impresoras ubican desde arriba
+    caja = (a_puntos_termica(dx), a_puntos_termica(layout.label_height - dy - lado),
+            a_puntos_termica(lado), a_puntos_termica(lado))
+    return geometria_termica_codigo_barras(producto['codigo'], layout, producto.get('simbologia'), caja)
+
+def lineas_termica_personalizada(producto: Dict, layout: LayoutHoja) -> List[Tuple[int, int, str]]:
+    """
+    Reutiliza el layout de la etiqueta PDF (mismos cortes de línea) y lo pasa a
+    puntos: (y superior, alto de la fuente, texto) de cada línea
+    """
+    lineas = calcular_layout_etiqueta_personalizada(
+        clave_etiqueta_personalizada(producto), layout.label_width, layout.label_height)
+    alto = a_puntos_termica(layout.label_height)
+    ajuste_y = a_puntos_termica(layout.fine_tune_y)
+    resultado = []
+    for fuente, tamaño, texto, dx, dy in lineas:
+        alto_fuente = a_puntos_termica(tamaño)
+        # dy es la línea base medida desde abajo; las impresoras ubican el campo por su esquina superior
+        y = alto - a_puntos_termica(dy) - round(alto_fuente * 0.75) - ajuste_y
+        resultado.append((max(0, y), alto_fuente, texto))
+    return resultado
+
+def zpl_personalizado(producto: Dict, layout: LayoutHoja) -> List[str]:
+    """Formato ZPL de una etiqueta personalizada, impresa `cantidad` veces"""
+    ancho = a_puntos_termica(layout.label_width)
+    ajuste_x = a_puntos_termica(layout.fine_tune_x)
+    comandos = ['^XA', '^CI28', f"^PW{ancho}", f"^LL{a_puntos_termica(layout.label_height)}"]
+    g = geometria_termica_personalizada(producto, layout)
+    ancho_texto = a_puntos_termica(caja_codigo_personalizado(layout.label_width, layout.label_height)[0]) if g else ancho
+    for y, alto_fuente, texto in lineas_termica_personalizada(producto, layout):
+        # ^FB de una línea centra el texto con las métricas de la propia impresora
+        comandos.append(f"^FO{max(0, ajuste_x)},{y}^A0N,{alto_fuente},{alto_fuente}"
+                        f"^FB{ancho_texto},1,0,C,0^FH^FD{texto_zpl(texto)}^FS")
+    if g:
+        comandos += zpl_simbolo(producto['codigo'], producto.get('simbologia'), g)
+    comandos += [f"^PQ{producto['cantidad']}", '^XZ']
+    return comandos
+
+def epl_personalizado(producto: Dict, layout: LayoutHoja) -> List[str]:
+    """Formato EPL de una etiqueta personalizada, impresa `cantidad` veces"""
+    ancho = a_puntos_termica(layout.label_width)
+    alto = a_puntos_termica(layout.label_height)
+    ajuste_x = a_puntos_termica(layout.fine_tune_x)
+    fuentes = FUENTES_EPL.get(LabelConfig.TERMICA_DPI, FUENTES_EPL[203])
+    comandos = ['', 'N', f"q{ancho}", f"Q{alto},{a_puntos_termica(LabelConfig.TERMICA_GAP_MM * mm)}"]
+    g = geometria_termica_personalizada(producto, layout)
+    ancho_texto = a_puntos_termica(caja_codigo_personalizado(layout.label_width, layout.label_height)[0]) if g else ancho
+    for y, alto_fuente, texto in lineas_termica_personalizada(producto, layout):
+        # La fuente residente más grande que no supere el alto pedido
+        fuente = max((n for n, (_, h) in fuentes.items() if h <= alto_fuente), default=1)
+        ancho_caracter = fuentes[fuente][0]
+        x = max(0, (ancho_texto - len(texto) * ancho_caracter) // 2 + ajuste_x)
+        comandos.append(f'A{x},{y},0,{fuente},1,1,N,"{texto_epl(texto)}"')
+    if g:
+        comandos += epl_simbolo(producto['codigo'], producto.get('simbologia'), g)
+    comandos.append(f"P{producto['cantidad']}")
+    return comandos
+
+COMANDOS_TERMICA = {
+    ('zpl', 'codigo_barras'): zpl_codigo_barras,
+    ('zpl', 'personalizado'): zpl_personalizado,
+    ('epl', 'codigo_barras'): epl_codigo_barras,
+    ('epl', 'personalizado'): epl_personalizado,
+}
+
+def generar_termica(productos: List[Dict], tipo_etiqueta: str, formato: str,
+                    layout: Optional[LayoutHoja] = None) -> bytes:
+    """Genera el trabajo de impresión ZPL/EPL de todos los productos, listo para enviar a la impresora"""
+    if not productos:
+        raise ValueError("No hay productos para generar")
+    
+    layout = layout or obtener_layout()
+    comandos_producto = COMANDOS_TERMICA[(formato, tipo_etiqueta)]
+    
+    comandos = []
+    with medir_etapa('dibujo', tipo=tipo_etiqueta):
+        if formato == 'epl':
+            # Página de códigos 850 (8 bits) para acentos y eñes
+            comandos.append('I8,1,001')
+        for producto in productos:
+            comandos.extend(comandos_producto(producto, layout))
+    
+    if formato == 'epl':
+        return ('\r\n'.join(comandos) + '\r\n').encode('cp850', errors='replace')
+    return ('\n'.join(comandos) + '\n').encode('utf-8')
+
+# Vistas previas: miniaturas PNG de una hoja dibujadas con Pillow a partir del
+# layout y del contenido de cada archivo, sin abrir ni rasterizar el PDF
+class TrazoVistaPrevia:
+    """Equivalente mínimo de un path de ReportLab: solo rectángulos"""
+    
+    def __init__(self):
+        self.rects = []
+    
+    def rect(self, x: float, y: float, ancho: float, alto: float) -> None:
+        self.rects.append((x, y, ancho, alto))
+
+class LienzoVistaPrevia:
+    """
+    El subconjunto de la API de canvas que usan las funciones de dibujo de
+    etiquetas, implementado sobre una imagen de Pillow. Así la miniatura sale
+    de las mismas funciones (y la misma geometría) que el PDF.
+    """
+    
+    def __init__(self, layout: LayoutHoja, ancho_px: int):
+        self.escala = ancho_px / layout.page_width
+        self.alto_pagina = layout.page_height
+        self.imagen = Image.new('RGB', (ancho_px, max(1, round(layout.page_height * self.escala))), 'white')
+        self.draw = ImageDraw.Draw(self.imagen)
+        self._origen = (0.0, 0.0)
+        self._estados = []
+        self._trazo = (0, 0, 0)
+        self._relleno = (0, 0, 0)
+        self._ancho_linea = 1.0
+        self._fuente = None
+    
+    @staticmethod
+    def _rgb(color) -> Tuple[int, int, int]:
+        return tuple(round(componente * 255) for componente in (color.red, color.green, color.blue))
+    
+    def _px(self, x: float, y: float) -> Tuple[float, float]:
+        """Punto de ReportLab (origen abajo a la izquierda) a píxel (origen arriba)"""
+        return ((x + self._origen[0]) * self.escala,
+                (self.alto_pagina - y - self._origen[1]) * self.escala)
+    
+    def _caja(self, x: float, y: float, ancho: float, alto: float) -> List[float]:
+        x0, y0 = self._px(x, y + alto)
+        x1, y1 = self._px(x + ancho, y)
+        return [x0, y0, max(x0, x1 - 1), max(y0, y1 - 1)]
+    
+    def setFillColor(self, color) -> None:
+        self._relleno = self._rgb(color)
+    
+    def setStrokeColor(self, color) -> None:
+        self._trazo = self._rgb(color)
+    
+    def setLineWidth(self, ancho: float) -> None:
+        self._ancho_linea = ancho
+    
+    def saveState(self) -> None:
+        self._estados.append((self._origen, self._trazo, self._relleno, self._ancho_linea, self._fuente))
+    
+    def restoreState(self) -> None:
+        self._origen, self._trazo, self._relleno, self._ancho_linea, self._fuente = self._estados.pop()
+    
+    def translate(self, dx: float, dy: float) -> None:
+        self._origen = (self._origen[0] + dx, self._origen[1] + dy)
+    
+    def beginPath(self) -> TrazoVistaPrevia:
+        return TrazoVistaPrevia()
+    
+    def drawPath(self, trazo: TrazoVistaPrevia, stroke: int = 1, fill: int = 0) -> None:
+        for rect in trazo.rects:
+            self.rect(*rect, stroke=stroke, fill=fill)
+    
+    def rect(self, x: float, y: float, ancho: float, alto: float, stroke: int = 1, fill: int = 0) -> None:
+        self.draw.rectangle(self._caja(x, y, ancho, alto),
+                            fill=self._relleno if fill else None,
+                            outline=self._trazo if stroke else None,
+                            width=max(1, round(self._ancho_linea * self.escala)))
+    
+    def line(self, x1: float, y1: float, x2: float, y2: float) -> None:
+        self.draw.line([self._px(x1, y1), self._px(x2, y2)], fill=self._trazo,
+                       width=max(1, round(self._ancho_linea * self.escala)))
+    
+    def setFont(self, fuente: str, tamaño: float) -> None:
+        self._fuente = fuente_vista_previa(max(1, round(tamaño * self.escala)))
+    
+    def drawString(self, x: float, y: float, texto: str) -> None:
+        self.draw.text(self._px(x, y), texto, fill=self._relleno, font=self._fuente, anchor='ls')
+    
+    def drawCentredString(self, x: float, y: float, texto: str) -> None:
+        self.draw.text(self._px(x, y), texto, fill=self._relleno, font=self._fuente, anchor='ms')
+
+@lru_cache(maxsize=64)
+def fuente_vista_previa(tamaño_px: int):
+    """DejaVu Sans si está instalada (cubre acentos y eñes); si no, la fuente incluida en Pillow"""
+    try:
+        return ImageFont.truetype('DejaVuSans.ttf', tamaño_px)
+    except OSError:
+        return ImageFont.load_default(size=tamaño_px)
+
+# Contenido de cada archivo generado (por nombre) y miniaturas ya dibujadas. En modo 'disco'
+# los dos se guardan además junto al PDF (ver ruta_vista_previa): cualquier worker los encuentra,
+# también después de un reinicio; estas cachés del proceso solo evitan releerlos
+descriptores_vista_previa = CacheLRU(int(os.environ.get('VISTAS_PREVIAS_DESCRIPTORES_BYTES', 8 * 1024 * 1024)))
+cache_vistas_previas = CacheLRU(int(os.environ.get('VISTAS_PREVIAS_BYTES', 16 * 1024 * 1024)))
+
+def ruta_vista_previa(nombre_archivo: str, sufijo: str) -> str:
+    """
+    Archivo de vista previa de un PDF generado, a su lado en pdfs_generados/.
+    Lleva el mismo prefijo de lote, así que se barre y se borra con el lote.
+    """
+    return os.path.join('pdfs_generados', f"{nombre_archivo}.{sufijo}")
+
+def guardar_archivo_vista_previa(ruta: str, datos: bytes) -> None:
+    """Escritura atómica (otro worker puede estar leyéndolo); un fallo solo se registra"""
+    if LabelConfig.MODO_ENTREGA == 'memoria':
+        return
+    temporal = f"{ruta}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(temporal, 'wb') as f:
+            f.write(datos)
+        os.replace(temporal, ruta)
+    except OSError as e:
+        logger.warning("No se pudo guardar la vista previa %s: %s", ruta, e)
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        return
+    gestor_artefactos.registrar(ruta)
+
+def leer_archivo_vista_previa(ruta: str) -> Optional[bytes]:
+    try:
+        with open(ruta, 'rb') as f:
+            datos = f.read()
+    except OSError:
+        return None
+    gestor_artefactos.tocar(ruta)
+    return datos
+
+def guardar_descriptor_vista_previa(nombre_archivo: str, descriptor: Dict) -> None:
+    descriptores_vista_previa.guardar(nombre_archivo, descriptor, descriptor['tamaño'])
+    guardar_archivo_vista_previa(ruta_vista_previa(nombre_archivo, 'vista.json'),
+                                 json.dumps(descriptor, ensure_ascii=False).encode('utf-8'))
+
+def cargar_descriptor_vista_previa(nombre_archivo: str) -> Optional[Dict]:
+    """Descriptor del archivo desde la caché del proceso o desde el disco; None si no tiene"""
+    descriptor = descriptores_vista_previa.obtener(nombre_archivo)
+    if descriptor is not None:
+        return descriptor
+    datos = leer_archivo_vista_previa(ruta_vista_previa(nombre_archivo, 'vista.json'))
+    if datos is None:
+        return None
+    try:
+        descriptor = json.loads(datos)
+    except ValueError:
+        return None
+    # JSON no tiene tuplas: las claves de contenido vuelven a serlo (son claves de caché)
+    descriptor['contenido'] = [(tuple(clave), cantidad) for clave, cantidad in descriptor['contenido']]
+    descriptores_vista_previa.guardar(nombre_archivo, descriptor, descriptor['tamaño'])
+    return descriptor
+
+def descriptor_vista_previa(tipo_etiqueta: str, productos: List[Dict], layout: LayoutHoja) -> Dict:
+    """Lo necesario para redibujar cualquier hoja de un PDF: perfil y tandas (contenido, cantidad)"""
+    if tipo_etiqueta == 'codigo_barras':
+        contenido = [(clave_codigo(p), p['cantidad']) for p in productos]
+    else:
+        contenido = [(clave_etiqueta_personalizada(p), p['cantidad']) for p in productos]
+    firma = json.dumps([tipo_etiqueta, layout.nombre, contenido], ensure_ascii=False)
+    return {
+        'tipo': tipo_etiqueta,
+        'perfil': layout.nombre,
+        'contenido': contenido,
+        'huella': hashlib.sha1(firma.encode('utf-8')).hexdigest(),
+        'tamaño': len(firma),
+    }
+
+def paginas_vista_previa(descriptor: Dict) -> int:
+    layout = obtener_layout(descriptor['perfil'])
+    return layout.paginas(sum(cantidad for _, cantidad in descriptor['contenido']))
+
+def generar_vista_previa(descriptor: Dict, pagina: int, ancho_px: int) -> bytes:
+    """PNG de una hoja (pagina desde 1) dibujada con las funciones de dibujo del PDF"""
+    layout = obtener_layout(descriptor['perfil'])
+    lienzo = LienzoVistaPrevia(layout, ancho_px)
+    dibujar_marco_completo(lienzo, layout)
+    
+    # Saltar las etiquetas de las hojas anteriores recorriendo solo las tandas
+    saltar = (pagina - 1) * layout.por_pagina
+    posicion = 0
+    for datos, cantidad in descriptor['contenido']:
+        if saltar >= cantidad:
+            saltar -= cantidad
+            continue
+        copias = min(cantidad - saltar, layout.por_pagina - posicion)
+        saltar = 0
+        for _ in range(copias):
+            x, y = layout.posiciones[posicion]
+            if descriptor['tipo'] == 'codigo_barras':
+                dibujar_codigo_barras_vectorial(lienzo, generar_barcode_vectorial(*datos), x, y, layout)
+            else:
+                campos = dict(zip(CAMPOS_PERSONALIZADOS, datos))
+                dibujar_etiqueta_personalizada(lienzo, campos, x, y, layout)
+            posicion += 1
+        if posicion == layout.por_pagina:
+            break
+    
+    buffer = BytesIO()
+    lienzo.imagen.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+def obtener_vista_previa(nombre_archivo: str, pagina: int, ancho_px: int) -> Optional[bytes]:
+    """
+    Miniatura desde la caché del proceso, desde el disco o dibujada en el
+    momento a partir del descriptor; None si el archivo no tiene vista previa
+    """
+    descriptor = cargar_descriptor_vista_previa(nombre_archivo)
+    if descriptor is None or not 1 <= pagina <= paginas_vista_previa(descriptor):
+        return None
+    
+    clave = (nombre_archivo, descriptor['huella'], pagina, ancho_px)
+    png = cache_vistas_previas.obtener(clave)
+    if png is None:
+        ruta = ruta_vista_previa(nombre_archivo, f"vista-{pagina}-{ancho_px}.png")
+        png = leer_archivo_vista_previa(ruta)
+        if png is None:
+            with medir_etapa('vista_previa', tipo=descriptor['tipo']):
+                png = generar_vista_previa(descriptor, pagina, ancho_px)
+            guardar_archivo_vista_previa(ruta, png)
+        cache_vistas_previas.guardar(clave, png, len(png))
+    return png
+
+# PDFs generados en modo 'memoria', por nombre de archivo
+almacen_memoria = CacheLRU(int(os.environ.get('MEMORIA_PDFS_BYTES', 256 * 1024 * 1024)))
+
+TAMAÑO_CHUNK = 64 * 1024
+
+# Los archivos generados llevan adelante los primeros 12 caracteres del id de su lote
+PREFIJO_LOTE = re.compile(r'^([0-9a-f]{12})_(.+)$')
+
+def nombre_en_lote(lote: str, nombre_archivo: str) -> str:
+    """Nombre de archivo con el id del lote adelante: dos lotes nunca escriben el mismo archivo"""
+    return f"{lote[:12]}_{nombre_archivo}"
+
+def lote_archivo(ruta: str) -> Optional[str]:
+    """Prefijo de lote de un archivo generado (ver nombre_en_lote), o None si no lo tiene"""
+    coincidencia = PREFIJO_LOTE.match(os.path.basename(ruta))
+    return coincidencia.group(1) if coincidencia else None
+
+def nombre_descarga(nombre_archivo: str) -> str:
+    """Nombre con el que el operador recibe el archivo: sin el prefijo del lote"""
+    coincidencia = PREFIJO_LOTE.match(nombre_archivo)
+    return coincidencia.group(2) if coincidencia else nombre_archivo
+
+def cabecera_adjunto(nombre_archivo: str) -> str:
+    """
+    Content-Disposition de una descarga, igual al que arma send_file: nombre
+    entre comillas y, si no es ASCII, también codificado según RFC 5987
+    """
+    opciones = {'filename': nombre_archivo}
+    try:
+        nombre_archivo.encode('ascii')
+    except UnicodeEncodeError:
+        opciones['filename'] = unicodedata.normalize('NFKD', nombre_archivo).encode('ascii', 'ignore').decode('ascii')
+        opciones['filename*'] = f"UTF-8''{quote(nombre_archivo, safe='!#$&+^`|~')}"
+    return dump_options_header('attachment', opciones)
+
+def destino_pdf(nombre_archivo: str):
+    """Retorna dónde escribir un PDF según MODO_ENTREGA: ruta en disco o buffer"""
+    if LabelConfig.MODO_ENTREGA == 'memoria':
+        return BytesIO()
+    return os.path.join('pdfs_generados', nombre_archivo)
+
+def registrar_pdf(resultado: Dict) -> Dict:
+    """
+    Pasa los bytes de un PDF generado en memoria al almacén del proceso,
+    registra su descriptor de vista previa y aplica las métricas y los
+    archivos registrados en un proceso hijo
+    """
+    metricas.aplicar(resultado.pop('metricas', []))
+    gestor_artefactos.aplicar(resultado.pop('artefactos', []))
+    datos = resultado.pop('datos', None)
+    if datos is not None:
+        almacen_memoria.guardar(resultado['nombre_archivo'], datos, len(datos))
+    descriptor = resultado.pop('vista_previa', None)
+    if descriptor is not None:
+        guardar_descriptor_vista_previa(resultado['nombre_archivo'], descriptor)
+        resultado['vista_previa'] = True
+    return resultado
+
+def abrir_artefacto(nombre_archivo: str):
+    """Abre un archivo generado (en memoria o en disco) para lectura, o None"""
+    datos = almacen_memoria.obtener(nombre_archivo)
+    if datos is not None:
+        return BytesIO(datos)
+    ruta_archivo = os.path.join('pdfs_generados', nombre_archivo)
+    if os.path.isfile(ruta_archivo):
+        gestor_artefactos.tocar(ruta_archivo)
+        return open(ruta_archivo, 'rb')
+    return None
+
+class GestorArtefactos:
+    """
+    Ciclo de vida de los archivos generados en disco (pdfs_generados/, la caché
+    de PDFs y la de ZIPs).
+    
+    El estado es el del propio disco, así que todos los workers ven el mismo:
+    el último uso de un archivo es su fecha de acceso (tocar la adelanta con
+    os.utime), su lote sale del nombre (ver nombre_en_lote) y el total se suma
+    recorriendo los directorios. Un hilo de barrido por proceso borra los que
+    llevan `ttl` segundos sin usarse y, si el total supera `cuota_bytes`, los
+    usados hace más tiempo; nunca los de un lote activo en cualquier worker
+    (`lotes_activos`, que lee el registro compartido de trabajos).
+    
+    Entre barridos, cada proceso suma al total medido en el último lo que
+    escribió él, y adelanta el barrido si con eso se pasa de la cuota. En un
+    proceso hijo del pool, los registros quedan pendientes y viajan con el
+    resultado al principal.
+    """
+    
+    def __init__(self, directorios: List[str], ttl: int, cuota_bytes: int, intervalo: int,
+                 lotes_activos: Callable[[], set]):
+        self.directorios = directorios
+        self.ttl = ttl
+        self.cuota_bytes = cuota_bytes
+        self.intervalo = intervalo
+        self.lotes_activos = lotes_activos
+        self._bytes = None
+        self._huellas = {}
+        self._lock = threading.Lock()
+        self._pendientes = []
+        self._barrido = None
+        self._despertar = threading.Event()
+    
+    def inventario(self) -> List[Tuple[float, str, int]]:
+        """(último acceso, ruta, tamaño) de cada archivo, del menos al más recientemente usado"""
+        encontrados = []
+        for directorio in self.directorios:
+            try:
+                with os.scandir(directorio) as entradas:
+                    for entrada in entradas:
+                        # Los .tmp son escrituras atómicas en curso de algún worker
+                        if not entrada.is_file(follow_symlinks=False) or entrada.name.endswith('.tmp'):
+                            continue
+                        try:
+                            info = entrada.stat()
+                        except FileNotFoundError:
+                            continue
+                        encontrados.append((max(info.st_atime, info.st_mtime), entrada.path, info.st_size))
+            except FileNotFoundError:
+                continue
+        encontrados.sort()
+        return encontrados
+    
+    def _iniciar_barrido(self) -> None:
+        """Hilo de barrido, creado con el primer registro de cada proceso (no antes del fork)"""
+        if self._barrido is None and self.intervalo > 0:
+            self._barrido = threading.Thread(target=self._barrer_periodicamente, name='barrido-artefactos',
+                                             daemon=True)
+            self._barrido.start()
+    
+    def registrar(self, ruta: str) -> None:
+        """Cuenta un archivo recién escrito para la cuota"""
+        if _en_pool_procesos:
+            self._pendientes.append(ruta)
+            return
+        try:
+            tamaño = os.path.getsize(ruta)
+        except OSError:
+            return
+        with self._lock:
+            if self._bytes is None:
+                # El archivo ya está en disco: el inventario lo incluye
+                self._bytes = sum(tamaño for _, _, tamaño in self.inventario())
+            else:
+                self._bytes += tamaño
+            excedido = self.cuota_bytes > 0 and self._bytes > self.cuota_bytes
+            self._iniciar_barrido()
+        if excedido:
+            self._despertar.set()
+    
+    def tocar(self, ruta: str) -> None:
+        """Marca un archivo como usado ahora (descarga, ZIP o acierto de caché), para todos los workers"""
+        try:
+            os.utime(ruta, ns=(time.time_ns(), os.stat(ruta).st_mtime_ns))
+        except OSError:
+            pass
+    
+    def huella(self, ruta: str) -> Optional[str]:
+        """
+        SHA-256 del contenido del archivo, o None si ya no existe. Cada proceso
+        la calcula una vez por archivo y la recalcula solo si cambió su tamaño
+        o su fecha de modificación (tocar no la cambia).
+        """
+        try:
+            info = os.stat(ruta)
+        except OSError:
+            return None
+        firma = (info.st_size, info.st_mtime_ns)
+        with self._lock:
+            guardada = self._huellas.get(ruta)
+            if guardada is not None and guardada[0] == firma:
+                return guardada[1]
+        
+        calculo = hashlib.sha256()
+        try:
+            with open(ruta, 'rb') as f:
+                while True:
+                    chunk = f.read(TAMAÑO_CHUNK)
+                    if not chunk:
+                        break
+                    calculo.update(chunk)
+        except OSError:
+            return None
+        huella = calculo.hexdigest()
+        
+        with self._lock:
+            self._huellas[ruta] = (firma, huella)
+        return huella
+    
+    def drenar_pendientes(self) -> List[str]:
+        """Registros hechos en un proceso hijo, para enviarlos al principal"""
+        pendientes, self._pendientes = self._pendientes, []
+        return pendientes
+    
+    def aplicar(self, pendientes: List[str]) -> None:
+        for ruta in pendientes:
+            self.registrar(ruta)
+    
+    def _borrar(self, archivos: List[Tuple[float, str, int]], motivo: str) -> int:
+        eliminados = 0
+        liberados = 0
+        for _, ruta, tamaño in archivos:
+            try:
+                os.remove(ruta)
+                eliminados += 1
+                liberados += tamaño
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning("No se pudo borrar %s: %s", ruta, e)
+        with self._lock:
+            for _, ruta, _ in archivos:
+                self._huellas.pop(ruta, None)
+            if self._bytes is not None:
+                self._bytes = max(0, self._bytes - liberados)
+        if eliminados:
+            metricas.incrementar('etiquetas_artefactos_eliminados_total', eliminados, motivo=motivo)
+        return eliminados
+    
+    def eliminar_lote(self, lote: str) -> int:
+        """Borra los archivos de un lote (los de su prefijo, los haya escrito cualquier worker)"""
+        prefijo = lote[:12]
+        return self._borrar([archivo for archivo in self.inventario() if lote_archivo(archivo[1]) == prefijo],
+                            'manual')
+    
+    def barrer(self) -> int:
+        """Borra los vencidos por TTL y, sobre la cuota, los menos usados. Retorna cuántos"""
+        protegidos = {lote[:12] for lote in self.lotes_activos()}
+        limite = time.time() - self.ttl
+        archivos = self.inventario()
+        with self._lock:
+            # _borrar descuenta lo que se borre
+            self._bytes = sum(tamaño for _, _, tamaño in archivos)
+        vencidos = []
+        restantes = []
+        for archivo in archivos:
+            if archivo[0] < limite and lote_archivo(archivo[1]) not in protegidos:
+                vencidos.append(archivo)
+            else:
+                restantes.append(archivo)
+        
+        sobre_cuota = []
+        if self.cuota_bytes > 0:
+            total = sum(tamaño for _, _, tamaño in restantes)
+            # Del menos al más recientemente usado
+            for archivo in restantes:
+                if total <= self.cuota_bytes:
+                    break
+                if lote_archivo(archivo[1]) in protegidos:
+                    continue
+                sobre_cuota.append(archivo)
+                total -= archivo[2]
+        eliminados = self._borrar(vencidos, 'ttl') + self._borrar(sobre_cuota, 'cuota')
+        if eliminados:
+            logger.info("Barrido de archivos generados: %d borrados", eliminados)
+        return eliminados
+    
+    def _barrer_periodicamente(self) -> None:
+        while True:
+            self._despertar.wait(self.intervalo)
+            self._despertar.clear()
+            try:
+                self.barrer()
+            except Exception:
+                logger.exception("Error en el barrido de archivos generados")
+    
+    def estadisticas(self) -> Dict:
+        archivos = self.inventario()
+        return {
+            'archivos': len(archivos),
+            'bytes': sum(tamaño for _, _, tamaño in archivos),
+            'cuota_bytes': self.cuota_bytes,
+            'ttl': self.ttl,
+        }
+
+gestor_artefactos = GestorArtefactos(
+    ['pdfs_generados'] + [d for d in (LabelConfig.CACHE_ARTEFACTOS_DIR, LabelConfig.CACHE_ZIPS_DIR) if d],
+    LabelConfig.ARTEFACTOS_TTL, LabelConfig.ARTEFACTOS_CUOTA_BYTES, LabelConfig.ARTEFACTOS_INTERVALO_BARRIDO,
+    lambda: gestor_trabajos.ids())
+
+class CacheArtefactos:
+    """
+    Caché en disco de PDFs generados, direccionada por contenido.
+    
+    La clave es un hash de los datos normalizados que se imprimen, las
+    cantidades, el tipo de etiqueta, la geometría completa de la hoja y las
+    opciones de dibujo; cualquier cambio de calibración produce otra clave.
+    """
+    
+    # Incrementar cuando cambie la forma de dibujar para invalidar lo guardado
+    VERSION_RENDER = 3
+    
+    def __init__(self, directorio: str):
+        self.directorio = directorio
+    
+    @property
+    def activa(self) -> bool:
+        return bool(self.directorio)
+    
+    def clave(self, tipo_etiqueta: str, contenido: List, layout: 'LayoutHoja') -> str:
+        firma = {
+            'version': self.VERSION_RENDER,
+            'tipo': tipo_etiqueta,
+            'contenido': contenido,
+            'hoja': layout.firma(),
+            'render': LabelConfig.firma_render(),
+        }
+        serializado = json.dumps(firma, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(serializado.encode('utf-8')).hexdigest()
+    
+    def ruta(self, clave: str) -> str:
+        return os.path.join(self.directorio, f"{clave}.pdf")
+    
+    def copiar_a(self, clave: str, destino) -> bool:
+        """Copia el PDF guardado al destino (ruta o buffer); False si no existe"""
+        if not self.activa:
+            return False
+        try:
+            if isinstance(destino, str):
+                shutil.copyfile(self.ruta(clave), destino)
+            else:
+                with open(self.ruta(clave), 'rb') as f:
+                    destino.write(f.read())
+        except FileNotFoundError:
+            return False
+        gestor_artefactos.tocar(self.ruta(clave))
+        return True
+    
+    def guardar(self, clave: str, origen) -> None:
+        """Guarda el PDF recién generado; la escritura es atómica"""
+        if not self.activa:
+            return
+        os.makedirs(self.directorio, exist_ok=True)
+        temporal = f"{self.ruta(clave)}.{uuid.uuid4().hex}.tmp"
+        if isinstance(origen, str):
+            shutil.copyfile(origen, temporal)
+        else:
+            with open(temporal, 'wb') as f:
+                f.write(origen.getvalue())
+        os.replace(temporal, self.ruta(clave))
+        gestor_artefactos.registrar(self.ruta(clave))
+
+cache_artefactos = CacheArtefactos(LabelConfig.CACHE_ARTEFACTOS_DIR)
+
+def generar_pdf_con_cache(tipo_etiqueta: str, contenido: List, layout: 'LayoutHoja',
+                          destino, generar: Callable) -> bool:
+    """
+    Entrega en `destino` el PDF del contenido dado, desde la caché si ya se
+    generó antes o llamando a generar(destino). Retorna True si hubo acierto.
+    """
+    clave = cache_artefactos.clave(tipo_etiqueta, contenido, layout)
+    if cache_artefactos.copiar_a(clave, destino):
+        metricas.incrementar('etiquetas_cache_artefactos_total', resultado='hit')
+        return True
+    metricas.incrementar('etiquetas_cache_artefactos_total', resultado='miss')
+    generar(destino)
+    try:
+        cache_artefactos.guardar(clave, destino)
+    except OSError as e:
+        logger.warning("No se pudo guardar en caché %s: %s", clave, e)
+    return False
+
+class _SalidaZip:
+    """Destino no posicionable para zipfile que acumula los bytes escritos hasta vaciarlos"""
+    
+    def __init__(self):
+        self._chunks = []
+    
+    def write(self, datos) -> int:
+        self._chunks.append(bytes(datos))
+        return len(datos)
+    
+    def flush(self) -> None:
+        pass
+    
+    def vaciar(self) -> bytes:
+        datos = b''.join(self._chunks)
+        self._chunks = []
+        return datos
+
+def generar_zip_stream(lista_pdfs: List[Dict]):
+    """
+    Arma el ZIP al vuelo y lo entrega por bloques. Los PDFs ya vienen
+    comprimidos, así que se guardan sin compresión (ZIP_STORED).
+    """
+    salida = _SalidaZip()
+    # Solo se mide el trabajo propio, no el tiempo esperando al cliente entre bloques
+    duracion = 0.0
+    inicio = time.perf_counter()
+    with zipfile.ZipFile(salida, 'w', zipfile.ZIP_STORED) as zipf:
+        for pdf_info in lista_pdfs:
+            if not pdf_info.get('generado'):
+                continue
+            nombre_archivo = pdf_info.get('nombre_archivo') or os.path.basename(pdf_info.get('archivo', ''))
+            if pdf_info.get('archivo') and os.path.isfile(pdf_info['archivo']):
+                gestor_artefactos.tocar(pdf_info['archivo'])
+                fuente = open(pdf_info['archivo'], 'rb')
+            else:
+                fuente = abrir_artefacto(nombre_archivo)
+            if fuente is None:
+                continue
+            info = zipfile.ZipInfo(nombre_descarga(nombre_archivo), datetime.now().timetuple()[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            with fuente, zipf.open(info, 'w') as destino:
+                while True:
+                    chunk = fuente.read(TAMAÑO_CHUNK)
+                    if not chunk:
+                        break
+                    destino.write(chunk)
+                    duracion += time.perf_counter() - inicio
+                    yield salida.vaciar()
+                    inicio = time.perf_counter()
+    # Directorio central, escrito al cerrar el ZIP
+    datos = salida.vaciar()
+    duracion += time.perf_counter() - inicio
+    metricas.observar('etiquetas_etapa_segundos', duracion, etapa='zip')
+    yield datos
 
 def crear_zip_pdfs(lista_pdfs: List[Dict], zip_filename: str) -> None:
     """Crea archivo ZIP con todos los PDFs generados"""
     try:
-        with zipfile.ZipFile(zip_filename, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for pdf_info in lista_pdfs:
-                if pdf_info.get('generado') and os.path.exists(pdf_info['archivo']):
-                    zipf.write(pdf_info['archivo'], os.path.basename(pdf_info['archivo']))
+        with open(zip_filename, 'wb') as f:
+            for chunk in generar_zip_stream(lista_pdfs):
+                f.write(chunk)
     except Exception as e:
         raise RuntimeError(f"Error creando ZIP: {str(e)}")
 
-def validar_producto_codigo_barras(sku: str, codigo: str, cantidad: str, numero: int) -> Dict:
+class CacheZips:
+    """
+    ZIPs de "descargar todo" guardados en disco y direccionados por contenido.
+    
+    La clave es el hash de los nombres y las huellas SHA-256 de los PDFs
+    incluidos: repetir la descarga del mismo conjunto entrega el ZIP ya armado.
+    Cada conjunto distinto se arma una sola vez por proceso; las peticiones
+    simultáneas por el mismo conjunto esperan a la primera. Los PDFs van sin
+    comprimir (ZIP_STORED), así que armar uno es solo lectura y escritura secuencial.
+    """
+    
+    def __init__(self, directorio: str):
+        self.directorio = directorio
+        self._lock = threading.Lock()
+        self._en_construccion = {}
+    
+    @property
+    def activa(self) -> bool:
+        # En modo 'memoria' los PDFs no tocan el disco y el ZIP tampoco
+        return bool(self.directorio) and LabelConfig.MODO_ENTREGA != 'memoria'
+    
+    def clave(self, lista_pdfs: List[Dict]) -> Optional[str]:
+        """Hash del conjunto de archivos, o None si alguno no está en disco"""
+        partes = []
+        for pdf_info in lista_pdfs:
+            ruta = pdf_info.get('archivo') or os.path.join('pdfs_generados', pdf_info['nombre_archivo'])
+            huella = gestor_artefactos.huella(ruta)
+            if huella is None:
+                return None
+            # Las entradas del ZIP van sin el prefijo del lote: el mismo contenido comparte ZIP
+            partes.append((nombre_descarga(pdf_info['nombre_archivo']), huella))
+        serializado = json.dumps(partes, ensure_ascii=False)
+        return hashlib.sha256(serializado.encode('utf-8')).hexdigest()
+    
+    def obtener(self, lista_pdfs: List[Dict]) -> Optional[str]:
+        """Ruta del ZIP del conjunto, armándolo si todavía no existe; None si no se puede guardar"""
+        if not self.activa:
+            return None
+        clave = self.clave(lista_pdfs)
+        if clave is None:
+            return None
+        ruta = os.path.join(self.directorio, f"{clave}.zip")
+        
+        with self._lock:
+            construccion = self._en_construccion.setdefault(clave, threading.Lock())
+        try:
+            with construccion:
+                if os.path.isfile(ruta):
+                    metricas.incrementar('etiquetas_cache_zips_total', resultado='hit')
+                    gestor_artefactos.tocar(ruta)
+                    return ruta
+                metricas.incrementar('etiquetas_cache_zips_total', resultado='miss')
+                os.makedirs(self.directorio, exist_ok=True)
+                temporal = f"{ruta}.{uuid.uuid4().hex}.tmp"
+                try:
+                    crear_zip_pdfs(lista_pdfs, temporal)
+                    os.replace(temporal, ruta)
+                except Exception:
+                    if os.path.exists(temporal):
+                        os.remove(temporal)
+                    raise
+                gestor_artefactos.registrar(ruta)
+                return ruta
+        finally:
+            with self._lock:
+                self._en_construccion.pop(clave, None)
+
+cache_zips = CacheZips(LabelConfig.CACHE_ZIPS_DIR)
+
+def validar_codigo(codigo: str, simbologia: str, numero: int) -> Dict:
+    """Normaliza un código para su simbología: {'codigo': ...} o {'error': ...}"""
+    simbolo = SIMBOLOGIAS.get(simbologia)
+    if simbolo is None:
+        return {'error': f"La simbología del producto {numero} debe ser una de: {', '.join(SIMBOLOGIAS)}."}
+    try:
+        return {'codigo': simbolo.normalizar(codigo)}
+    except ValueError as e:
+        return {'error': f"El código del producto {numero} no se puede codificar en {simbolo.descripcion} ({e})."}
+
+def validar_producto_codigo_barras(sku: str, codigo: str, cantidad: str, numero: int,
+                                   simbologia: str = '') -> Dict:
     """Valida datos de un producto con código de barras"""
     sku = sku.strip()
     codigo = codigo.strip()
+    simbologia = simbologia.strip().lower() or SIMBOLOGIA_DEFECTO
     
     if not sku:
         return {'error': f"El SKU del producto {numero} es obligatorio."}
@@ -352,6 +2059,11 @@ def validar_producto_codigo_barras(sku: str, codigo: str, cantidad: str, numero:
     if not codigo:
         return {'error': f"El código de barras del producto {numero} es obligatorio."}
     
+    resultado = validar_codigo(codigo, simbologia, numero)
+    if 'error' in resultado:
+        return resultado
+    codigo = resultado['codigo']
+    
     try:
         cantidad_int = int(cantidad)
         if cantidad_int < 1:
@@ -362,53 +2074,593 @@ def validar_producto_codigo_barras(sku: str, codigo: str, cantidad: str, numero:
     return {
         'sku': sku,
         'codigo': codigo,
+        'simbologia': simbologia,
         'cantidad': cantidad_int,
         'tipo': 'codigo_barras'
     }
 
-def validar_producto_personalizado(cantidad: str, numero: int, **datos) -> Dict:
-    """Valida datos de un producto personalizado con límites de caracteres"""
-    try:
-        cantidad_int = int(cantidad)
+def validar_producto_personalizado(cantidad: str, numero: int, **datos) -> Dict:
+    """Valida datos de un producto personalizado con límites de caracteres"""
+    try:
+        cantidad_int = int(cantidad)
+        if cantidad_int < 1:
+            return {'error': f"La cantidad del producto {numero} debe ser 1 o superior."}
+    except (ValueError, TypeError):
+        return {'error': f"La cantidad del producto {numero} debe ser un número válido."}
+    
+    nombre_producto = datos.get('nombre_producto', '').strip()
+    valor = datos.get('valor', '').strip()
+    sku = datos.get('sku', '').strip()
+    otro = datos.get('otro', '').strip()
+    codigo = datos.get('codigo', '').strip()
+    simbologia = datos.get('simbologia', '').strip().lower()
+    
+    # Validar que al menos un campo tenga información
+    if not any([nombre_producto, valor, sku, otro, codigo]):
+        return {'error': f"El producto {numero} debe tener al menos un campo con información."}
+    
+    # El código opcional va en un cuadrado junto al texto: solo simbologías 2D
+    if codigo:
+        simbologia = simbologia or 'qr'
+        if simbologia in SIMBOLOGIAS and not SIMBOLOGIAS[simbologia].bidimensional:
+            bidimensionales = ', '.join(n for n, s in SIMBOLOGIAS.items() if s.bidimensional)
+            return {'error': f"La etiqueta personalizada del producto {numero} solo admite códigos "
+                             f"{bidimensionales}."}
+        resultado = validar_codigo(codigo, simbologia, numero)
+        if 'error' in resultado:
+            return resultado
+        codigo = resultado['codigo']
+    else:
+        simbologia = ''
+    
+    # Validar límites de caracteres
+    if nombre_producto and len(nombre_producto) > LabelConfig.MAX_NOMBRE_PRODUCTO:
+        return {'error': f"El nombre del producto {numero} no puede exceder {LabelConfig.MAX_NOMBRE_PRODUCTO} caracteres (actual: {len(nombre_producto)})."}
+    
+    if valor and len(valor) > LabelConfig.MAX_VALOR:
+        return {'error': f"El valor del producto {numero} no puede exceder {LabelConfig.MAX_VALOR} caracteres."}
+    
+    if sku and len(sku) > LabelConfig.MAX_SKU:
+        return {'error': f"El SKU del producto {numero} no puede exceder {LabelConfig.MAX_SKU} caracteres."}
+    
+    if otro and len(otro) > LabelConfig.MAX_OTRO:
+        return {'error': f"El campo 'Otro' del producto {numero} no puede exceder {LabelConfig.MAX_OTRO} caracteres (actual: {len(otro)})."}
+    
+    return {
+        'cantidad': cantidad_int,
+        'nombre_producto': nombre_producto,
+        'valor': valor,
+        'sku': sku,
+        'otro': otro,
+        'codigo': codigo,
+        'simbologia': simbologia,
+        'tipo': 'personalizado'
+    }
+
+COLUMNAS_IMPORTACION = {
+    'codigo_barras': ('sku', 'codigo', 'cantidad', 'simbologia'),
+    'personalizado': ('cantidad', 'nombre_producto', 'valor', 'sku', 'otro', 'codigo', 'simbologia'),
+}
+
+def leer_filas_csv(stream) -> Iterator[Dict]:
+    """
+    Lee un CSV fila por fila desde el stream binario del archivo subido.
+    Las líneas en blanco se entregan como filas vacías (DictReader las
+    saltearía) para que la numeración siga siendo la del archivo.
+    """
+    texto = TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    muestra = texto.read(4096)
+    texto.seek(0)
+    try:
+        dialecto = csv.Sniffer().sniff(muestra, delimiters=',;\t')
+    except csv.Error:
+        dialecto = csv.excel
+    try:
+        filas = csv.reader(texto, dialect=dialecto)
+        encabezados = [c.strip().lower() for c in next(filas, [])]
+        for valores in filas:
+            yield {k: v.strip() for k, v in zip(encabezados, valores)}
+    finally:
+        texto.detach()
+
+def leer_filas_xlsx(stream) -> Iterator[Dict]:
+    """Lee la primera hoja de un XLSX en modo read_only (requiere openpyxl)"""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError("Para importar archivos XLSX instale openpyxl (pip install openpyxl) o use CSV.")
+    
+    libro = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        filas = libro.active.iter_rows(values_only=True)
+        encabezados = [str(c or '').strip().lower() for c in next(filas, ())]
+        for valores in filas:
+            yield {k: '' if v is None else str(v).strip() for k, v in zip(encabezados, valores)}
+    finally:
+        libro.close()
+
+def leer_filas_importacion(nombre_archivo: str, stream) -> Iterator[Dict]:
+    """Elige el lector según la extensión del archivo"""
+    extension = os.path.splitext(nombre_archivo.lower())[1]
+    if extension == '.csv':
+        return leer_filas_csv(stream)
+    if extension in ('.xlsx', '.xlsm'):
+        return leer_filas_xlsx(stream)
+    raise ValueError("Formato no soportado. Use un archivo .csv o .xlsx.")
+
+def validar_productos(filas: Iterator[Tuple[int, Dict]], tipo_etiqueta: str, perfil: Optional[str] = None,
+                      empaquetado: bool = False, formato: Optional[str] = None) -> Tuple[List[Dict], List[str]]:
+    """
+    Valida pares (número, datos) uno por uno con las mismas reglas del formulario,
+    sin necesidad de tener todas las filas en memoria.
+    
+    Con un formato de salida, además verifica el lote que forman las filas
+    válidas (verificar_lote) y suma esos errores a los de las filas: el
+    operador recibe todos en una sola respuesta, antes de dibujar nada.
+    """
+    with medir_etapa('validacion'):
+        productos, numeros, errores = _validar_productos(filas, tipo_etiqueta)
+    if formato is not None and productos:
+        errores += verificar_lote(productos, tipo_etiqueta, perfil, empaquetado, formato, numeros)
+    return productos, errores
+
+def _validar_productos(filas: Iterator[Tuple[int, Dict]], tipo_etiqueta: str) -> Tuple[List[Dict], List[int], List[str]]:
+    """(productos válidos, número de fila de cada uno, errores)"""
+    productos = []
+    numeros = []
+    errores = []
+    skus = set()
+    
+    for numero, fila in filas:
+        if len(productos) + len(errores) >= LabelConfig.MAX_FILAS_IMPORTACION:
+            errores.append(f"El lote supera el máximo de {LabelConfig.MAX_FILAS_IMPORTACION} productos.")
+            break
+        
+        if tipo_etiqueta == 'codigo_barras':
+            resultado = validar_producto_codigo_barras(
+                fila.get('sku', ''), fila.get('codigo', ''), fila.get('cantidad', ''), numero,
+                fila.get('simbologia', ''))
+            if 'error' not in resultado:
+                if resultado['sku'] in skus:
+                    resultado = {'error': f"El SKU del producto {numero} está repetido."}
+                else:
+                    skus.add(resultado['sku'])
+        else:
+            resultado = validar_producto_personalizado(
+                fila.get('cantidad', ''), numero,
+                nombre_producto=fila.get('nombre_producto', ''),
+                valor=fila.get('valor', ''),
+                sku=fila.get('sku', ''),
+                otro=fila.get('otro', ''),
+                codigo=fila.get('codigo', ''),
+                simbologia=fila.get('simbologia', '')
+            )
+        
+        if 'error' in resultado:
+            errores.append(resultado['error'])
+        else:
+            productos.append(resultado)
+            numeros.append(numero)
+    
+    if not productos and not errores:
+        errores.append("No hay productos para generar.")
+    
+    return productos, numeros, errores
+
+# Tamaño aproximado de un PDF generado, medido con los generadores actuales
+BYTES_ESTIMADOS_PDF = {
+    'archivo': 2800,             # estructura, fuentes y marco
+    'pagina': 480,               # página con Form XObjects
+    'etiqueta_distinta': 900,    # cada etiqueta diferente (código vectorial o texto)
+    'imagen_distinta': 12000,    # cada código de barras en modo raster (PNG)
+    'etiqueta_sin_xobjects': 200,
+}
+BYTES_ESTIMADOS_TERMICA = 250    # formato ZPL/EPL de un producto
+
+def errores_legibilidad(clave: Tuple[str, str], numero: int, layout: LayoutHoja,
+                        max_modulos: float, max_modulos_2d: float) -> List[str]:
+    """Error si el código no se puede codificar o sus módulos quedarían más finos que MIN_MODULO_MM"""
+    codigo, simbologia = clave
+    simbolo = obtener_simbologia(simbologia)
+    try:
+        modulos = codificar_codigo(codigo, simbologia)
+    except ValueError:
+        return [f"El código de barras del producto {numero} no se puede codificar en {simbolo.descripcion}."]
+    if modulos.ancho + 2 * simbolo.zona_silencio > (max_modulos_2d if modulos.filas > 1 else max_modulos):
+        return [f"El código de barras del producto {numero} es demasiado largo para "
+                f"una etiqueta de {layout.medidas_etiqueta}: no sería legible."]
+    return []
+
+def verificar_lote(productos: List[Dict], tipo_etiqueta: str, perfil: Optional[str] = None,
+                   empaquetado: bool = False, formato: str = 'pdf',
+                   numeros: Optional[List[int]] = None) -> List[str]:
+    """
+    Verificación previa de un lote ya validado fila por fila: en una sola pasada
+    y antes de dibujar nada, detecta lo que haría fallar la generación a mitad
+    de camino (SKUs repetidos, códigos que no caben legibles en la etiqueta) y
+    los lotes que superan los límites de etiquetas, páginas o tamaño estimado.
+    `numeros` es el número de fila de cada producto en los mensajes (por
+    defecto su posición). Retorna la lista de errores, vacía si el lote se
+    puede generar.
+    """
+    with medir_etapa('verificacion'):
+        layout = obtener_layout(perfil)
+        errores = []
+        skus = {}
+        distintas = set()
+        total_etiquetas = 0
+        paginas = 0
+        max_modulos = layout.ancho_util / (LabelConfig.MIN_MODULO_MM * mm)
+        # Los códigos 2D se miden por su lado: en la etiqueta, o en el cuadrado junto al texto
+        max_modulos_2d = min(layout.ancho_util, layout.alto_util) / (LabelConfig.MIN_MODULO_MM * mm)
+        max_modulos_personalizado = (caja_codigo_personalizado(layout.label_width, layout.label_height)[2] /
+                                     (LabelConfig.MIN_MODULO_MM * mm))
+        
+        for numero, producto in zip(numeros or range(1, len(productos) + 1), productos):
+            cantidad = producto['cantidad']
+            total_etiquetas += cantidad
+            
+            if tipo_etiqueta == 'codigo_barras':
+                sku = producto['sku']
+                if sku in skus:
+                    errores.append(f"El SKU del producto {numero} está repetido (producto {skus[sku]}).")
+                else:
+                    skus[sku] = numero
+                
+                clave = clave_codigo(producto)
+                if clave not in distintas:
+                    errores += errores_legibilidad(clave, numero, layout, max_modulos, max_modulos_2d)
+                distintas.add(clave)
+                if not empaquetado:
+                    paginas += layout.paginas(cantidad)
+            else:
+                clave = clave_etiqueta_personalizada(producto)
+                if producto.get('codigo') and clave not in distintas:
+                    errores += errores_legibilidad((producto['codigo'], producto.get('simbologia')), numero,
+                                                   layout, max_modulos_personalizado, max_modulos_personalizado)
+                distintas.add(clave)
+        
+        if tipo_etiqueta != 'codigo_barras' or empaquetado:
+            paginas = layout.paginas(total_etiquetas)
+        
+        if total_etiquetas > LabelConfig.MAX_ETIQUETAS_LOTE:
+            errores.append(f"El lote tiene {total_etiquetas} etiquetas; el máximo es "
+                           f"{LabelConfig.MAX_ETIQUETAS_LOTE}.")
+        
+        if formato == 'pdf':
+            if paginas > LabelConfig.MAX_PAGINAS_LOTE:
+                errores.append(f"El lote ocuparía {paginas} páginas; el máximo es {LabelConfig.MAX_PAGINAS_LOTE}.")
+            
+            archivos = len(productos) if tipo_etiqueta == 'codigo_barras' and not empaquetado else 1
+            if LabelConfig.PAGINAS_POR_VOLUMEN > 0:
+                archivos = max(archivos, math.ceil(paginas / LabelConfig.PAGINAS_POR_VOLUMEN))
+            por_distinta = BYTES_ESTIMADOS_PDF['etiqueta_distinta']
+            if tipo_etiqueta == 'codigo_barras' and LabelConfig.MODO_RENDER_BARCODE != 'vector':
+                por_distinta = BYTES_ESTIMADOS_PDF['imagen_distinta']
+            bytes_estimados = (archivos * BYTES_ESTIMADOS_PDF['archivo'] +
+                               paginas * BYTES_ESTIMADOS_PDF['pagina'] +
+                               len(distintas) * por_distinta)
+            if not LabelConfig.USAR_FORM_XOBJECTS:
+                bytes_estimados += total_etiquetas * BYTES_ESTIMADOS_PDF['etiqueta_sin_xobjects']
+        else:
+            bytes_estimados = len(productos) * BYTES_ESTIMADOS_TERMICA
+        
+        if bytes_estimados > LabelConfig.MAX_BYTES_LOTE:
+            errores.append(f"El lote generaría aproximadamente {bytes_estimados / (1024 * 1024):.1f} MB; "
+                           f"el máximo es {LabelConfig.MAX_BYTES_LOTE / (1024 * 1024):.1f} MB.")
+    
+    return errores
+
+def importar_productos(filas: Iterator[Dict], tipo_etiqueta: str, perfil: Optional[str] = None,
+                       empaquetado: bool = False, formato: Optional[str] = None) -> Tuple[List[Dict], List[str]]:
+    """
+    Valida las filas leídas de un archivo, omitiendo las vacías (y verifica el
+    lote si se indica el formato, ver validar_productos). El número de
+    producto en los errores es la fila del archivo (la 1 es el encabezado).
+    """
+    numeradas = ((numero, fila) for numero, fila in enumerate(filas, start=2) if any(fila.values()))
+    return validar_productos(numeradas, tipo_etiqueta, perfil, empaquetado, formato)
+
+def leer_lineas_reimpresion(texto: str) -> Tuple[List[Tuple[str, int]], List[str]]:
+    """
+    Pedidos de reimpresión escritos o pegados de una planilla, uno por línea:
+    "SKU cantidad" (separados por espacio, tabulación, coma o punto y coma).
+    Un SKU repetido suma sus cantidades.
+    """
+    cantidades = {}
+    errores = []
+    for numero, linea in enumerate(texto.splitlines(), start=1):
+        if not linea.strip():
+            continue
+        coincidencia = re.match(r'^(.*?)[\s,;]+(\S+)$', linea.strip())
+        if not coincidencia or not coincidencia.group(1).strip():
+            errores.append(f"La línea {numero} debe tener un SKU y una cantidad.")
+            continue
+        clave, cantidad = coincidencia.group(1).strip(), coincidencia.group(2)
+        try:
+            cantidad_int = int(cantidad)
+        except ValueError:
+            cantidad_int = 0
         if cantidad_int < 1:
-            return {'error': f"La cantidad del producto {numero} debe ser 1 o superior."}
-    except (ValueError, TypeError):
-        return {'error': f"La cantidad del producto {numero} debe ser un número válido."}
-    
-    nombre_producto = datos.get('nombre_producto', '').strip()
-    valor = datos.get('valor', '').strip()
-    sku = datos.get('sku', '').strip()
-    otro = datos.get('otro', '').strip()
-    
-    # Validar que al menos un campo tenga información
-    if not any([nombre_producto, valor, sku, otro]):
-        return {'error': f"El producto {numero} debe tener al menos un campo con información."}
+            errores.append(f"La cantidad de la línea {numero} debe ser un número de 1 o más.")
+            continue
+        cantidades[clave] = cantidades.get(clave, 0) + cantidad_int
     
-    # Validar límites de caracteres
-    if nombre_producto and len(nombre_producto) > LabelConfig.MAX_NOMBRE_PRODUCTO:
-        return {'error': f"El nombre del producto {numero} no puede exceder {LabelConfig.MAX_NOMBRE_PRODUCTO} caracteres (actual: {len(nombre_producto)})."}
+    if len(cantidades) > LabelConfig.MAX_FILAS_IMPORTACION:
+        errores.append(f"Se pueden reimprimir hasta {LabelConfig.MAX_FILAS_IMPORTACION} productos a la vez.")
+    return list(cantidades.items()), errores
+
+def resolver_reimpresion(pedidos: List[Tuple[str, int]], tipo_etiqueta: str) -> Tuple[List[Dict], List[str]]:
+    """
+    Arma el lote desde el catálogo: cada SKU (o código de barras) con su
+    cantidad. Los datos del catálogo ya pasaron la validación al guardarse.
+    """
+    if catalogo is None:
+        return [], ["El catálogo de productos no está habilitado."]
+    if not pedidos:
+        return [], ["Debe indicar al menos un SKU con su cantidad."]
+    
+    with medir_etapa('catalogo'):
+        encontrados = catalogo.buscar(tipo_etiqueta, [clave for clave, _ in pedidos])
+    
+    productos = []
+    faltantes = []
+    for clave, cantidad in pedidos:
+        producto = encontrados.get(clave)
+        if producto is None:
+            faltantes.append(clave)
+        else:
+            productos.append(dict(producto, cantidad=cantidad))
     
-    if valor and len(valor) > LabelConfig.MAX_VALOR:
-        return {'error': f"El valor del producto {numero} no puede exceder {LabelConfig.MAX_VALOR} caracteres."}
+    if faltantes:
+        mostrados = ', '.join(faltantes[:LabelConfig.MAX_ERRORES_MOSTRADOS])
+        resto = len(faltantes) - LabelConfig.MAX_ERRORES_MOSTRADOS
+        return [], [f"No están en el catálogo: {mostrados}" + (f" y {resto} más." if resto > 0 else ".")]
+    return productos, []
+
+class BaseSQLite(ABC):
+    """
+    Base SQLite de la aplicación. El archivo y su esquema se crean con la
+    primera conexión y no al importar el módulo: importar app.py (tests,
+    scripts, flask shell) no escribe nada en el directorio actual.
+    """
     
-    if sku and len(sku) > LabelConfig.MAX_SKU:
-        return {'error': f"El SKU del producto {numero} no puede exceder {LabelConfig.MAX_SKU} caracteres."}
+    def __init__(self, ruta_db: str):
+        self.ruta_db = ruta_db
+        self._esquema_creado = False
+        self._lock_esquema = threading.Lock()
+    
+    @abstractmethod
+    def _crear_esquema(self, conexion: sqlite3.Connection) -> None:
+        """Crea las tablas e índices que falten (una vez por proceso)"""
+    
+    def _conectar(self) -> sqlite3.Connection:
+        conexion = sqlite3.connect(self.ruta_db, timeout=10)
+        if not self._esquema_creado:
+            with self._lock_esquema:
+                if not self._esquema_creado:
+                    with conexion:
+                        self._crear_esquema(conexion)
+                    self._esquema_creado = True
+        return conexion
+
+class SesionServidor(CallbackDict, SessionMixin):
+    """Datos de sesión guardados en el servidor; la cookie solo lleva el id"""
+    
+    def __init__(self, initial=None, sid: Optional[str] = None, nueva: bool = False):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid or uuid.uuid4().hex
+        self.new = nueva
+        self.modified = False
+
+class InterfazSesionSQLite(BaseSQLite, SessionInterface):
+    """
+    Guarda la sesión de Flask en SQLite con expiración (TTL), para que la
+    cookie tenga un tamaño fijo sin importar cuántos productos tenga el lote.
+    """
     
-    if otro and len(otro) > LabelConfig.MAX_OTRO:
-        return {'error': f"El campo 'Otro' del producto {numero} no puede exceder {LabelConfig.MAX_OTRO} caracteres (actual: {len(otro)})."}
+    serializer = TaggedJSONSerializer()
+    INTERVALO_PURGA = 600
+    
+    def __init__(self, ruta_db: str, ttl: int):
+        super().__init__(ruta_db)
+        self.ttl = ttl
+        self._ultima_purga = 0.0
+    
+    def _crear_esquema(self, conexion: sqlite3.Connection) -> None:
+        conexion.execute("PRAGMA journal_mode=WAL")
+        conexion.execute(
+            "CREATE TABLE IF NOT EXISTS sesiones ("
+            " id TEXT PRIMARY KEY, datos TEXT NOT NULL, expira REAL NOT NULL)")
+        conexion.execute("CREATE INDEX IF NOT EXISTS idx_sesiones_expira ON sesiones (expira)")
+    
+    def _firmador(self, app: Flask) -> Optional[Signer]:
+        if not app.secret_key:
+            return None
+        return Signer(app.secret_key, salt='sesion-servidor')
+    
+    def open_session(self, app: Flask, request) -> Optional[SesionServidor]:
+        firmador = self._firmador(app)
+        if firmador is None:
+            return None
+        
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if not cookie:
+            return SesionServidor(nueva=True)
+        try:
+            sid = firmador.unsign(cookie).decode('ascii')
+        except BadSignature:
+            return SesionServidor(nueva=True)
+        
+        with self._conectar() as conexion:
+            fila = conexion.execute(
+                "SELECT datos FROM sesiones WHERE id = ? AND expira > ?", (sid, time.time())
+            ).fetchone()
+        if fila is None:
+            return SesionServidor(sid=sid, nueva=True)
+        return SesionServidor(self.serializer.loads(fila[0]), sid=sid)
+    
+    def save_session(self, app: Flask, session: SesionServidor, response) -> None:
+        nombre = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        
+        if not session:
+            if session.modified:
+                with self._conectar() as conexion:
+                    conexion.execute("DELETE FROM sesiones WHERE id = ?", (session.sid,))
+                response.delete_cookie(nombre, domain=domain, path=path)
+            return
+        
+        if session.modified or session.new:
+            ahora = time.time()
+            with self._conectar() as conexion:
+                conexion.execute(
+                    "INSERT OR REPLACE INTO sesiones (id, datos, expira) VALUES (?, ?, ?)",
+                    (session.sid, self.serializer.dumps(dict(session)), ahora + self.ttl))
+                if ahora - self._ultima_purga > self.INTERVALO_PURGA:
+                    self._ultima_purga = ahora
+                    conexion.execute("DELETE FROM sesiones WHERE expira <= ?", (ahora,))
+        
+        if session.new or self.should_set_cookie(app, session):
+            response.set_cookie(
+                nombre,
+                self._firmador(app).sign(session.sid).decode('ascii'),
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
+
+class CatalogoProductos(BaseSQLite):
+    """
+    Catálogo local (SQLite) de los productos ya validados, uno por tipo de
+    etiqueta y SKU, con índices por SKU (la clave primaria) y por código de
+    barras. Se alimenta con cada lote generado y con la importación masiva;
+    una reimpresión resuelve todos sus SKUs en una sola consulta.
+    """
     
-    return {
-        'cantidad': cantidad_int,
-        'nombre_producto': nombre_producto,
-        'valor': valor,
-        'sku': sku,
-        'otro': otro,
-        'tipo': 'personalizado'
-    }
+    CAMPOS = ('sku', 'codigo', 'nombre_producto', 'valor', 'otro', 'simbologia')
+    
+    def _crear_esquema(self, conexion: sqlite3.Connection) -> None:
+        conexion.execute("PRAGMA journal_mode=WAL")
+        conexion.execute(
+            "CREATE TABLE IF NOT EXISTS productos ("
+            " tipo TEXT NOT NULL, sku TEXT NOT NULL, codigo TEXT, nombre_producto TEXT,"
+            " valor TEXT, otro TEXT, simbologia TEXT NOT NULL DEFAULT '',"
+            " actualizado REAL NOT NULL, impresiones INTEGER NOT NULL DEFAULT 0,"
+            " PRIMARY KEY (tipo, sku))")
+        conexion.execute("CREATE INDEX IF NOT EXISTS idx_productos_codigo ON productos (tipo, codigo)")
+        columnas = {fila[1] for fila in conexion.execute("PRAGMA table_info(productos)")}
+        if 'simbologia' not in columnas:
+            conexion.execute("ALTER TABLE productos ADD COLUMN simbologia TEXT NOT NULL DEFAULT ''")
+    
+    def guardar(self, productos: List[Dict], tipo_etiqueta: str, impreso: bool = True) -> int:
+        """
+        Agrega o actualiza los productos (ya validados) del lote; los
+        personalizados sin SKU no se guardan. Retorna cuántos se guardaron.
+        """
+        ahora = time.time()
+        filas = [(tipo_etiqueta,) + tuple(producto.get(campo, '') for campo in self.CAMPOS) +
+                 (ahora, 1 if impreso else 0)
+                 for producto in productos if producto.get('sku')]
+        if not filas:
+            return 0
+        with self._conectar() as conexion:
+            conexion.executemany(
+                "INSERT INTO productos (tipo, sku, codigo, nombre_producto, valor, otro, simbologia,"
+                " actualizado, impresiones) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (tipo, sku) DO UPDATE SET codigo = excluded.codigo,"
+                " nombre_producto = excluded.nombre_producto, valor = excluded.valor, otro = excluded.otro,"
+                " simbologia = excluded.simbologia,"
+                " actualizado = excluded.actualizado, impresiones = impresiones + excluded.impresiones",
+                filas)
+        return len(filas)
+    
+    def buscar(self, tipo_etiqueta: str, claves: List[str]) -> Dict[str, Dict]:
+        """
+        Productos por SKU o, si no hay SKU igual, por código de barras, en una
+        sola consulta. Retorna {clave: producto} con la forma de los validadores.
+        """
+        if not claves:
+            return {}
+        lista = json.dumps(claves, ensure_ascii=False)
+        with self._conectar() as conexion:
+            filas = conexion.execute(
+                "SELECT sku, codigo, nombre_producto, valor, otro, simbologia FROM productos"
+                " WHERE tipo = ? AND (sku IN (SELECT value FROM json_each(?))"
+                " OR codigo IN (SELECT value FROM json_each(?)))",
+                (tipo_etiqueta, lista, lista)).fetchall()
+        
+        por_sku = {}
+        por_codigo = {}
+        for fila in filas:
+            datos = dict(zip(self.CAMPOS, fila))
+            if tipo_etiqueta == 'codigo_barras':
+                producto = {'sku': datos['sku'], 'codigo': datos['codigo'],
+                            'simbologia': datos['simbologia'] or SIMBOLOGIA_DEFECTO, 'tipo': tipo_etiqueta}
+            else:
+                producto = {'nombre_producto': datos['nombre_producto'], 'valor': datos['valor'],
+                            'sku': datos['sku'], 'otro': datos['otro'], 'codigo': datos['codigo'],
+                            'simbologia': datos['simbologia'], 'tipo': tipo_etiqueta}
+            por_sku[datos['sku']] = producto
+            if datos['codigo']:
+                por_codigo.setdefault(datos['codigo'], producto)
+        
+        encontrados = {}
+        for clave in claves:
+            producto = por_sku.get(clave) or por_codigo.get(clave)
+            if producto is not None:
+                encontrados[clave] = producto
+        return encontrados
+    
+    def contar(self) -> int:
+        with self._conectar() as conexion:
+            return conexion.execute("SELECT COUNT(*) FROM productos").fetchone()[0]
+
+catalogo = CatalogoProductos(LabelConfig.CATALOGO_DB) if LabelConfig.CATALOGO_DB else None
+
+# Texto con el que se completan de antemano las tablas de anchos de glifo
+CARACTERES_PRECALENTADOS = ''.join(chr(i) for i in range(32, 127)) + 'ÁÉÍÓÚÜÑáéíóúüñ¿¡°'
+
+def precalentar() -> float:
+    """
+    Carga por adelantado lo que el primer render pagaría: los módulos de
+    dibujo, las plantillas de las simbologías, las métricas de las fuentes de
+    las etiquetas y las fuentes de las vistas previas. Pensado para el hook
+    de precarga de gunicorn (gunicorn.conf.py): se ejecuta una vez en el
+    proceso maestro y los workers lo heredan al hacer fork.
+    Retorna los segundos que tomó.
+    """
+    inicio = time.perf_counter()
+    for modulo in MODULOS_PEREZOSOS:
+        modulo.cargar()
+    for simbolo in SIMBOLOGIAS.values():
+        simbolo.codificar(simbolo.ejemplo)
+    
+    for fuente, tamaño in (('Helvetica', 6), ('Helvetica-Bold', 7),
+                           ('Helvetica', LabelConfig.BARCODE_CONFIG['font_size'])):
+        pdfmetrics.getFont(fuente)
+        medir_texto(CARACTERES_PRECALENTADOS, fuente, tamaño)
+    
+    for layout in LAYOUTS_HOJA.values():
+        escala = LabelConfig.VISTA_PREVIA_ANCHO / layout.page_width
+        for tamaño in (6, 7, LabelConfig.BARCODE_CONFIG['font_size']):
+            fuente_vista_previa(max(1, round(tamaño * escala)))
+    
+    duracion = time.perf_counter() - inicio
+    logger.info("Precalentamiento completo en %.3f s (%d perfiles de hoja)", duracion, len(LAYOUTS_HOJA))
+    return duracion
 
 # 3. Aplicación Flask
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'clave_por_defecto_cambiar_en_produccion')
+if LabelConfig.SESIONES_DB:
+    app.session_interface = InterfazSesionSQLite(LabelConfig.SESIONES_DB, LabelConfig.SESIONES_TTL)
 
 @app.route('/', methods=['GET', 'POST'])
 def index():
@@ -428,7 +2680,8 @@ def index():
         session['num_productos'] = num_productos
         return redirect(url_for('elegir_tipo_etiqueta'))
 
-    return render_template('index.html')
+    return render_template('index.html', perfiles=LAYOUTS_HOJA.values(), perfil_defecto=PERFIL_HOJA_DEFECTO,
+                           total_catalogo=catalogo.contar() if catalogo is not None else None)
 
 @app.route('/elegir-tipo', methods=['GET', 'POST'])
 def elegir_tipo_etiqueta():
@@ -438,16 +2691,30 @@ def elegir_tipo_etiqueta():
     
     if request.method == 'POST':
         tipo = request.form.get('tipo_etiqueta')
+        perfil_hoja = request.form.get('perfil_hoja') or PERFIL_HOJA_DEFECTO
+        formato = request.form.get('formato') or 'pdf'
         
         if tipo not in ['codigo_barras', 'personalizado']:
             flash("Debe seleccionar un tipo de etiqueta válido.")
             return redirect(url_for('elegir_tipo_etiqueta'))
         
+        if perfil_hoja not in LAYOUTS_HOJA:
+            flash("Debe seleccionar un formato de hoja válido.")
+            return redirect(url_for('elegir_tipo_etiqueta'))
+        
+        if formato not in FORMATOS_SALIDA:
+            flash("Debe seleccionar un formato de salida válido.")
+            return redirect(url_for('elegir_tipo_etiqueta'))
+        
         session['tipo_etiqueta'] = tipo
+        session['perfil_hoja'] = perfil_hoja
+        session['empaquetado'] = tipo == 'codigo_barras' and bool(request.form.get('empaquetado'))
+        session['formato'] = formato
         return redirect(url_for('ingresar_productos'))
     
     num_productos = session['num_productos']
-    return render_template('elegir_tipo.html', num_productos=num_productos)
+    return render_template('elegir_tipo.html', num_productos=num_productos, perfiles=LAYOUTS_HOJA.values(),
+                           perfil_defecto=session.get('perfil_hoja', PERFIL_HOJA_DEFECTO))
 
 @app.route('/ingresar-productos', methods=['GET', 'POST'])
 def ingresar_productos():
@@ -459,7 +2726,9 @@ def ingresar_productos():
     tipo_etiqueta = session['tipo_etiqueta']
 
     if request.method == 'POST':
+        inicio_validacion = time.perf_counter()
         productos = []
+        numeros = []
         errores = []
         
         if tipo_etiqueta == 'codigo_barras':
@@ -467,18 +2736,15 @@ def ingresar_productos():
                 sku = request.form.get(f'sku_{i}', '')
                 codigo = request.form.get(f'codigo_{i}', '')
                 cantidad = request.form.get(f'cantidad_{i}', '')
+                simbologia = request.form.get(f'simbologia_{i}', '')
                 
-                resultado = validar_producto_codigo_barras(sku, codigo, cantidad, i + 1)
+                resultado = validar_producto_codigo_barras(sku, codigo, cantidad, i + 1, simbologia)
                 
                 if 'error' in resultado:
                     errores.append(resultado['error'])
                 else:
                     productos.append(resultado)
-            
-            if not errores:
-                skus = [p['sku'] for p in productos]
-                if len(skus) != len(set(skus)):
-                    errores.append("Los SKUs deben ser únicos.")
+                    numeros.append(i + 1)
         
         else:
             for i in range(num_productos):
@@ -487,19 +2753,32 @@ def ingresar_productos():
                 valor = request.form.get(f'valor_{i}', '')
                 sku = request.form.get(f'sku_{i}', '')
                 otro = request.form.get(f'otro_{i}', '')
+                codigo = request.form.get(f'codigo_{i}', '')
+                simbologia = request.form.get(f'simbologia_{i}', '')
                 
                 resultado = validar_producto_personalizado(
                     cantidad, i + 1,
                     nombre_producto=nombre_producto,
                     valor=valor,
                     sku=sku,
-                    otro=otro
+                    otro=otro,
+                    codigo=codigo,
+                    simbologia=simbologia
                 )
                 
                 if 'error' in resultado:
                     errores.append(resultado['error'])
                 else:
                     productos.append(resultado)
+                    numeros.append(i + 1)
+        
+        metricas.observar('etiquetas_etapa_segundos', time.perf_counter() - inicio_validacion,
+                          etapa='validacion')
+        
+        # Los errores del lote (con las filas válidas) salen junto con los de las filas
+        if productos:
+            errores += verificar_lote(productos, tipo_etiqueta, session.get('perfil_hoja'),
+                                      session.get('empaquetado', False), session.get('formato', 'pdf'), numeros)
         
         if errores:
             for error in errores:
@@ -510,9 +2789,12 @@ def ingresar_productos():
                                  max_nombre=LabelConfig.MAX_NOMBRE_PRODUCTO,
                                  max_valor=LabelConfig.MAX_VALOR,
                                  max_sku=LabelConfig.MAX_SKU,
-                                 max_otro=LabelConfig.MAX_OTRO)
+                                 max_otro=LabelConfig.MAX_OTRO,
+                                 simbologias=SIMBOLOGIAS.values())
         
         session['productos'] = productos
+        session.pop('trabajo_id', None)
+        session.pop('pdfs_generados', None)
         return redirect(url_for('generar_etiquetas'))
 
     return render_template('ingresar_productos.html', 
@@ -521,9 +2803,12 @@ def ingresar_productos():
                          max_nombre=LabelConfig.MAX_NOMBRE_PRODUCTO,
                          max_valor=LabelConfig.MAX_VALOR,
                          max_sku=LabelConfig.MAX_SKU,
-                         max_otro=LabelConfig.MAX_OTRO)
+                         max_otro=LabelConfig.MAX_OTRO,
+                         simbologias=SIMBOLOGIAS.values())
 
-def generar_pdf_personalizado_masivo(productos: List[Dict], output_path: str) -> None:
+def generar_pdf_personalizado_masivo(productos: List[Dict], output_path: str,
+                                     progreso: Optional[Callable] = None,
+                                     layout: Optional[LayoutHoja] = None) -> None:
     """Genera un ÚNICO PDF con todas las etiquetas personalizadas de todos los productos"""
     if not productos:
         raise ValueError("No hay productos para generar")
@@ -531,122 +2816,792 @@ def generar_pdf_personalizado_masivo(productos: List[Dict], output_path: str) ->
     # Calcular cantidad total de etiquetas
     total_etiquetas = sum(p['cantidad'] for p in productos)
     
-    margin_x, margin_y, start_x, start_y = calcular_layout()
+    layout = layout or obtener_layout()
     
     try:
-        c = canvas.Canvas(output_path, pagesize=(LabelConfig.PAGE_WIDTH, LabelConfig.PAGE_HEIGHT))
+        c = canvas.Canvas(output_path, pagesize=(layout.page_width, layout.page_height))
         
-        # Crear lista de todas las etiquetas con sus datos
-        todas_etiquetas = []
-        for producto in productos:
-            for _ in range(producto['cantidad']):
-                todas_etiquetas.append(producto)
+        # Cada producto es una tanda de etiquetas idénticas, en orden
+        tandas = [(clave_etiqueta_personalizada(p), p, p['cantidad']) for p in productos]
+        
+        def dibujar_etiqueta(c: canvas.Canvas, datos: Dict, x: float, y: float) -> None:
+            dibujar_etiqueta_personalizada(c, datos, x, y, layout)
         
         # Generar todas las etiquetas en un solo PDF
-        for i, datos_etiqueta in enumerate(todas_etiquetas):
-            pos_in_page = i % LabelConfig.TOTAL_LABELS_PER_PAGE
-            
-            if pos_in_page == 0:
-                if i > 0:
-                    c.showPage()
-                dibujar_marco_completo(c, start_x, start_y)
-            
-            x, y, fila, columna = calcular_posicion_etiqueta(pos_in_page, start_x, start_y)
-            dibujar_etiqueta_personalizada(c, datos_etiqueta, x, y)
+        with medir_etapa('dibujo', tipo='personalizado'):
+            colocar_etiquetas(c, tandas, layout, dibujar_etiqueta, progreso)
         
-        c.save()
-        print(f"✓ PDF masivo generado: {output_path} ({total_etiquetas} etiquetas)")
+        with medir_etapa('guardado', tipo='personalizado'):
+            c.save()
+        registrar_pdf_generado('personalizado', total_etiquetas, output_path, layout)
         
     except Exception as e:
         raise RuntimeError(f"Error generando PDF masivo: {str(e)}")
 
-@app.route('/generar-etiquetas')
-def generar_etiquetas():
-    """Paso 3: Generar PDFs"""
-    if 'productos' not in session or 'tipo_etiqueta' not in session:
-        return redirect(url_for('index'))
+def nombre_pdf_codigo_barras(producto: Dict, lote: str) -> Tuple[str, str]:
+    """Nombre de archivo y título del PDF de un producto (o de uno de sus volúmenes)"""
+    if producto.get('volumen'):
+        return (nombre_en_lote(lote, f"{producto['sku']}_{producto['codigo']}_etiquetas_vol{producto['volumen']:02d}.pdf"),
+                f"{producto['sku']} (vol. {producto['volumen']})")
+    return nombre_en_lote(lote, f"{producto['sku']}_{producto['codigo']}_etiquetas.pdf"), producto['sku']
 
-    productos = session['productos']
-    tipo_etiqueta = session['tipo_etiqueta']
+def generar_pdf_producto_codigo_barras(producto: Dict, lote: str, perfil: Optional[str] = None) -> Dict:
+    """Genera el PDF de un producto con código de barras y retorna su resultado"""
+    tipo_etiqueta = 'codigo_barras'
+    nombre_archivo, titulo_producto = nombre_pdf_codigo_barras(producto, lote)
+    destino = destino_pdf(nombre_archivo)
     
-    print("\n" + "="*50)
-    print("INFORMACIÓN DE LAYOUT")
-    print("="*50)
-    for key, value in LabelConfig.get_layout_info().items():
-        print(f"{key}: {value}")
-    print("="*50 + "\n")
+    try:
+        layout = obtener_layout(perfil)
+        # Solo el código (en su simbología) y la cantidad se imprimen; el SKU no cambia el PDF
+        codigo, simbologia = clave_codigo(producto)
+        generar_pdf_con_cache(
+            tipo_etiqueta, [codigo, producto['cantidad'], simbologia], layout, destino,
+            lambda d: generar_pdf_codigo_barras(codigo, producto['cantidad'], d, layout, simbologia))
+        
+        resultado = {
+            'titulo': titulo_producto,
+            'cantidad': producto['cantidad'],
+            'nombre_archivo': nombre_archivo,
+            'archivo': destino if isinstance(destino, str) else '',
+            'generado': True,
+            'tipo': tipo_etiqueta,
+            'vista_previa': descriptor_vista_previa(tipo_etiqueta, [producto], layout)
+        }
+        if not isinstance(destino, str):
+            # Se devuelve al proceso principal, que lo registra con registrar_pdf
+            resultado['datos'] = destino.getvalue()
+        
+    except Exception as e:
+        logger.error("Error generando PDF para %s: %s", titulo_producto, e)
+        resultado = {
+            'titulo': titulo_producto,
+            'cantidad': producto['cantidad'],
+            'nombre_archivo': nombre_archivo,
+            'archivo': '',
+            'generado': False,
+            'tipo': tipo_etiqueta,
+            'error': str(e)
+        }
     
-    os.makedirs('pdfs_generados', exist_ok=True)
+    # Dentro del pool, las métricas y los archivos de caché del hijo viajan con el resultado
+    resultado['metricas'] = metricas.drenar_pendientes()
+    resultado['artefactos'] = gestor_artefactos.drenar_pendientes()
+    return resultado
+
+_pool_procesos = None
+_pool_lock = threading.Lock()
+
+def obtener_pool_procesos() -> ProcessPoolExecutor:
+    """
+    Pool de procesos compartido, creado en el primer uso dentro de cada worker.
+    Se crea desde un hilo de trabajos, con otros hilos y conexiones SQLite
+    abiertos: los procesos nacen de un servidor forkserver (un proceso limpio
+    que ya importó la aplicación) y no de un fork del worker, que podría
+    heredar locks tomados por otro hilo.
+    """
+    global _pool_procesos
+    with _pool_lock:
+        if _pool_procesos is None:
+            contexto = multiprocessing.get_context('forkserver')
+            if __name__ != '__main__':
+                contexto.set_forkserver_preload([__name__])
+            configuracion = {nombre: valor for nombre, valor in vars(LabelConfig).items() if nombre.isupper()}
+            _pool_procesos = ProcessPoolExecutor(max_workers=LabelConfig.PDF_WORKERS, mp_context=contexto,
+                                                 initializer=marcar_proceso_pool, initargs=(configuracion,))
+        return _pool_procesos
+
+def generar_pdfs_codigo_barras(productos: List[Dict], lote: str, al_terminar: Optional[Callable] = None,
+                               perfil: Optional[str] = None) -> List[Dict]:
+    """
+    Genera un PDF por producto (o uno por volumen si excede PAGINAS_POR_VOLUMEN),
+    en paralelo si PDF_WORKERS > 1. Los resultados conservan el orden de `productos`.
+    al_terminar(indice, resultado) se llama cuando cada archivo del producto queda listo.
+    """
+    layout = obtener_layout(perfil)
+    piezas = []
+    for idx, producto in enumerate(productos):
+        volumenes = list(dividir_en_volumenes([producto], layout))
+        if len(volumenes) == 1:
+            piezas.append((idx, producto))
+        else:
+            piezas.extend((idx, dict(volumen[0], volumen=n)) for n, volumen in enumerate(volumenes, start=1))
     
-    pdfs_generados = []
+    def secuencial() -> List[Dict]:
+        resultados = []
+        for idx, pieza in piezas:
+            resultados.append(registrar_pdf(generar_pdf_producto_codigo_barras(pieza, lote, perfil)))
+            if al_terminar:
+                al_terminar(idx, resultados[-1])
+        return resultados
+    
+    if LabelConfig.PDF_WORKERS <= 1 or len(piezas) <= 1:
+        return secuencial()
+    
+    try:
+        pool = obtener_pool_procesos()
+        futuros = [pool.submit(generar_pdf_producto_codigo_barras, pieza, lote, perfil) for idx, pieza in piezas]
+    except Exception as e:
+        logger.warning("Pool de procesos no disponible, generando en secuencia: %s", e)
+        return secuencial()
     
-    # CÓDIGO DE BARRAS: UN PDF POR PRODUCTO (como estaba)
+    resultados = []
+    for (idx, pieza), futuro in zip(piezas, futuros):
+        try:
+            resultados.append(registrar_pdf(futuro.result()))
+        except Exception as e:
+            # Falla del proceso (no del PDF): se reporta igual que un error por producto
+            nombre_archivo, titulo_producto = nombre_pdf_codigo_barras(pieza, lote)
+            logger.error("Error generando PDF para %s: %s", titulo_producto, e)
+            resultados.append({
+                'titulo': titulo_producto,
+                'cantidad': pieza['cantidad'],
+                'nombre_archivo': nombre_archivo,
+                'archivo': '',
+                'generado': False,
+                'tipo': 'codigo_barras',
+                'error': str(e)
+            })
+        if al_terminar:
+            al_terminar(idx, resultados[-1])
+    return resultados
+
+def generar_pdfs_combinados(productos: List[Dict], tipo_etiqueta: str, layout: LayoutHoja, lote: str,
+                            trabajo: Optional['Trabajo'] = None) -> List[Dict]:
+    """
+    Todas las etiquetas del lote en un solo PDF, producto tras producto, o en
+    varios volúmenes consecutivos si la tirada excede PAGINAS_POR_VOLUMEN
+    """
     if tipo_etiqueta == 'codigo_barras':
-        for idx, producto in enumerate(productos):
-            nombre_archivo = f"{producto['sku']}_{producto['codigo']}_etiquetas.pdf"
-            titulo_producto = producto['sku']
-            ruta_archivo = os.path.join('pdfs_generados', nombre_archivo)
-            
-            try:
-                generar_pdf_codigo_barras(producto['codigo'], producto['cantidad'], ruta_archivo)
-                
-                pdfs_generados.append({
-                    'titulo': titulo_producto,
-                    'cantidad': producto['cantidad'],
-                    'nombre_archivo': nombre_archivo,
-                    'archivo': ruta_archivo,
-                    'generado': True,
-                    'tipo': tipo_etiqueta
-                })
-                
-            except Exception as e:
-                print(f"✗ Error generando PDF para {titulo_producto}: {str(e)}")
-                pdfs_generados.append({
-                    'titulo': titulo_producto,
-                    'cantidad': producto['cantidad'],
-                    'nombre_archivo': nombre_archivo,
-                    'archivo': '',
-                    'generado': False,
-                    'tipo': tipo_etiqueta,
-                    'error': str(e)
-                })
-    
-    # ETIQUETAS PERSONALIZADAS: UN SOLO PDF CON TODAS LAS ETIQUETAS
+        prefijo, titulo_base = 'etiquetas_codigo_barras', 'Etiquetas Código de Barras'
+        generar = generar_pdf_codigo_barras_masivo
+        contenido_producto = lambda p: [*clave_codigo(p), p['cantidad']]
     else:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        nombre_archivo = f"etiquetas_personalizadas_{timestamp}.pdf"
-        ruta_archivo = os.path.join('pdfs_generados', nombre_archivo)
-        
-        # Calcular total de etiquetas
-        total_etiquetas = sum(p['cantidad'] for p in productos)
+        prefijo, titulo_base = 'etiquetas_personalizadas', 'Etiquetas Personalizadas'
+        generar = generar_pdf_personalizado_masivo
+        contenido_producto = lambda p: list(clave_etiqueta_personalizada(p)) + [p['cantidad']]
+    
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    pdfs_generados = []
+    
+    # Calcular total de etiquetas
+    total_etiquetas = sum(p['cantidad'] for p in productos)
+    num_volumenes = 1
+    if LabelConfig.PAGINAS_POR_VOLUMEN > 0:
+        num_volumenes = math.ceil(layout.paginas(total_etiquetas) / LabelConfig.PAGINAS_POR_VOLUMEN)
+    
+    colocadas = 0
+    for n, volumen in enumerate(dividir_en_volumenes(productos, layout), start=1):
+        if num_volumenes == 1:
+            nombre_archivo = nombre_en_lote(lote, f"{prefijo}_{timestamp}.pdf")
+            titulo = titulo_base
+        else:
+            nombre_archivo = nombre_en_lote(lote, f"{prefijo}_{timestamp}_vol{n:02d}.pdf")
+            titulo = f'{titulo_base} (vol. {n} de {num_volumenes})'
+        etiquetas_volumen = sum(p['cantidad'] for p in volumen)
+        destino = destino_pdf(nombre_archivo)
         
         try:
-            generar_pdf_personalizado_masivo(productos, ruta_archivo)
+            progreso = None
+            if trabajo:
+                progreso = lambda etiquetas, base=colocadas: trabajo.etiquetas_colocadas(base + etiquetas)
+            contenido = [contenido_producto(p) for p in volumen]
+            desde_cache = generar_pdf_con_cache(
+                tipo_etiqueta, contenido, layout, destino,
+                lambda d: generar(volumen, d, progreso, layout))
+            if desde_cache and progreso:
+                progreso(etiquetas_volumen)
             
-            pdfs_generados.append({
-                'titulo': 'Etiquetas Personalizadas',
-                'cantidad': total_etiquetas,
+            resultado = {
+                'titulo': titulo,
+                'cantidad': etiquetas_volumen,
                 'nombre_archivo': nombre_archivo,
-                'archivo': ruta_archivo,
+                'archivo': destino if isinstance(destino, str) else '',
                 'generado': True,
                 'tipo': tipo_etiqueta,
-                'productos_count': len(productos)
-            })
+                'empaquetado': True,
+                'productos_count': len(volumen),
+                'vista_previa': descriptor_vista_previa(tipo_etiqueta, volumen, layout)
+            }
+            if not isinstance(destino, str):
+                resultado['datos'] = destino.getvalue()
+            pdfs_generados.append(registrar_pdf(resultado))
             
         except Exception as e:
-            print(f"✗ Error generando PDF personalizado masivo: {str(e)}")
+            logger.error("Error generando PDF combinado (%s): %s", tipo_etiqueta, e)
             pdfs_generados.append({
-                'titulo': 'Etiquetas Personalizadas',
-                'cantidad': total_etiquetas,
+                'titulo': titulo,
+                'cantidad': etiquetas_volumen,
                 'nombre_archivo': nombre_archivo,
                 'archivo': '',
                 'generado': False,
                 'tipo': tipo_etiqueta,
+                'empaquetado': True,
                 'error': str(e)
             })
+        colocadas += etiquetas_volumen
+    
+    return pdfs_generados
+
+def generar_archivo_termica(productos: List[Dict], tipo_etiqueta: str, formato: str, layout: LayoutHoja,
+                            lote: str, trabajo: Optional['Trabajo'] = None) -> List[Dict]:
+    """Un único archivo ZPL/EPL con todos los productos del lote"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    nombre_archivo = nombre_en_lote(lote, f"etiquetas_{tipo_etiqueta}_{timestamp}.{formato}")
+    total_etiquetas = sum(p['cantidad'] for p in productos)
+    
+    try:
+        datos = generar_termica(productos, tipo_etiqueta, formato, layout)
+        destino = destino_pdf(nombre_archivo)
+        with medir_etapa('guardado', tipo=tipo_etiqueta):
+            if isinstance(destino, str):
+                with open(destino, 'wb') as archivo:
+                    archivo.write(datos)
+        metricas.incrementar('etiquetas_generadas_total', total_etiquetas, tipo=tipo_etiqueta)
+        metricas.incrementar('etiquetas_bytes_escritos_total', len(datos), tipo=tipo_etiqueta)
+        if trabajo:
+            trabajo.etiquetas_colocadas(total_etiquetas)
+        
+        resultado = {
+            'titulo': f'Etiquetas para impresora térmica ({formato.upper()})',
+            'cantidad': total_etiquetas,
+            'nombre_archivo': nombre_archivo,
+            'archivo': destino if isinstance(destino, str) else '',
+            'generado': True,
+            'tipo': tipo_etiqueta,
+            'formato': formato,
+            'empaquetado': True,
+            'productos_count': len(productos)
+        }
+        if not isinstance(destino, str):
+            resultado['datos'] = datos
+        return [registrar_pdf(resultado)]
+    
+    except Exception as e:
+        logger.error("Error generando archivo %s: %s", formato.upper(), e)
+        return [{
+            'titulo': f'Etiquetas para impresora térmica ({formato.upper()})',
+            'cantidad': total_etiquetas,
+            'nombre_archivo': nombre_archivo,
+            'archivo': '',
+            'generado': False,
+            'tipo': tipo_etiqueta,
+            'formato': formato,
+            'error': str(e)
+        }]
+
+def generar_lote(productos: List[Dict], tipo_etiqueta: str, trabajo: Optional['Trabajo'] = None,
+                 perfil: Optional[str] = None, empaquetado: bool = False, formato: str = 'pdf') -> List[Dict]:
+    """
+    Genera los PDFs de un lote y retorna la lista de resultados por archivo.
+    Los archivos escritos en disco llevan adelante el lote (el id del trabajo,
+    o uno nuevo si se genera sin trabajo) y cuentan para la cuota de artefactos.
+    """
+    lote = trabajo.id if trabajo else uuid.uuid4().hex
+    layout = obtener_layout(perfil)
+    if logger.isEnabledFor(logging.DEBUG):
+        for key, value in layout.info().items():
+            logger.debug("Layout %s: %s", key, value)
+    
+    os.makedirs('pdfs_generados', exist_ok=True)
+    
+    if catalogo is not None:
+        try:
+            with medir_etapa('catalogo'):
+                catalogo.guardar(productos, tipo_etiqueta)
+        except sqlite3.Error as e:
+            logger.warning("No se pudo actualizar el catálogo: %s", e)
+    
+    inicio_lote = time.perf_counter()
+    
+    # IMPRESORA TÉRMICA: UN ARCHIVO ZPL/EPL CON TODOS LOS PRODUCTOS
+    if formato != 'pdf':
+        pdfs_generados = generar_archivo_termica(productos, tipo_etiqueta, formato, layout, lote, trabajo)
+    
+    # CÓDIGO DE BARRAS: UN PDF POR PRODUCTO (salvo en modo empaquetado)
+    elif tipo_etiqueta == 'codigo_barras' and not empaquetado:
+        al_terminar = trabajo.producto_terminado if trabajo else None
+        pdfs_generados = generar_pdfs_codigo_barras(productos, lote, al_terminar, layout.nombre)
+    
+    # ETIQUETAS PERSONALIZADAS (o código de barras empaquetado): UN SOLO PDF CON TODAS LAS ETIQUETAS
+    else:
+        pdfs_generados = generar_pdfs_combinados(productos, tipo_etiqueta, layout, lote, trabajo)
+    
+    for pdf in pdfs_generados:
+        if pdf['generado'] and pdf.get('archivo'):
+            gestor_artefactos.registrar(pdf['archivo'])
+    
+    duracion_lote = time.perf_counter() - inicio_lote
+    etiquetas_lote = sum(pdf['cantidad'] for pdf in pdfs_generados if pdf['generado'])
+    metricas.observar('etiquetas_lote_segundos', duracion_lote, tipo=tipo_etiqueta)
+    if duracion_lote > 0:
+        metricas.fijar('etiquetas_por_segundo', etiquetas_lote / duracion_lote, tipo=tipo_etiqueta)
+    logger.info("Lote %s: %d archivos, %d etiquetas en %.3fs",
+                tipo_etiqueta, len(pdfs_generados), etiquetas_lote, duracion_lote)
+    
+    return pdfs_generados
+
+class Trabajo:
+    """Estado y progreso de un lote de generación encolado"""
+    
+    def __init__(self, productos: List[Dict], tipo_etiqueta: str, perfil: Optional[str] = None,
+                 empaquetado: bool = False, formato: str = 'pdf', propietario: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.propietario = propietario
+        self.productos = productos
+        self.tipo_etiqueta = tipo_etiqueta
+        self.layout = obtener_layout(perfil)
+        self.empaquetado = empaquetado
+        self.formato = formato
+        self.estado = 'pendiente'
+        self.creado = time.time()
+        self.terminado = None
+        self.pdfs = []
+        self.error = None
+        
+        por_pagina = self.layout.por_pagina
+        self.total_etiquetas = sum(p['cantidad'] for p in productos)
+        if tipo_etiqueta == 'codigo_barras' and not empaquetado and formato == 'pdf':
+            self.total_paginas = sum(math.ceil(p['cantidad'] / por_pagina) for p in productos)
+        else:
+            self.total_paginas = math.ceil(self.total_etiquetas / por_pagina)
+        self.etiquetas_generadas = 0
+        self.paginas_generadas = 0
+        self.estados_productos = ['pendiente'] * len(productos)
+        self._etiquetas_producto = [0] * len(productos)
+        self._lock = threading.Lock()
+        self.registro = None
+        self._guardado = 0.0
+    
+    @classmethod
+    def restaurar(cls, trabajo_id: str, datos: Dict, progreso: Dict) -> 'Trabajo':
+        """Trabajo guardado en el registro por otro proceso, con su último progreso (solo lectura)"""
+        trabajo = cls(datos['productos'], datos['tipo_etiqueta'], datos['perfil'], datos['empaquetado'],
+                      datos['formato'], datos['propietario'])
+        trabajo.id = trabajo_id
+        trabajo.creado = datos['creado']
+        for atributo, valor in progreso.items():
+            setattr(trabajo, atributo, valor)
+        return trabajo
+    
+    def datos(self) -> Dict:
+        """Lo que define el trabajo, para el registro compartido"""
+        return {
+            'productos': self.productos,
+            'tipo_etiqueta': self.tipo_etiqueta,
+            'perfil': self.layout.nombre,
+            'empaquetado': self.empaquetado,
+            'formato': self.formato,
+            'propietario': self.propietario,
+            'creado': self.creado,
+        }
+    
+    def progreso(self) -> Dict:
+        """Lo que cambia mientras corre, para el registro compartido"""
+        with self._lock:
+            return {
+                'estado': self.estado,
+                'etiquetas_generadas': self.etiquetas_generadas,
+                'paginas_generadas': self.paginas_generadas,
+                'estados_productos': list(self.estados_productos),
+                'pdfs': self.pdfs,
+                'error': self.error,
+                'terminado': self.terminado,
+            }
+    
+    def guardar(self, forzar: bool = False) -> None:
+        """Guarda el progreso en el registro compartido, a lo sumo cada INTERVALO_GUARDADO segundos"""
+        if self.registro is None:
+            return
+        ahora = time.monotonic()
+        if not forzar and ahora - self._guardado < self.registro.INTERVALO_GUARDADO:
+            return
+        self._guardado = ahora
+        try:
+            self.registro.actualizar(self)
+        except sqlite3.Error as e:
+            logger.warning("No se pudo guardar el progreso del trabajo %s: %s", self.id, e)
+    
+    def producto_terminado(self, indice: int, resultado: Dict) -> None:
+        """Progreso del modo código de barras: un PDF (o un volumen) del producto listo"""
+        cantidad = resultado['cantidad']
+        with self._lock:
+            self._etiquetas_producto[indice] += cantidad
+            if self.estados_productos[indice] != 'error':
+                if not resultado.get('generado'):
+                    self.estados_productos[indice] = 'error'
+                elif self._etiquetas_producto[indice] >= self.productos[indice]['cantidad']:
+                    self.estados_productos[indice] = 'completado'
+                else:
+                    self.estados_productos[indice] = 'en_proceso'
+            self.etiquetas_generadas += cantidad
+            self.paginas_generadas += self.layout.paginas(cantidad)
+        self.guardar()
+    
+    def etiquetas_colocadas(self, etiquetas: int) -> None:
+        """Progreso del modo personalizado: etiquetas colocadas en el PDF único"""
+        with self._lock:
+            self.etiquetas_generadas = etiquetas
+            self.paginas_generadas = self.layout.paginas(etiquetas)
+            acumulado = 0
+            for idx, producto in enumerate(self.productos):
+                acumulado += producto['cantidad']
+                if acumulado <= etiquetas:
+                    self.estados_productos[idx] = 'completado'
+                elif acumulado - producto['cantidad'] < etiquetas:
+                    self.estados_productos[idx] = 'en_proceso'
+        self.guardar()
+    
+    @property
+    def finalizado(self) -> bool:
+        return self.estado in ('completado', 'error')
+    
+    def resumen(self) -> Dict:
+        """Estado serializable para el endpoint de progreso"""
+        with self._lock:
+            return {
+                'id': self.id,
+                'estado': self.estado,
+                'tipo_etiqueta': self.tipo_etiqueta,
+                'perfil': self.layout.nombre,
+                'empaquetado': self.empaquetado,
+                'formato': self.formato,
+                'etiquetas_generadas': self.etiquetas_generadas,
+                'total_etiquetas': self.total_etiquetas,
+                'paginas_generadas': self.paginas_generadas,
+                'total_paginas': self.total_paginas,
+                'productos': [
+                    {'titulo': p.get('sku') or p.get('nombre_producto', ''), 'estado': estado}
+                    for p, estado in zip(self.productos, self.estados_productos)
+                ],
+                'error': self.error,
+            }
+
+class RegistroTrabajos(BaseSQLite):
+    """
+    Estado de los trabajos en SQLite, compartido por todos los workers: el
+    que ejecuta un trabajo guarda su progreso y cualquier otro puede mostrarlo
+    o entregar sus archivos. El progreso se guarda al empezar, a lo sumo cada
+    INTERVALO_GUARDADO segundos mientras avanza y al terminar. Un trabajo sin
+    terminar que no avanza en SIN_PROGRESO segundos quedó huérfano (su worker
+    se reinició) y se informa como error.
+    """
+    
+    INTERVALO_GUARDADO = 0.5
+    SIN_PROGRESO = 600
+    INTERVALO_PURGA = 600
+    
+    def __init__(self, ruta_db: str, ttl: int):
+        super().__init__(ruta_db)
+        self.ttl = ttl
+        self._ultima_purga = 0.0
+    
+    def _crear_esquema(self, conexion: sqlite3.Connection) -> None:
+        conexion.execute("PRAGMA journal_mode=WAL")
+        conexion.execute(
+            "CREATE TABLE IF NOT EXISTS trabajos ("
+            " id TEXT PRIMARY KEY, datos TEXT NOT NULL, progreso TEXT NOT NULL,"
+            " actualizado REAL NOT NULL, terminado REAL)")
+        conexion.execute("CREATE INDEX IF NOT EXISTS idx_trabajos_terminado ON trabajos (terminado)")
+    
+    def crear(self, trabajo: Trabajo) -> None:
+        ahora = time.time()
+        with self._conectar() as conexion:
+            conexion.execute(
+                "INSERT INTO trabajos (id, datos, progreso, actualizado) VALUES (?, ?, ?, ?)",
+                (trabajo.id, json.dumps(trabajo.datos(), ensure_ascii=False),
+                 json.dumps(trabajo.progreso(), ensure_ascii=False), ahora))
+            if ahora - self._ultima_purga > self.INTERVALO_PURGA:
+                self._ultima_purga = ahora
+                conexion.execute(
+                    "DELETE FROM trabajos WHERE terminado <= ? OR (terminado IS NULL AND actualizado <= ?)",
+                    (ahora - self.ttl, ahora - max(self.ttl, self.SIN_PROGRESO)))
+    
+    def actualizar(self, trabajo: Trabajo) -> None:
+        progreso = trabajo.progreso()
+        with self._conectar() as conexion:
+            conexion.execute(
+                "UPDATE trabajos SET progreso = ?, actualizado = ?, terminado = ? WHERE id = ?",
+                (json.dumps(progreso, ensure_ascii=False), time.time(), progreso['terminado'], trabajo.id))
+    
+    def obtener(self, trabajo_id: str) -> Optional[Trabajo]:
+        with self._conectar() as conexion:
+            fila = conexion.execute(
+                "SELECT datos, progreso, actualizado FROM trabajos WHERE id = ?", (trabajo_id,)).fetchone()
+        if fila is None:
+            return None
+        trabajo = Trabajo.restaurar(trabajo_id, json.loads(fila[0]), json.loads(fila[1]))
+        if not trabajo.finalizado and fila[2] < time.time() - self.SIN_PROGRESO:
+            trabajo.estado = 'error'
+            trabajo.error = "El trabajo se interrumpió antes de terminar; vuelve a generarlo."
+            trabajo.terminado = fila[2]
+        return trabajo
+    
+    def activos(self) -> set:
+        """Ids de los trabajos en curso o terminados hace menos de `ttl` segundos"""
+        ahora = time.time()
+        with self._conectar() as conexion:
+            filas = conexion.execute(
+                "SELECT id FROM trabajos WHERE terminado > ? OR (terminado IS NULL AND actualizado > ?)",
+                (ahora - self.ttl, ahora - self.SIN_PROGRESO)).fetchall()
+        return {fila[0] for fila in filas}
+
+class GestorTrabajos:
+    """
+    Cola de trabajos de generación atendida por un pool de hilos del propio
+    proceso, sin broker externo. Con un registro (RegistroTrabajos), el estado
+    de cada trabajo queda en SQLite y cualquier worker lo puede consultar;
+    sin él, solo el proceso que lo encoló. Los trabajos finalizados se
+    descartan pasado `ttl` segundos.
+    """
+    
+    def __init__(self, max_workers: int, ttl: int = 3600, registro: Optional[RegistroTrabajos] = None):
+        self.max_workers = max_workers
+        self.ttl = ttl
+        self.registro = registro
+        self._executor = None
+        self._trabajos = {}
+        self._lock = threading.Lock()
+    
+    def _nuevo(self, productos: List[Dict], tipo_etiqueta: str, perfil: Optional[str], empaquetado: bool,
+               formato: str, propietario: Optional[str]) -> Trabajo:
+        """Crea el trabajo y lo registra, en el proceso y (si hay) en el registro compartido"""
+        trabajo = Trabajo(productos, tipo_etiqueta, perfil, empaquetado, formato, propietario)
+        if self.registro is not None:
+            try:
+                self.registro.crear(trabajo)
+                trabajo.registro = self.registro
+            except sqlite3.Error as e:
+                logger.warning("No se pudo registrar el trabajo %s: %s", trabajo.id, e)
+        with self._lock:
+            self._purgar()
+            self._trabajos[trabajo.id] = trabajo
+        return trabajo
+    
+    def encolar(self, productos: List[Dict], tipo_etiqueta: str, perfil: Optional[str] = None,
+                empaquetado: bool = False, formato: str = 'pdf', propietario: Optional[str] = None) -> Trabajo:
+        trabajo = self._nuevo(productos, tipo_etiqueta, perfil, empaquetado, formato, propietario)
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='generador')
+        self._executor.submit(self._ejecutar, trabajo)
+        return trabajo
+    
+    def ejecutar(self, productos: List[Dict], tipo_etiqueta: str, perfil: Optional[str] = None,
+                 empaquetado: bool = False, formato: str = 'pdf', propietario: Optional[str] = None) -> Trabajo:
+        """
+        Como encolar, pero genera en el hilo actual y retorna el trabajo ya
+        terminado. Sus archivos quedan en un lote activo como los de cualquier
+        trabajo, así que el barrido no los borra antes de entregarlos.
+        """
+        trabajo = self._nuevo(productos, tipo_etiqueta, perfil, empaquetado, formato, propietario)
+        self._ejecutar(trabajo)
+        return trabajo
+    
+    def obtener(self, trabajo_id: Optional[str]) -> Optional[Trabajo]:
+        """El trabajo de este proceso o, si lo encoló otro worker, el último estado guardado"""
+        if not trabajo_id:
+            return None
+        with self._lock:
+            trabajo = self._trabajos.get(trabajo_id)
+        if trabajo is not None or self.registro is None:
+            return trabajo
+        try:
+            return self.registro.obtener(trabajo_id)
+        except sqlite3.Error as e:
+            logger.warning("No se pudo consultar el trabajo %s: %s", trabajo_id, e)
+            return None
+    
+    def ids(self) -> set:
+        """Lotes activos en todos los workers: en curso o terminados hace menos de `ttl`"""
+        with self._lock:
+            self._purgar()
+            activos = set(self._trabajos)
+        if self.registro is not None:
+            try:
+                activos |= self.registro.activos()
+            except sqlite3.Error as e:
+                logger.warning("No se pudieron consultar los trabajos activos: %s", e)
+        return activos
+    
+    def _ejecutar(self, trabajo: Trabajo) -> None:
+        trabajo.estado = 'en_proceso'
+        trabajo.guardar(forzar=True)
+        try:
+            trabajo.pdfs = generar_lote(trabajo.productos, trabajo.tipo_etiqueta, trabajo,
+                                        trabajo.layout.nombre, trabajo.empaquetado, trabajo.formato)
+            trabajo.estado = 'completado'
+        except Exception as e:
+            logger.exception("Error en trabajo %s", trabajo.id)
+            trabajo.error = str(e)
+            trabajo.estado = 'error'
+        finally:
+            trabajo.terminado = time.time()
+            trabajo.guardar(forzar=True)
+    
+    def _purgar(self) -> None:
+        limite = time.time() - self.ttl
+        for trabajo_id in [t.id for t in self._trabajos.values()
+                           if t.finalizado and t.terminado < limite]:
+            del self._trabajos[trabajo_id]
+
+gestor_trabajos = GestorTrabajos(
+    int(os.environ.get('TRABAJOS_WORKERS', '2')), LabelConfig.TRABAJOS_TTL,
+    RegistroTrabajos(LabelConfig.TRABAJOS_DB, LabelConfig.TRABAJOS_TTL) if LabelConfig.TRABAJOS_DB else None)
+
+def propietario_sesion() -> str:
+    """Quién pidió el lote: el id de la sesión guardada en el servidor o, con sesión en cookie, la IP"""
+    return getattr(session, 'sid', None) or request.remote_addr or ''
+
+def validar_opciones_lote(tipo_etiqueta: Optional[str], perfil_hoja: str, formato: str) -> Optional[str]:
+    """Error de las opciones de un lote cargado desde la página de inicio, o None"""
+    if tipo_etiqueta not in COLUMNAS_IMPORTACION:
+        return "Debe seleccionar un tipo de etiqueta válido."
+    if perfil_hoja not in LAYOUTS_HOJA:
+        return "Debe seleccionar un formato de hoja válido."
+    if formato not in FORMATOS_SALIDA:
+        return "Debe seleccionar un formato de salida válido."
+    return None
+
+def mostrar_errores(errores: List[str]) -> None:
+    for error in errores[:LabelConfig.MAX_ERRORES_MOSTRADOS]:
+        flash(error)
+    if len(errores) > LabelConfig.MAX_ERRORES_MOSTRADOS:
+        flash(f"... y {len(errores) - LabelConfig.MAX_ERRORES_MOSTRADOS} errores más.")
+
+def encolar_lote_sesion(productos: List[Dict], tipo_etiqueta: str, perfil_hoja: str,
+                        empaquetado: bool, formato: str):
+    """Reemplaza el lote de la sesión por uno ya validado, lo encola y lleva al panel"""
+    session.clear()
+    session['tipo_etiqueta'] = tipo_etiqueta
+    session['perfil_hoja'] = perfil_hoja
+    session['empaquetado'] = empaquetado
+    session['formato'] = formato
+    trabajo = gestor_trabajos.encolar(productos, tipo_etiqueta, perfil_hoja, empaquetado, formato,
+                                      propietario_sesion())
+    session['trabajo_id'] = trabajo.id
+    return redirect(url_for('generar_etiquetas'))
+
+@app.route('/importar-productos', methods=['POST'])
+def importar_productos_archivo():
+    """
+    Paso 2 alternativo: cargar productos desde un CSV/XLSX y generar directamente,
+    o solo guardarlos en el catálogo (solo_catalogo)
+    """
+    tipo_etiqueta = request.form.get('tipo_etiqueta')
+    perfil_hoja = request.form.get('perfil_hoja') or PERFIL_HOJA_DEFECTO
+    formato = request.form.get('formato') or 'pdf'
+    solo_catalogo = bool(request.form.get('solo_catalogo'))
+    archivo = request.files.get('archivo')
+    
+    error = validar_opciones_lote(tipo_etiqueta, perfil_hoja, formato)
+    if error:
+        flash(error)
+        return redirect(url_for('index'))
+    
+    if archivo is None or not archivo.filename:
+        flash("Debe seleccionar un archivo CSV o XLSX.")
+        return redirect(url_for('index'))
+    
+    if solo_catalogo and catalogo is None:
+        flash("El catálogo de productos no está habilitado.")
+        return redirect(url_for('index'))
+    
+    try:
+        filas = leer_filas_importacion(archivo.filename, archivo.stream)
+        empaquetado = tipo_etiqueta == 'codigo_barras' and bool(request.form.get('empaquetado'))
+        # Para el catálogo no hay lote que verificar: solo se validan las filas
+        productos, errores = importar_productos(filas, tipo_etiqueta, perfil_hoja, empaquetado,
+                                                None if solo_catalogo else formato)
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        flash(f"No se pudo leer el archivo: {str(e)}")
+        return redirect(url_for('index'))
+    except Exception as e:
+        flash(f"Error procesando el archivo: {str(e)}")
+        return redirect(url_for('index'))
+    
+    if errores:
+        mostrar_errores(errores)
+        return redirect(url_for('index'))
+    
+    if solo_catalogo:
+        try:
+            guardados = catalogo.guardar(productos, tipo_etiqueta, impreso=False)
+        except sqlite3.Error as e:
+            flash(f"No se pudo guardar en el catálogo: {str(e)}")
+            return redirect(url_for('index'))
+        flash(f"Se guardaron {guardados} productos en el catálogo.")
+        return redirect(url_for('index'))
+    
+    return encolar_lote_sesion(productos, tipo_etiqueta, perfil_hoja, empaquetado, formato)
+
+@app.route('/reimprimir', methods=['POST'])
+def reimprimir():
+    """Paso 2 alternativo: reimprimir productos del catálogo por SKU y generar directamente"""
+    tipo_etiqueta = request.form.get('tipo_etiqueta')
+    perfil_hoja = request.form.get('perfil_hoja') or PERFIL_HOJA_DEFECTO
+    formato = request.form.get('formato') or 'pdf'
+    
+    error = validar_opciones_lote(tipo_etiqueta, perfil_hoja, formato)
+    if error:
+        flash(error)
+        return redirect(url_for('index'))
+    
+    empaquetado = tipo_etiqueta == 'codigo_barras' and bool(request.form.get('empaquetado'))
+    pedidos, errores = leer_lineas_reimpresion(request.form.get('lineas', ''))
+    try:
+        if not errores:
+            productos, errores = resolver_reimpresion(pedidos, tipo_etiqueta)
+        if not errores:
+            errores = verificar_lote(productos, tipo_etiqueta, perfil_hoja, empaquetado, formato)
+    except sqlite3.Error as e:
+        errores = [f"No se pudo consultar el catálogo: {str(e)}"]
+    
+    if errores:
+        mostrar_errores(errores)
+        return redirect(url_for('index'))
+    
+    return encolar_lote_sesion(productos, tipo_etiqueta, perfil_hoja, empaquetado, formato)
 
-    session['pdfs_generados'] = pdfs_generados
-    return render_template('panel_descarga.html', pdfs=pdfs_generados, tipo_etiqueta=tipo_etiqueta)
+@app.route('/generar-etiquetas')
+def generar_etiquetas():
+    """
+    Paso 3: Encolar la generación de PDFs y mostrar su progreso. Si el
+    trabajo de la sesión ya no existe (venció o se perdió), no se repite por
+    su cuenta: el operador decide si lo vuelve a generar (?regenerar=1).
+    """
+    trabajo_id = session.get('trabajo_id')
+    trabajo = gestor_trabajos.obtener(trabajo_id)
+    if trabajo is None:
+        if trabajo_id and not request.args.get('regenerar'):
+            return render_template('panel_descarga.html', pdfs=[], trabajo=None, trabajo_perdido=True,
+                                   tipo_etiqueta=session.get('tipo_etiqueta'),
+                                   layout=obtener_layout(session.get('perfil_hoja')),
+                                   puede_regenerar='productos' in session and 'tipo_etiqueta' in session)
+        if 'productos' not in session or 'tipo_etiqueta' not in session:
+            return redirect(url_for('index'))
+        session.pop('pdfs_generados', None)
+        trabajo = gestor_trabajos.encolar(session['productos'], session['tipo_etiqueta'],
+                                          session.get('perfil_hoja'), session.get('empaquetado', False),
+                                          session.get('formato', 'pdf'), propietario_sesion())
+        session['trabajo_id'] = trabajo.id
+    
+    tipo_etiqueta = trabajo.tipo_etiqueta
+    
+    if trabajo.estado == 'completado':
+        session['pdfs_generados'] = trabajo.pdfs
+    
+    return render_template('panel_descarga.html', pdfs=trabajo.pdfs, tipo_etiqueta=tipo_etiqueta,
+                           trabajo=trabajo.resumen(), layout=trabajo.layout)
+
+@app.route('/estado-trabajo/<trabajo_id>')
+def estado_trabajo(trabajo_id: str):
+    """Progreso de un trabajo de generación (consultado por panel_descarga.html)"""
+    trabajo = gestor_trabajos.obtener(trabajo_id)
+    if trabajo is None:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    return jsonify(trabajo.resumen())
 
 @app.route('/descargar/<filename>')
 def descargar_pdf(filename: str):
@@ -655,17 +3610,39 @@ def descargar_pdf(filename: str):
         flash("Nombre de archivo inválido.")
         return redirect(url_for('index'))
     
+    datos = almacen_memoria.obtener(filename)
+    if datos is not None:
+        return medir_envio(send_file(BytesIO(datos), as_attachment=True, download_name=nombre_descarga(filename),
+                                     mimetype=tipo_mime(filename)))
+    
     ruta_archivo = os.path.join('pdfs_generados', filename)
     
-    if os.path.exists(ruta_archivo):
-        return send_file(ruta_archivo, as_attachment=True)
+    if os.path.isfile(ruta_archivo):
+        gestor_artefactos.tocar(ruta_archivo)
+        return medir_envio(send_file(os.path.abspath(ruta_archivo), as_attachment=True,
+                                     download_name=nombre_descarga(filename), mimetype=tipo_mime(filename)))
     else:
-        flash("El archivo no existe.")
-        return redirect(url_for('generar_etiquetas'))
+        return jsonify({'errores': ["El archivo ya no está disponible."]}), 410
+
+@app.route('/vista-previa/<filename>')
+def vista_previa(filename: str):
+    """Miniatura PNG de una hoja de un PDF generado (?pagina=1&ancho=400)"""
+    try:
+        pagina = int(request.args.get('pagina', 1))
+        ancho = int(request.args.get('ancho', LabelConfig.VISTA_PREVIA_ANCHO))
+    except ValueError:
+        return jsonify({'error': 'Parámetros inválidos'}), 400
+    ancho = max(50, min(ancho, LabelConfig.VISTA_PREVIA_ANCHO_MAX))
+    
+    png = obtener_vista_previa(filename, pagina, ancho)
+    if png is None:
+        return jsonify({'error': 'Vista previa no disponible'}), 404
+    
+    return send_file(BytesIO(png), mimetype='image/png', max_age=3600)
 
 @app.route('/descargar-todos')
 def descargar_todos():
-    """Descargar todos los PDFs en ZIP"""
+    """Descargar todos los PDFs en un ZIP, armado una sola vez por conjunto de archivos"""
     if 'pdfs_generados' not in session:
         return redirect(url_for('index'))
 
@@ -674,17 +3651,217 @@ def descargar_todos():
     if not pdfs_exitosos:
         flash("No hay archivos para descargar.")
         return redirect(url_for('generar_etiquetas'))
+    
+    # Una vez iniciada la respuesta ya no se puede redirigir: verificar antes
+    pdfs_disponibles = [pdf for pdf in pdfs_exitosos
+                        if pdf['nombre_archivo'] in almacen_memoria
+                        or os.path.isfile(os.path.join('pdfs_generados', pdf['nombre_archivo']))]
+    if not pdfs_disponibles:
+        flash("Los archivos ya no están disponibles.")
+        return redirect(url_for('generar_etiquetas'))
 
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    zip_filename = f"etiquetas_silk_perfumes_{timestamp}.zip"
-    zip_path = os.path.join('pdfs_generados', zip_filename)
+    lote = session.get('trabajo_id') or uuid.uuid4().hex
+    zip_filename = nombre_en_lote(lote, f"etiquetas_silk_perfumes_{timestamp}.zip")
+
+    return respuesta_zip(pdfs_disponibles, zip_filename)
 
+def respuesta_zip(pdfs: List[Dict], nombre_zip: str) -> Response:
+    """El ZIP del conjunto desde la caché de ZIPs o, si no se puede guardar, armado al vuelo"""
     try:
-        crear_zip_pdfs(pdfs_exitosos, zip_path)
-        return send_file(zip_path, as_attachment=True)
+        ruta_zip = cache_zips.obtener(pdfs)
     except Exception as e:
-        flash(f"Error creando ZIP: {str(e)}")
-        return redirect(url_for('generar_etiquetas'))
+        logger.warning("No se pudo guardar el ZIP en caché: %s", e)
+        ruta_zip = None
+    if ruta_zip is not None:
+        return medir_envio(send_file(os.path.abspath(ruta_zip), as_attachment=True,
+                                     download_name=nombre_descarga(nombre_zip), mimetype='application/zip'))
+    return medir_envio(Response(generar_zip_stream(pdfs), mimetype='application/zip',
+                                headers={'Content-Disposition': cabecera_adjunto(nombre_descarga(nombre_zip))}))
+
+def respuesta_archivos(pdfs: List[Dict], nombre_zip: str) -> Response:
+    """Un solo archivo se entrega tal cual; varios, como ZIP"""
+    if len(pdfs) == 1:
+        fuente = abrir_artefacto(pdfs[0]['nombre_archivo'])
+        if fuente is None:
+            return jsonify({'errores': ["El archivo ya no está disponible."]}), 410
+        return medir_envio(send_file(fuente, as_attachment=True, download_name=nombre_descarga(pdfs[0]['nombre_archivo']),
+                                     mimetype=tipo_mime(pdfs[0]['nombre_archivo'])))
+    return respuesta_zip(pdfs, nombre_zip)
+
+def resumen_api(trabajo: Trabajo) -> Dict:
+    """Estado del trabajo con los enlaces de descarga para clientes de la API"""
+    resumen = trabajo.resumen()
+    resumen['estado_url'] = url_for('api_estado_etiquetas', trabajo_id=trabajo.id)
+    if trabajo.estado == 'completado':
+        resumen['descarga_url'] = url_for('api_descargar_etiquetas', trabajo_id=trabajo.id)
+        resumen['archivos'] = [
+            {
+                'nombre_archivo': pdf['nombre_archivo'],
+                'generado': pdf['generado'],
+                'error': pdf.get('error'),
+                'url': url_for('descargar_pdf', filename=pdf['nombre_archivo']) if pdf['generado'] else None,
+            }
+            for pdf in trabajo.pdfs
+        ]
+    return resumen
+
+def opciones_api(datos) -> Tuple[Optional[Dict], List[str]]:
+    """Opciones de lote comunes a los endpoints de generación; (opciones, errores)"""
+    if not isinstance(datos, dict):
+        return None, ["El cuerpo debe ser un objeto JSON."]
+    
+    tipo_etiqueta = datos.get('tipo_etiqueta')
+    if tipo_etiqueta not in COLUMNAS_IMPORTACION:
+        return None, ["tipo_etiqueta debe ser 'codigo_barras' o 'personalizado'."]
+    
+    perfil = datos.get('perfil') or PERFIL_HOJA_DEFECTO
+    formato = datos.get('formato') or 'pdf'
+    if formato not in FORMATOS_SALIDA:
+        return None, [f"formato debe ser uno de: {', '.join(FORMATOS_SALIDA)}."]
+    if perfil not in LAYOUTS_HOJA:
+        return None, [f"perfil debe ser uno de: {', '.join(LAYOUTS_HOJA)}."]
+    
+    lista = datos.get('productos')
+    if not isinstance(lista, list) or not all(isinstance(p, dict) for p in lista):
+        return None, ["productos debe ser una lista de objetos."]
+    
+    return {
+        'tipo_etiqueta': tipo_etiqueta,
+        'perfil': perfil,
+        'empaquetado': bool(datos.get('empaquetado')),
+        'formato': formato,
+        'asincrono': bool(datos.get('asincrono')),
+        'productos': lista,
+    }, []
+
+def responder_lote_api(productos: List[Dict], opciones: Dict):
+    """Genera un lote ya validado y verificado (o lo encola si es asíncrono)"""
+    tipo_etiqueta, perfil = opciones['tipo_etiqueta'], opciones['perfil']
+    empaquetado, formato = opciones['empaquetado'], opciones['formato']
+    
+    if opciones['asincrono']:
+        trabajo = gestor_trabajos.encolar(productos, tipo_etiqueta, perfil, empaquetado, formato, 'api')
+        return jsonify(resumen_api(trabajo)), 202
+    
+    trabajo = gestor_trabajos.ejecutar(productos, tipo_etiqueta, perfil, empaquetado, formato, 'api')
+    if trabajo.estado == 'error':
+        return jsonify({'errores': [trabajo.error]}), 500
+    fallidos = [pdf for pdf in trabajo.pdfs if not pdf['generado']]
+    if fallidos:
+        return jsonify({'errores': [f"{pdf['titulo']}: {pdf['error']}" for pdf in fallidos]}), 500
+    
+    return respuesta_archivos(trabajo.pdfs, f"etiquetas_{trabajo.id}.zip")
+
+@app.route('/api/labels', methods=['POST'])
+def api_generar_etiquetas():
+    """
+    Generación sin asistente para clientes máquina.
+    
+    Cuerpo JSON: {"tipo_etiqueta": "codigo_barras" | "personalizado",
+                  "productos": [{...}], "perfil": "carta_35x25", "empaquetado": false,
+                  "formato": "pdf" | "zpl" | "epl", "asincrono": false}
+    simbologia (por producto): code128 (por defecto), ean13, upca o qr; una
+    etiqueta personalizada puede llevar un "codigo" QR junto al texto.
+    empaquetado: con código de barras, todos los productos en un solo PDF.
+    formato: zpl/epl entrega un único archivo de texto para impresoras térmicas.
+    Síncrono: responde el archivo (o un ZIP si hay varios). Asíncrono: 202 con el trabajo.
+    """
+    opciones, errores = opciones_api(request.get_json(silent=True))
+    if errores:
+        return jsonify({'errores': errores}), 400
+    
+    # Los validadores trabajan con texto, igual que los campos del formulario
+    filas = ((numero, {k: '' if v is None else str(v) for k, v in p.items()})
+             for numero, p in enumerate(opciones['productos'], start=1))
+    productos, errores = validar_productos(filas, opciones['tipo_etiqueta'], opciones['perfil'],
+                                           opciones['empaquetado'], opciones['formato'])
+    if errores:
+        return jsonify({'errores': errores}), 400
+    return responder_lote_api(productos, opciones)
+
+@app.route('/api/labels/reprint', methods=['POST'])
+def api_reimprimir_etiquetas():
+    """
+    Reimpresión por SKU desde el catálogo de productos.
+    
+    Cuerpo JSON: igual que /api/labels, pero cada producto es {"sku": "...", "cantidad": 10};
+    el resto de los campos se toma del catálogo (última versión guardada del SKU).
+    """
+    if catalogo is None:
+        return jsonify({'errores': ["El catálogo de productos no está habilitado."]}), 404
+    
+    opciones, errores = opciones_api(request.get_json(silent=True))
+    if errores:
+        return jsonify({'errores': errores}), 400
+    
+    lineas = '\n'.join(f"{p.get('sku', '')} {p.get('cantidad', '')}" for p in opciones['productos'])
+    pedidos, errores = leer_lineas_reimpresion(lineas)
+    try:
+        if not errores:
+            productos, errores = resolver_reimpresion(pedidos, opciones['tipo_etiqueta'])
+        if not errores:
+            errores = verificar_lote(productos, opciones['tipo_etiqueta'], opciones['perfil'],
+                                     opciones['empaquetado'], opciones['formato'])
+    except sqlite3.Error as e:
+        logger.exception("Error consultando el catálogo")
+        return jsonify({'errores': [f"No se pudo consultar el catálogo: {str(e)}"]}), 500
+    if errores:
+        return jsonify({'errores': errores}), 400
+    return responder_lote_api(productos, opciones)
+
+@app.route('/api/labels/<trabajo_id>')
+def api_estado_etiquetas(trabajo_id: str):
+    """Estado de un trabajo asíncrono de la API"""
+    trabajo = gestor_trabajos.obtener(trabajo_id)
+    if trabajo is None:
+        return jsonify({'errores': ["Trabajo no encontrado."]}), 404
+    return jsonify(resumen_api(trabajo))
+
+@app.route('/api/labels/<trabajo_id>/descarga')
+def api_descargar_etiquetas(trabajo_id: str):
+    """Archivos de un trabajo asíncrono terminado (PDF o ZIP)"""
+    trabajo = gestor_trabajos.obtener(trabajo_id)
+    if trabajo is None:
+        return jsonify({'errores': ["Trabajo no encontrado."]}), 404
+    if not trabajo.finalizado:
+        return jsonify(resumen_api(trabajo)), 409
+    
+    pdfs = [pdf for pdf in trabajo.pdfs if pdf['generado']
+            and (pdf['nombre_archivo'] in almacen_memoria
+                 or os.path.isfile(os.path.join('pdfs_generados', pdf['nombre_archivo'])))]
+    if not pdfs:
+        return jsonify({'errores': ["No hay archivos disponibles para este trabajo."]}), 410
+    return respuesta_archivos(pdfs, f"etiquetas_{trabajo.id}.zip")
+
+@app.route('/metrics')
+def metrics():
+    """Métricas en formato de texto de Prometheus"""
+    cache = cache_barcodes.estadisticas()
+    adicionales = [
+        ('etiquetas_cache_barcodes_hits_total', 'counter', 'Aciertos de la caché de códigos de barras', cache['hits']),
+        ('etiquetas_cache_barcodes_misses_total', 'counter', 'Fallos de la caché de códigos de barras', cache['misses']),
+        ('etiquetas_cache_barcodes_evictions_total', 'counter', 'Expulsiones de la caché de códigos de barras',
+         cache['evictions']),
+        ('etiquetas_cache_barcodes_bytes', 'gauge', 'Bytes ocupados por la caché de códigos de barras', cache['bytes']),
+    ]
+    vistas = cache_vistas_previas.estadisticas()
+    adicionales += [
+        ('etiquetas_vistas_previas_hits_total', 'counter', 'Vistas previas servidas desde la caché', vistas['hits']),
+        ('etiquetas_vistas_previas_misses_total', 'counter', 'Vistas previas dibujadas', vistas['misses']),
+        ('etiquetas_vistas_previas_bytes', 'gauge', 'Bytes ocupados por la caché de vistas previas', vistas['bytes']),
+    ]
+    artefactos = gestor_artefactos.estadisticas()
+    adicionales += [
+        ('etiquetas_artefactos_archivos', 'gauge', 'Archivos generados en disco', artefactos['archivos']),
+        ('etiquetas_artefactos_bytes', 'gauge', 'Bytes de archivos generados en disco', artefactos['bytes']),
+    ]
+    return Response(metricas.exportar(adicionales), mimetype='text/plain; version=0.0.4')
+
+@app.route('/cache/estadisticas')
+def estadisticas_cache():
+    """Contadores de la caché de códigos de barras"""
+    return jsonify(cache_barcodes.estadisticas())
 
 @app.route('/reiniciar')
 def reiniciar():
@@ -694,27 +3871,54 @@ def reiniciar():
 
 @app.route('/limpiar-archivos')
 def limpiar_archivos():
-    """Limpiar archivos generados"""
+    """
+    Borrar los archivos del último lote de esta sesión y barrer los vencidos.
+    Se borra por lote, no por nombre: los archivos de otros operadores (aunque
+    sean del mismo SKU) solo los borra el barrido (TTL y cuota), que nunca toca
+    los de lotes activos.
+    """
+    trabajo_id = session.get('trabajo_id')
+    trabajo = gestor_trabajos.obtener(trabajo_id)
+    if trabajo is not None and not trabajo.finalizado:
+        flash("El lote todavía se está generando; espera a que termine para limpiar sus archivos.")
+        return redirect(url_for('generar_etiquetas'))
+    
     try:
-        if os.path.exists('pdfs_generados'):
-            archivos_eliminados = 0
-            for archivo in os.listdir('pdfs_generados'):
-                os.remove(os.path.join('pdfs_generados', archivo))
-                archivos_eliminados += 1
-            flash(f"Se eliminaron {archivos_eliminados} archivos.")
-        else:
-            flash("No hay archivos para eliminar.")
+        archivos_eliminados = gestor_artefactos.eliminar_lote(trabajo_id) if trabajo_id else 0
+        archivos_eliminados += gestor_artefactos.barrer()
     except Exception as e:
         flash(f"Error limpiando archivos: {str(e)}")
+        return redirect(url_for('index'))
     
+    session.pop('trabajo_id', None)
+    session.pop('pdfs_generados', None)
+    if archivos_eliminados:
+        flash(f"Se eliminaron {archivos_eliminados} archivos.")
+    else:
+        flash("No hay archivos para eliminar.")
     return redirect(url_for('index'))
 
+def es_ruta_api() -> bool:
+    """Los clientes de /api/ esperan JSON también en los errores, nunca una redirección"""
+    return request.path.startswith('/api/')
+
+@app.errorhandler(HTTPException)
+def error_http(error: HTTPException):
+    """Errores HTTP sin manejador propio (405, 413...): JSON en la API, la página de defecto en el resto"""
+    if es_ruta_api():
+        return jsonify({'errores': [error.description]}), error.code
+    return error
+
 @app.errorhandler(404)
 def not_found(error):
+    if es_ruta_api():
+        return jsonify({'errores': ["Recurso no encontrado."]}), 404
     return redirect(url_for('index'))
 
 @app.errorhandler(500)
 def internal_error(error):
+    if es_ruta_api():
+        return jsonify({'errores': ["Ocurrió un error interno. Por favor, intenta nuevamente."]}), 500
     flash("Ocurrió un error interno. Por favor, intenta nuevamente.")
     return redirect(url_for('index'))
 
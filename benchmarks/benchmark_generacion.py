@@ -0,0 +1,277 @@
+"""
+Benchmarks de los caminos críticos de generación de etiquetas.
+
+Mide tiempo de pared, memoria pico y tamaño de salida de codificar_codigo
+(por simbología, con Code128 de python-barcode como referencia), generar_barcode,
+generar_pdf_codigo_barras, generar_pdf_personalizado_masivo,
+dividir_texto_por_ancho y crear_zip_pdfs sobre una grilla de casos realista.
+Funciona sin conexión con las dependencias de requirements.txt; la
+referencia de python-barcode (requirements-dev.txt) se omite si no está instalada.
+
+Uso (desde la raíz del proyecto):
+    python benchmarks/benchmark_generacion.py --guardar benchmarks/baseline.json
+    python benchmarks/benchmark_generacion.py --comparar benchmarks/baseline.json --umbral 15
+    python benchmarks/benchmark_generacion.py --rapido --filtro barcode
+"""
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+# Sin sesiones en SQLite ni caché de artefactos: solo se mide el render
+os.environ.setdefault('SESIONES_DB', '')
+os.environ.setdefault('CACHE_ARTEFACTOS_DIR', '')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+import simbologias  # noqa: E402
+
+# Un contenido válido por simbología; el índice lo vuelve distinto en cada llamada
+CONTENIDOS = {
+    'code128': lambda i: f"SILK-{i:010d}",
+    'ean13': lambda i: f"779{i:09d}",
+    'upca': lambda i: f"04{i:09d}",
+    'qr': lambda i: f"https://tienda.example/p/SILK-{i:06d}",
+}
+
+NOMBRE_CORTO = "Rose"
+NOMBRE_LARGO = "Perfume Silk Rose Intense edición limitada para dama con notas florales"
+OTRO_LARGO = "Eau de parfum 100ml - lote 2025 - hecho en Colombia"
+
+
+def limpiar_caches() -> None:
+    """Cada repetición arranca en frío para medir el costo real de renderizar"""
+    app.cache_barcodes.limpiar()
+    simbologias.codificar_codigo.cache_clear()
+    app.calcular_layout_etiqueta_personalizada.cache_clear()
+    app._tablas_anchos.clear()
+
+
+def productos_personalizados(num_productos: int, total_etiquetas: int, largo: bool) -> List[Dict]:
+    base, resto = divmod(total_etiquetas, num_productos)
+    productos = []
+    for i in range(num_productos):
+        productos.append({
+            'nombre_producto': f"{NOMBRE_LARGO if largo else NOMBRE_CORTO} {i}",
+            'sku': f"SKU{i:05d}",
+            'valor': "125.000",
+            'otro': OTRO_LARGO if largo else "",
+            'cantidad': base + (1 if i < resto else 0),
+            'tipo': 'personalizado',
+        })
+    return [p for p in productos if p['cantidad'] > 0]
+
+
+def construir_casos(directorio: str, rapido: bool) -> List[Dict]:
+    """Grilla de casos: (nombre, preparación opcional, función a medir)"""
+    casos = []
+    
+    def caso(nombre: str, funcion: Callable, preparar: Optional[Callable] = None) -> None:
+        casos.append({'nombre': nombre, 'funcion': funcion, 'preparar': preparar})
+    
+    for simbologia, contenido in CONTENIDOS.items():
+        def codificar(simbologia=simbologia, contenido=contenido):
+            for i in range(1000):
+                simbologias.codificar_codigo(contenido(i), simbologia)
+            return None
+        caso(f"codificar[{simbologia},x1000]", codificar)
+    
+    if importlib.util.find_spec('barcode') is not None:
+        def codificar_python_barcode():
+            import barcode
+            clase = barcode.get_barcode_class('code128')
+            for i in range(1000):
+                clase(CONTENIDOS['code128'](i)).build()
+            return None
+        caso("codificar[code128-python-barcode,x1000]", codificar_python_barcode)
+    
+    for modo in ('raster', 'vector'):
+        def render(modo=modo):
+            app.LabelConfig.MODO_RENDER_BARCODE = modo
+            if modo == 'vector':
+                app.generar_barcode_vectorial("SILK-0001234567")
+                return None
+            return app.generar_barcode("SILK-0001234567").getvalue()
+        caso(f"generar_barcode[{modo}]", render)
+    
+    for simbologia, contenido in CONTENIDOS.items():
+        def render_simbologia(simbologia=simbologia, contenido=contenido):
+            app.generar_barcode_vectorial(contenido(0), simbologia)
+            return None
+        caso(f"generar_barcode[vector,{simbologia}]", render_simbologia)
+    
+    etiquetas_barcode = (1, 66, 1000) if rapido else (1, 66, 1000, 10000)
+    for modo in ('raster', 'vector'):
+        for cantidad in etiquetas_barcode:
+            ruta = os.path.join(directorio, f"barcode_{modo}_{cantidad}.pdf")
+            
+            def pdf_barcode(modo=modo, cantidad=cantidad, ruta=ruta):
+                app.LabelConfig.MODO_RENDER_BARCODE = modo
+                app.generar_pdf_codigo_barras("SILK-0001234567", cantidad, ruta)
+                return ruta
+            caso(f"generar_pdf_codigo_barras[{modo},etiquetas={cantidad}]", pdf_barcode)
+    
+    grilla = [(1, 1), (1, 66), (10, 1000), (50, 1000)]
+    if not rapido:
+        grilla += [(1, 10000), (50, 10000)]
+    for num_productos, total in grilla:
+        for largo in (False, True):
+            productos = productos_personalizados(num_productos, total, largo)
+            ruta = os.path.join(directorio, f"personalizado_{num_productos}_{total}_{largo}.pdf")
+            
+            def pdf_personalizado(productos=productos, ruta=ruta):
+                app.generar_pdf_personalizado_masivo(productos, ruta)
+                return ruta
+            nombre = "largo" if largo else "corto"
+            caso(f"generar_pdf_personalizado_masivo[productos={num_productos},etiquetas={total},{nombre}]",
+                 pdf_personalizado)
+    
+    for nombre, texto in (("corto", NOMBRE_CORTO), ("largo", NOMBRE_LARGO), ("muy_largo", NOMBRE_LARGO * 10)):
+        def dividir(texto=texto):
+            for _ in range(100):
+                app.dividir_texto_por_ancho(texto.upper(), 'Helvetica-Bold', 7, 80)
+            return None
+        caso(f"dividir_texto_por_ancho[{nombre},x100]", dividir)
+    
+    for num_pdfs in ((1, 10) if rapido else (1, 10, 50)):
+        ruta_zip = os.path.join(directorio, f"zip_{num_pdfs}.zip")
+        
+        def preparar_zip(num_pdfs=num_pdfs):
+            # Los PDFs de entrada se generan una vez, fuera de la medición
+            pdfs = []
+            for i in range(num_pdfs):
+                nombre_archivo = f"zip_entrada_{num_pdfs}_{i}.pdf"
+                ruta_pdf = os.path.join(directorio, nombre_archivo)
+                if not os.path.exists(ruta_pdf):
+                    app.generar_pdf_codigo_barras(f"SILK-{i:06d}", 66, ruta_pdf)
+                pdfs.append({'generado': True, 'nombre_archivo': nombre_archivo, 'archivo': ruta_pdf})
+            return pdfs
+        
+        def crear_zip(pdfs, ruta_zip=ruta_zip):
+            app.crear_zip_pdfs(pdfs, ruta_zip)
+            return ruta_zip
+        caso(f"crear_zip_pdfs[pdfs={num_pdfs}]", crear_zip, preparar_zip)
+    
+    return casos
+
+
+def tamaño_salida(resultado) -> Optional[int]:
+    if isinstance(resultado, bytes):
+        return len(resultado)
+    if isinstance(resultado, str) and os.path.exists(resultado):
+        return os.path.getsize(resultado)
+    return None
+
+
+def medir(caso: Dict, repeticiones: int) -> Dict:
+    argumentos = ()
+    if caso['preparar']:
+        with contextlib.redirect_stdout(io.StringIO()):
+            argumentos = (caso['preparar'](),)
+    
+    tiempos = []
+    resultado = None
+    for _ in range(repeticiones):
+        limpiar_caches()
+        with contextlib.redirect_stdout(io.StringIO()):
+            inicio = time.perf_counter()
+            resultado = caso['funcion'](*argumentos)
+            tiempos.append(time.perf_counter() - inicio)
+    
+    # La memoria pico se mide aparte: tracemalloc distorsiona los tiempos
+    limpiar_caches()
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        caso['funcion'](*argumentos)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    return {
+        'tiempo_mediana_s': statistics.median(tiempos),
+        'tiempo_min_s': min(tiempos),
+        'memoria_pico_bytes': pico,
+        'tamaño_salida_bytes': tamaño_salida(resultado),
+        'repeticiones': repeticiones,
+    }
+
+
+def comparar(actual: Dict, base: Dict, umbral: float, minimo_s: float) -> List[str]:
+    """
+    Lista de regresiones de tiempo o memoria por encima del umbral (%).
+    Los tiempos por debajo de `minimo_s` en ambas mediciones se ignoran (ruido).
+    """
+    regresiones = []
+    for nombre, medicion in actual.items():
+        anterior = base.get(nombre)
+        if anterior is None:
+            continue
+        for metrica in ('tiempo_mediana_s', 'memoria_pico_bytes'):
+            valor_base = anterior.get(metrica)
+            if not valor_base:
+                continue
+            if metrica == 'tiempo_mediana_s' and max(valor_base, medicion[metrica]) < minimo_s:
+                continue
+            cambio = (medicion[metrica] - valor_base) / valor_base * 100
+            if cambio > umbral:
+                regresiones.append(f"{nombre} {metrica}: {valor_base:.6g} -> {medicion[metrica]:.6g} (+{cambio:.1f}%)")
+    return regresiones
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--guardar', metavar='JSON', help="Guardar los resultados como línea base")
+    parser.add_argument('--comparar', metavar='JSON', help="Comparar contra una línea base guardada")
+    parser.add_argument('--umbral', type=float, default=10.0, help="Regresión tolerada en %% (por defecto 10)")
+    parser.add_argument('--minimo-ms', type=float, default=1.0,
+                        help="Ignorar diferencias de tiempo en casos más rápidos que esto")
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--filtro', default='', help="Solo casos cuyo nombre contenga este texto")
+    parser.add_argument('--rapido', action='store_true', help="Omitir los casos de 10.000 etiquetas")
+    args = parser.parse_args()
+    
+    configuracion_original = (app.LabelConfig.MODO_RENDER_BARCODE,)
+    resultados = {}
+    with tempfile.TemporaryDirectory(prefix='benchmark_etiquetas_') as directorio:
+        for caso in construir_casos(directorio, args.rapido):
+            if args.filtro not in caso['nombre']:
+                continue
+            resultados[caso['nombre']] = medicion = medir(caso, args.repeticiones)
+            tamaño = medicion['tamaño_salida_bytes']
+            print(f"{caso['nombre']:<80} {medicion['tiempo_mediana_s'] * 1000:>10.2f} ms "
+                  f"{medicion['memoria_pico_bytes'] / 1024:>10.1f} KiB "
+                  f"{'' if tamaño is None else f'{tamaño / 1024:.1f} KiB salida'}")
+    app.LabelConfig.MODO_RENDER_BARCODE, = configuracion_original
+    
+    if args.guardar:
+        with open(args.guardar, 'w', encoding='utf-8') as f:
+            json.dump({
+                'entorno': {'python': platform.python_version(), 'plataforma': platform.platform()},
+                'resultados': resultados,
+            }, f, indent=2, ensure_ascii=False)
+        print(f"\nLínea base guardada en {args.guardar}")
+    
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            base = json.load(f)['resultados']
+        regresiones = comparar(resultados, base, args.umbral, args.minimo_ms / 1000)
+        if regresiones:
+            print(f"\n{len(regresiones)} regresiones por encima del {args.umbral}%:")
+            for regresion in regresiones:
+                print(f"  ✗ {regresion}")
+            return 1
+        print(f"\nSin regresiones por encima del {args.umbral}%.")
+    
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,418 @@
+"""
+Prueba de carga del asistente completo, sin conexión.
+
+Cada operador simulado recorre el flujo real con su propia cookie de sesión:
+    /  ->  /elegir-tipo  ->  /ingresar-productos  ->  /generar-etiquetas
+    -> sondeo de /estado-trabajo/<id> (como el panel, cada --sondeo s)
+    -> panel con miniaturas (/vista-previa/<archivo>)  ->  /descargar/<archivo>
+    -> /descargar-todos cuando hay más de un archivo
+
+Los operadores corren en paralelo (un hilo cada uno). El tipo de etiqueta,
+la cantidad de productos y la cantidad de etiquetas de cada lote se sortean
+según la mezcla pedida. Al final se reporta por ruta: peticiones, errores,
+p50/p95/p99 de latencia, más los flujos completos y el throughput total.
+
+Destinos:
+    (por defecto)   cliente de pruebas de Flask en este mismo proceso
+    --gunicorn N    gunicorn local con N workers (usa gunicorn.conf.py)
+    --url URL       una instancia ya levantada
+
+Uso (desde la raíz del proyecto):
+    python benchmarks/carga_asistente.py --operadores 8 --iteraciones 5
+    python benchmarks/carga_asistente.py --gunicorn 4 --operadores 16 --duracion 60 \\
+        --mezcla codigo_barras=3,personalizado=1 --productos 1,5,20 --cantidades 1,66,500
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from medir_arranque import RAIZ, puerto_libre
+
+RE_DESCARGA = re.compile(r'href="/descargar/([^"?]+)"')
+RE_VISTA_PREVIA = re.compile(r'src="/vista-previa/([^"?]+)\?ancho=(\d+)"')
+RE_TRABAJO = re.compile(r'data-url="/estado-trabajo/([0-9a-f]+)"')
+RE_ALERTA = re.compile(r'class="alert alert-danger".*?<p class="mb-0">(.*?)</p>', re.S)
+
+
+class ErrorFlujo(Exception):
+    """Respuesta inesperada: el operador abandona la iteración"""
+
+
+class ClienteFlask:
+    """Operador contra la aplicación en este proceso, con el cliente de pruebas de Flask"""
+
+    def __init__(self, aplicacion):
+        self.cliente = aplicacion.test_client()
+
+    def peticion(self, metodo: str, ruta: str, datos: Optional[Dict] = None) -> Tuple[int, Dict, bytes]:
+        respuesta = self.cliente.open(ruta, method=metodo, data=datos)
+        # get_data consume también las respuestas en streaming (ZIP)
+        cuerpo = respuesta.get_data()
+        return respuesta.status_code, dict(respuesta.headers), cuerpo
+
+    def cerrar(self) -> None:
+        pass
+
+
+class ClienteHTTP:
+    """Operador contra un servidor HTTP, con conexión persistente y su propia cookie"""
+
+    def __init__(self, url: str):
+        partes = urllib.parse.urlsplit(url)
+        self.conexion = http.client.HTTPConnection(partes.hostname, partes.port or 80, timeout=300)
+        self.cookies = {}
+
+    def peticion(self, metodo: str, ruta: str, datos: Optional[Dict] = None) -> Tuple[int, Dict, bytes]:
+        encabezados = {}
+        if self.cookies:
+            encabezados['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+        cuerpo = None
+        if datos is not None:
+            cuerpo = urllib.parse.urlencode(datos)
+            encabezados['Content-Type'] = 'application/x-www-form-urlencoded'
+        try:
+            self.conexion.request(metodo, ruta, body=cuerpo, headers=encabezados)
+            respuesta = self.conexion.getresponse()
+            contenido = respuesta.read()
+        except (http.client.HTTPException, OSError):
+            self.conexion.close()
+            raise
+        for encabezado, valor in respuesta.getheaders():
+            if encabezado.lower() == 'set-cookie':
+                nombre, _, resto = valor.partition('=')
+                self.cookies[nombre] = resto.split(';', 1)[0]
+        return respuesta.status, dict(respuesta.getheaders()), contenido
+
+    def cerrar(self) -> None:
+        self.conexion.close()
+
+
+class Registro:
+    """Latencias y errores por ruta, compartidos entre los hilos de los operadores"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencias = defaultdict(list)
+        self.errores = defaultdict(int)
+        self.flujos_completos = 0
+        self.flujos_fallidos = 0
+        self.fallas = defaultdict(int)
+
+    def anotar(self, ruta: str, segundos: float, error: bool) -> None:
+        with self._lock:
+            self.latencias[ruta].append(segundos)
+            if error:
+                self.errores[ruta] += 1
+
+    def terminar_flujo(self, falla: Optional[str]) -> None:
+        with self._lock:
+            if falla is None:
+                self.flujos_completos += 1
+            else:
+                self.flujos_fallidos += 1
+                self.fallas[falla] += 1
+
+
+def percentil(valores: List[float], p: float) -> float:
+    """Percentil por rango más cercano sobre una lista ordenada"""
+    indice = max(0, min(len(valores) - 1, round(p / 100 * len(valores) + 0.5) - 1))
+    return valores[indice]
+
+
+def parsear_mezcla(texto: str) -> Dict[str, float]:
+    mezcla = {}
+    for parte in texto.split(','):
+        tipo, _, peso = parte.partition('=')
+        mezcla[tipo.strip()] = float(peso or 1)
+    return mezcla
+
+
+def datos_productos(tipo: str, num_productos: int, cantidades: List[int], azar: random.Random) -> Dict:
+    """Campos del formulario de /ingresar-productos; SKUs y códigos únicos para no acertar en caché"""
+    datos = {}
+    for i in range(num_productos):
+        unico = f"{azar.getrandbits(40):010x}"
+        datos[f'cantidad_{i}'] = str(azar.choice(cantidades))
+        if tipo == 'codigo_barras':
+            datos[f'sku_{i}'] = f"C{unico}"
+            datos[f'codigo_{i}'] = f"SILK-{unico}"
+        else:
+            datos[f'nombre_producto_{i}'] = f"Perfume Silk {unico} edición {i}"
+            datos[f'valor_{i}'] = str(azar.randint(10, 999))
+            datos[f'sku_{i}'] = f"P{unico}"
+            datos[f'otro_{i}'] = "Eau de parfum 100ml" if azar.random() < 0.5 else ""
+    return datos
+
+
+class Operador:
+    """Un operador que recorre el asistente de punta a punta una y otra vez"""
+
+    def __init__(self, cliente, registro: Registro, args, azar: random.Random):
+        self.cliente = cliente
+        self.registro = registro
+        self.args = args
+        self.azar = azar
+
+    def pedir(self, metodo: str, ruta: str, nombre: str, esperados: Tuple[int, ...],
+              datos: Optional[Dict] = None) -> Tuple[int, Dict, bytes]:
+        inicio = time.perf_counter()
+        try:
+            estado, encabezados, cuerpo = self.cliente.peticion(metodo, ruta, datos)
+        except Exception as e:
+            self.registro.anotar(f"{metodo} {nombre}", time.perf_counter() - inicio, True)
+            raise ErrorFlujo(f"{metodo} {nombre}: {type(e).__name__}")
+        error = estado not in esperados
+        self.registro.anotar(f"{metodo} {nombre}", time.perf_counter() - inicio, error)
+        if error:
+            # Un formulario rechazado vuelve con 200 y el motivo en la alerta
+            alerta = RE_ALERTA.search(cuerpo.decode('utf-8', 'replace'))
+            detalle = f" ({alerta.group(1).strip()})" if alerta else ""
+            raise ErrorFlujo(f"{metodo} {nombre}: HTTP {estado}{detalle}")
+        return estado, encabezados, cuerpo
+
+    def redirige_a(self, encabezados: Dict, ruta: str, paso: str) -> None:
+        destino = urllib.parse.urlsplit(encabezados.get('Location', '')).path
+        if destino != ruta:
+            # El asistente vuelve al mismo paso (o al inicio) cuando rechaza el formulario
+            raise ErrorFlujo(f"{paso}: redirigió a {destino or '(nada)'}")
+
+    def flujo(self) -> None:
+        args = self.args
+        tipo = self.azar.choices(list(args.mezcla), weights=list(args.mezcla.values()))[0]
+        num_productos = self.azar.choice(args.productos)
+
+        self.pedir('GET', '/', '/', (200,))
+        _, encabezados, _ = self.pedir('POST', '/', '/', (302,), {'num_productos': str(num_productos)})
+        self.redirige_a(encabezados, '/elegir-tipo', 'POST /')
+
+        self.pedir('GET', '/elegir-tipo', '/elegir-tipo', (200,))
+        formulario = {'tipo_etiqueta': tipo, 'formato': 'pdf'}
+        if args.perfil:
+            formulario['perfil_hoja'] = args.perfil
+        if tipo == 'codigo_barras' and self.azar.random() < args.empaquetado:
+            formulario['empaquetado'] = '1'
+        _, encabezados, _ = self.pedir('POST', '/elegir-tipo', '/elegir-tipo', (302,), formulario)
+        self.redirige_a(encabezados, '/ingresar-productos', 'POST /elegir-tipo')
+
+        self.pedir('GET', '/ingresar-productos', '/ingresar-productos', (200,))
+        _, encabezados, _ = self.pedir('POST', '/ingresar-productos', '/ingresar-productos', (302,),
+                                       datos_productos(tipo, num_productos, args.cantidades, self.azar))
+        self.redirige_a(encabezados, '/generar-etiquetas', 'POST /ingresar-productos')
+
+        _, _, cuerpo = self.pedir('GET', '/generar-etiquetas', '/generar-etiquetas', (200,))
+        coincidencia = RE_TRABAJO.search(cuerpo.decode('utf-8', 'replace'))
+        if coincidencia:
+            limite = time.monotonic() + args.espera_trabajo
+            while True:
+                time.sleep(args.sondeo)
+                _, _, cuerpo = self.pedir('GET', f'/estado-trabajo/{coincidencia.group(1)}',
+                                          '/estado-trabajo/<id>', (200,))
+                resumen = json.loads(cuerpo)
+                if resumen['estado'] == 'error' or resumen['error']:
+                    raise ErrorFlujo(f"trabajo con error: {resumen['error']}")
+                if resumen['estado'] == 'completado':
+                    break
+                if time.monotonic() > limite:
+                    raise ErrorFlujo("trabajo sin terminar a tiempo")
+            _, _, cuerpo = self.pedir('GET', '/generar-etiquetas', '/generar-etiquetas', (200,))
+
+        html = cuerpo.decode('utf-8', 'replace')
+        for archivo, ancho in RE_VISTA_PREVIA.findall(html):
+            self.pedir('GET', f'/vista-previa/{archivo}?ancho={ancho}', '/vista-previa/<archivo>', (200,))
+
+        archivos = list(dict.fromkeys(urllib.parse.unquote(a) for a in RE_DESCARGA.findall(html)))
+        if not archivos:
+            raise ErrorFlujo("panel sin archivos para descargar")
+        for archivo in archivos:
+            _, _, contenido = self.pedir('GET', f'/descargar/{urllib.parse.quote(archivo)}',
+                                         '/descargar/<archivo>', (200,))
+            if not contenido:
+                raise ErrorFlujo("descarga vacía")
+        if len(archivos) > 1:
+            _, _, contenido = self.pedir('GET', '/descargar-todos', '/descargar-todos', (200,))
+            if not contenido.startswith(b'PK'):
+                raise ErrorFlujo("/descargar-todos no entregó un ZIP")
+
+    def correr(self, fin: float, iteraciones: int) -> None:
+        hechas = 0
+        while (iteraciones and hechas < iteraciones) or (not iteraciones and time.monotonic() < fin):
+            try:
+                self.flujo()
+                self.registro.terminar_flujo(None)
+            except ErrorFlujo as e:
+                self.registro.terminar_flujo(str(e))
+            hechas += 1
+        self.cliente.cerrar()
+
+
+def esperar_servidor(url: str, proceso: subprocess.Popen, espera_max: float) -> None:
+    partes = urllib.parse.urlsplit(url)
+    limite = time.monotonic() + espera_max
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError(f"gunicorn terminó con código {proceso.returncode}")
+        try:
+            conexion = http.client.HTTPConnection(partes.hostname, partes.port, timeout=1)
+            conexion.request('GET', '/metrics')
+            conexion.getresponse().read()
+            conexion.close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"gunicorn no respondió en {espera_max:.0f} s")
+
+
+def reporte(registro: Registro, duracion: float) -> Dict:
+    rutas = {}
+    for ruta in sorted(registro.latencias):
+        latencias = sorted(registro.latencias[ruta])
+        rutas[ruta] = {
+            'peticiones': len(latencias),
+            'errores': registro.errores[ruta],
+            'tasa_error': registro.errores[ruta] / len(latencias),
+            'p50_ms': percentil(latencias, 50) * 1000,
+            'p95_ms': percentil(latencias, 95) * 1000,
+            'p99_ms': percentil(latencias, 99) * 1000,
+            'media_ms': statistics.fmean(latencias) * 1000,
+            'por_segundo': len(latencias) / duracion,
+        }
+    total = sum(r['peticiones'] for r in rutas.values())
+    flujos = registro.flujos_completos + registro.flujos_fallidos
+    return {
+        'duracion_s': duracion,
+        'peticiones': total,
+        'peticiones_por_segundo': total / duracion,
+        'errores': sum(r['errores'] for r in rutas.values()),
+        'flujos_completos': registro.flujos_completos,
+        'flujos_fallidos': registro.flujos_fallidos,
+        'flujos_por_minuto': registro.flujos_completos / duracion * 60,
+        'tasa_error_flujos': registro.flujos_fallidos / flujos if flujos else 0.0,
+        'fallas': dict(registro.fallas),
+        'rutas': rutas,
+    }
+
+
+def imprimir(resultado: Dict) -> None:
+    print(f"{'ruta':<32} {'pet.':>7} {'err.':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'pet./s':>8}")
+    for ruta, r in resultado['rutas'].items():
+        print(f"{ruta:<32} {r['peticiones']:>7} {r['tasa_error']:>6.1%} {r['p50_ms']:>9.1f} "
+              f"{r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f} {r['por_segundo']:>8.2f}")
+    print(f"\n{resultado['peticiones']} peticiones en {resultado['duracion_s']:.1f} s "
+          f"({resultado['peticiones_por_segundo']:.1f}/s); "
+          f"{resultado['flujos_completos']} flujos completos ({resultado['flujos_por_minuto']:.1f}/min), "
+          f"{resultado['flujos_fallidos']} fallidos ({resultado['tasa_error_flujos']:.1%})")
+    for falla, veces in sorted(resultado['fallas'].items(), key=lambda f: -f[1]):
+        print(f"  ✗ {veces} × {falla}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    destino = parser.add_mutually_exclusive_group()
+    destino.add_argument('--gunicorn', type=int, metavar='WORKERS', help="Levantar gunicorn local con N workers")
+    destino.add_argument('--url', help="Instancia ya levantada, p. ej. http://127.0.0.1:8000")
+    parser.add_argument('--operadores', type=int, default=4, help="Operadores simultáneos")
+    parser.add_argument('--iteraciones', type=int, default=3, help="Flujos por operador (0 = usar --duracion)")
+    parser.add_argument('--duracion', type=float, default=30.0, help="Segundos de carga si --iteraciones es 0")
+    parser.add_argument('--mezcla', type=parsear_mezcla, default=parsear_mezcla('codigo_barras=1,personalizado=1'),
+                        help="Pesos por tipo de etiqueta, p. ej. codigo_barras=3,personalizado=1")
+    parser.add_argument('--productos', type=lambda t: [int(x) for x in t.split(',')], default=[1, 3, 10],
+                        help="Cantidades de productos por lote a sortear (1 a 50)")
+    parser.add_argument('--cantidades', type=lambda t: [int(x) for x in t.split(',')], default=[1, 66, 200],
+                        help="Etiquetas por producto a sortear")
+    parser.add_argument('--empaquetado', type=float, default=0.0,
+                        help="Probabilidad de pedir un solo PDF empaquetado en lotes de código de barras")
+    parser.add_argument('--perfil', default='', help="Perfil de hoja (por defecto el de la aplicación)")
+    parser.add_argument('--sondeo', type=float, default=1.0, help="Segundos entre consultas de progreso")
+    parser.add_argument('--espera-trabajo', type=float, default=300.0, help="Segundos máximos por trabajo")
+    parser.add_argument('--semilla', type=int, default=1)
+    parser.add_argument('--conservar', action='store_true', help="No borrar los archivos generados")
+    parser.add_argument('--guardar', metavar='JSON', help="Guardar los resultados en un archivo")
+    args = parser.parse_args()
+
+    desconocidos = set(args.mezcla) - {'codigo_barras', 'personalizado'}
+    if desconocidos:
+        parser.error(f"tipos de etiqueta desconocidos en --mezcla: {', '.join(sorted(desconocidos))}")
+
+    # Sesiones, trabajos, catálogo y cachés en un directorio temporal; los PDFs van a pdfs_generados/
+    temporal = tempfile.mkdtemp(prefix='carga_asistente_')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ.setdefault('SESIONES_DB', os.path.join(temporal, 'sesiones.sqlite3'))
+    os.environ.setdefault('TRABAJOS_DB', os.path.join(temporal, 'trabajos.sqlite3'))
+    os.environ.setdefault('CATALOGO_DB', os.path.join(temporal, 'catalogo.sqlite3'))
+    os.environ.setdefault('CACHE_ARTEFACTOS_DIR', os.path.join(temporal, 'cache'))
+    os.environ.setdefault('CACHE_ZIPS_DIR', os.path.join(temporal, 'zips'))
+    salida = os.path.join(RAIZ, 'pdfs_generados')
+    previos = set(os.listdir(salida)) if os.path.isdir(salida) else set()
+
+    proceso = None
+    if args.gunicorn:
+        url = f'http://127.0.0.1:{puerto_libre()}'
+        proceso = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+                                    '--workers', str(args.gunicorn), '--threads', '4',
+                                    '--bind', url.split('//')[1], 'app:app'],
+                                   cwd=RAIZ, env=dict(os.environ),
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        esperar_servidor(url, proceso, 30.0)
+        nuevo_cliente = lambda: ClienteHTTP(url)
+    elif args.url:
+        nuevo_cliente = lambda: ClienteHTTP(args.url)
+    else:
+        os.chdir(RAIZ)
+        sys.path.insert(0, RAIZ)
+        import app
+        nuevo_cliente = lambda: ClienteFlask(app.app)
+
+    registro = Registro()
+    try:
+        operadores = [Operador(nuevo_cliente(), registro, args, random.Random(args.semilla * 1000 + i))
+                      for i in range(args.operadores)]
+        inicio = time.perf_counter()
+        fin = time.monotonic() + args.duracion
+        hilos = [threading.Thread(target=o.correr, args=(fin, args.iteraciones), daemon=True) for o in operadores]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        resultado = reporte(registro, time.perf_counter() - inicio)
+    finally:
+        if proceso is not None:
+            proceso.terminate()
+            try:
+                proceso.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proceso.kill()
+        if not args.conservar and not args.url and os.path.isdir(salida):
+            for nombre in set(os.listdir(salida)) - previos:
+                ruta = os.path.join(salida, nombre)
+                if os.path.isfile(ruta):
+                    os.remove(ruta)
+        shutil.rmtree(temporal, ignore_errors=True)
+
+    imprimir(resultado)
+    if args.guardar:
+        with open(args.guardar, 'w', encoding='utf-8') as f:
+            json.dump({
+                'entorno': {'python': platform.python_version(), 'plataforma': platform.platform()},
+                'parametros': {k: v for k, v in vars(args).items() if k != 'guardar'},
+                'resultados': resultado,
+            }, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados guardados en {args.guardar}")
+    return 1 if resultado['errores'] or resultado['flujos_fallidos'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,205 @@
+"""
+Tiempo de arranque y memoria de los workers.
+
+Mide dos cosas:
+  1. Importación en frío de app.py, en un proceso nuevo por repetición: tiempo de
+     import, tiempo de precalentar() y RSS del proceso después de cada paso.
+  2. Con --gunicorn: levanta gunicorn con gunicorn.conf.py, con y sin precarga
+     (GUNICORN_PRECARGA), mide el tiempo hasta que responde con todos sus workers
+     y la memoria de cada worker: RSS, PSS (lo compartido repartido entre procesos)
+     y USS (lo exclusivo del worker). Necesita Linux (/proc/<pid>/smaps_rollup).
+
+Uso (desde la raíz del proyecto):
+    python benchmarks/medir_arranque.py
+    python benchmarks/medir_arranque.py --gunicorn --workers 4 --guardar benchmarks/arranque.json
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, List, Optional
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Sin sesiones en SQLite ni caché de artefactos: solo se mide el arranque
+ENTORNO = dict(os.environ)
+ENTORNO.setdefault('SESIONES_DB', '')
+ENTORNO.setdefault('CACHE_ARTEFACTOS_DIR', '')
+ENTORNO.setdefault('LOG_LEVEL', 'WARNING')
+
+MODULOS_PESADOS = ('reportlab.pdfgen.canvas', 'reportlab.pdfbase.pdfmetrics', 'PIL.Image')
+
+CODIGO_IMPORTACION = f"""
+import json, resource, sys, time
+
+def rss_kib():
+    try:
+        with open('/proc/self/status') as f:
+            for linea in f:
+                if linea.startswith('VmRSS:'):
+                    return int(linea.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+inicio = time.perf_counter()
+import app
+importado = time.perf_counter()
+rss_importado = rss_kib()
+pesados = [m for m in {MODULOS_PESADOS!r} if m in sys.modules]
+app.precalentar()
+precalentado = time.perf_counter()
+print(json.dumps({{
+    'importacion_s': importado - inicio,
+    'precalentar_s': precalentado - importado,
+    'rss_importado_kib': rss_importado,
+    'rss_precalentado_kib': rss_kib(),
+    'modulos_pesados_al_importar': pesados,
+}}))
+"""
+
+
+def medir_importacion(repeticiones: int) -> Dict:
+    """Importa app.py en procesos nuevos; cada repetición arranca en frío"""
+    muestras = []
+    for _ in range(repeticiones):
+        salida = subprocess.run([sys.executable, '-c', CODIGO_IMPORTACION], cwd=RAIZ, env=ENTORNO,
+                                capture_output=True, text=True, check=True).stdout
+        muestras.append(json.loads(salida.strip().splitlines()[-1]))
+    return {
+        'importacion_mediana_s': statistics.median(m['importacion_s'] for m in muestras),
+        'precalentar_mediana_s': statistics.median(m['precalentar_s'] for m in muestras),
+        'rss_importado_kib': statistics.median(m['rss_importado_kib'] for m in muestras),
+        'rss_precalentado_kib': statistics.median(m['rss_precalentado_kib'] for m in muestras),
+        'modulos_pesados_al_importar': muestras[-1]['modulos_pesados_al_importar'],
+        'repeticiones': repeticiones,
+    }
+
+
+def puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def hijos(pid: int) -> List[int]:
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+def memoria_proceso(pid: int) -> Dict[str, int]:
+    """RSS, PSS y USS en KiB según /proc/<pid>/smaps_rollup"""
+    campos = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for linea in f:
+            partes = linea.split()
+            if len(partes) == 3 and partes[2] == 'kB':
+                campos[partes[0].rstrip(':')] = int(partes[1])
+    return {
+        'rss_kib': campos.get('Rss', 0),
+        'pss_kib': campos.get('Pss', 0),
+        'uss_kib': campos.get('Private_Clean', 0) + campos.get('Private_Dirty', 0),
+    }
+
+
+def medir_gunicorn(workers: int, precarga: bool, espera_max: float) -> Optional[Dict]:
+    """Tiempo hasta tener todos los workers respondiendo y memoria de cada uno"""
+    puerto = puerto_libre()
+    entorno = dict(ENTORNO, GUNICORN_PRECARGA='1' if precarga else '0')
+    comando = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--workers', str(workers),
+               '--bind', f'127.0.0.1:{puerto}', 'app:app']
+    inicio = time.perf_counter()
+    proceso = subprocess.Popen(comando, cwd=RAIZ, env=entorno,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        listo = None
+        while time.perf_counter() - inicio < espera_max:
+            if proceso.poll() is not None:
+                print(f"  gunicorn terminó con código {proceso.returncode}")
+                return None
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{puerto}/metrics', timeout=1):
+                    pass
+                if len(hijos(proceso.pid)) >= workers:
+                    listo = time.perf_counter() - inicio
+                    break
+            except (urllib.error.URLError, ConnectionError):
+                pass
+            time.sleep(0.02)
+        if listo is None:
+            print(f"  gunicorn no respondió en {espera_max:.0f} s")
+            return None
+        # Se deja terminar el arranque de los workers antes de medir su memoria
+        time.sleep(1.0)
+        memorias = [memoria_proceso(pid) for pid in hijos(proceso.pid)]
+        return {
+            'workers': workers,
+            'precarga': precarga,
+            'arranque_s': listo,
+            'maestro': memoria_proceso(proceso.pid),
+            'por_worker': memorias,
+            'pss_total_workers_kib': sum(m['pss_kib'] for m in memorias),
+            'uss_mediana_worker_kib': statistics.median(m['uss_kib'] for m in memorias),
+        }
+    finally:
+        proceso.terminate()
+        try:
+            proceso.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proceso.kill()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--gunicorn', action='store_true', help="Medir también gunicorn con y sin precarga")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--espera-max', type=float, default=30.0, help="Segundos máximos para que gunicorn responda")
+    parser.add_argument('--guardar', metavar='JSON', help="Guardar los resultados en un archivo")
+    args = parser.parse_args()
+
+    resultados = {'importacion': medir_importacion(args.repeticiones)}
+    importacion = resultados['importacion']
+    print(f"{'import app':<40} {importacion['importacion_mediana_s'] * 1000:>10.1f} ms "
+          f"{importacion['rss_importado_kib'] / 1024:>8.1f} MiB RSS")
+    print(f"{'precalentar()':<40} {importacion['precalentar_mediana_s'] * 1000:>10.1f} ms "
+          f"{importacion['rss_precalentado_kib'] / 1024:>8.1f} MiB RSS")
+    print(f"{'módulos pesados cargados al importar':<40} "
+          f"{', '.join(importacion['modulos_pesados_al_importar']) or 'ninguno'}")
+
+    if args.gunicorn:
+        if not os.path.exists('/proc/self/smaps_rollup'):
+            print("\nLa medición de workers necesita /proc/<pid>/smaps_rollup (Linux); se omite.")
+        else:
+            for precarga in (False, True):
+                nombre = f"gunicorn[workers={args.workers},precarga={'sí' if precarga else 'no'}]"
+                medicion = medir_gunicorn(args.workers, precarga, args.espera_max)
+                if medicion is None:
+                    continue
+                resultados[nombre] = medicion
+                print(f"{nombre:<40} {medicion['arranque_s'] * 1000:>10.1f} ms "
+                      f"PSS workers {medicion['pss_total_workers_kib'] / 1024:>7.1f} MiB "
+                      f"USS/worker {medicion['uss_mediana_worker_kib'] / 1024:>6.1f} MiB")
+
+    if args.guardar:
+        with open(args.guardar, 'w', encoding='utf-8') as f:
+            json.dump({
+                'entorno': {'python': platform.python_version(), 'plataforma': platform.platform()},
+                'resultados': resultados,
+            }, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados guardados en {args.guardar}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
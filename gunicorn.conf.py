@@ -0,0 +1,32 @@
+"""
+Configuración de gunicorn. Se lee sola al ejecutar gunicorn desde la raíz del proyecto.
+
+Con GUNICORN_PRECARGA=1 (el valor por defecto), la aplicación se importa una sola vez en el
+proceso maestro. Allí se precalienta con app.precalentar(), que carga las fuentes, las simbologías
+y los módulos de dibujo. Los workers nacen por fork y comparten esa memoria copy-on-write.
+Con GUNICORN_PRECARGA=0, cada worker importa la aplicación por su cuenta. Los módulos de
+dibujo se cargan con el primer render.
+
+El puerto y la cantidad de workers siguen las variables estándar de gunicorn
+(PORT, WEB_CONCURRENCY o GUNICORN_CMD_ARGS). Con MODO_ENTREGA=memoria solo se admite un worker.
+"""
+import gc
+import os
+
+preload_app = os.environ.get('GUNICORN_PRECARGA', '1') != '0'
+
+
+def on_starting(server):
+    # En modo 'memoria' los PDFs quedan en el proceso que los generó: con varios workers la
+    # descarga llega a otro proceso, que no los tiene
+    if os.environ.get('MODO_ENTREGA', 'disco') == 'memoria' and server.cfg.workers > 1:
+        raise RuntimeError(f"MODO_ENTREGA=memoria requiere un solo worker (configurados: {server.cfg.workers}); "
+                           "usa MODO_ENTREGA=disco o --workers 1")
+    if not preload_app:
+        return
+    # Con preload_app la aplicación ya está importada: esto solo la toma de sys.modules
+    import app
+    app.precalentar()
+    # Mueve los objetos ya creados a la generación permanente. Si no, las pasadas del
+    # recolector en los workers escriben en esas páginas y rompen el copy-on-write
+    gc.freeze()
@@ -0,0 +1,599 @@
+"""
+Simbologías de códigos de barras: Code128, EAN-13, UPC-A y QR.
+
+Cada una normaliza y codifica un valor en módulos oscuros (corridas por
+fila), con tablas de patrones calculadas una sola vez al importar. Todo lo
+que dibuja códigos en app.py (PDF vectorial, PNG, vistas previas, ZPL/EPL)
+trabaja con esas corridas, sin volver a resolver la simbología. El módulo
+no depende de Flask, ReportLab ni Pillow.
+"""
+from __future__ import annotations
+
+import re
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+class Modulos(NamedTuple):
+    """Símbolo codificado: ancho y filas en módulos, y las corridas oscuras (fila, inicio, largo)"""
+    ancho: int
+    filas: int
+    barras: Tuple[Tuple[int, int, int], ...]
+
+def corridas_patron(patron: str, fila: int = 0) -> Tuple[Tuple[int, int, int], ...]:
+    """Corridas oscuras de un patrón de módulos '1'/'0'"""
+    corridas = []
+    inicio = None
+    for i, modulo in enumerate(patron + '0'):
+        if modulo == '1' and inicio is None:
+            inicio = i
+        elif modulo != '1' and inicio is not None:
+            corridas.append((fila, inicio, i - inicio))
+            inicio = None
+    return tuple(corridas)
+
+class Simbologia(ABC):
+    """
+    Una simbología del registro SIMBOLOGIAS. Las subclases implementan
+    codificar() y, si el valor tiene reglas propias, normalizar() (valor
+    canónico o ValueError con el motivo).
+    zpl_comando / epl_comando: comando nativo de la impresora térmica, o None
+    si la impresora no la soporta y el símbolo se dibuja con cajas.
+    zona_silencio: margen claro mínimo, en módulos, que exige la norma de la
+    simbología (0: alcanza con el quiet_zone de BARCODE_CONFIG).
+    """
+    
+    nombre = ''
+    descripcion = ''
+    bidimensional = False
+    texto_legible = True
+    zpl_comando = None
+    epl_comando = None
+    zona_silencio = 0
+    ejemplo = '0'
+    
+    def normalizar(self, codigo: str) -> str:
+        return codigo
+    
+    @abstractmethod
+    def codificar(self, codigo: str) -> Modulos:
+        """Módulos oscuros del valor (ya normalizado)"""
+    
+    def texto(self, codigo: str) -> str:
+        """Texto legible bajo las barras"""
+        return codigo if self.texto_legible else ''
+    
+    def dato_termica(self, codigo: str) -> str:
+        """Valor que recibe el comando nativo de la impresora"""
+        return codigo
+    
+    def info(self) -> Dict:
+        return {'nombre': self.nombre, 'descripcion': self.descripcion, 'bidimensional': self.bidimensional}
+
+# Code128: anchos barra/espacio de los valores 0-105 y del stop (con su barra final)
+ANCHOS_CODE128 = (
+    '212222', '222122', '222221', '121223', '121322', '131222', '122213', '122312', '132212', '221213',
+    '221312', '231212', '112232', '122132', '122231', '113222', '123122', '123221', '223211', '221132',
+    '221231', '213212', '223112', '312131', '311222', '321122', '321221', '312212', '322112', '322211',
+    '212123', '212321', '232121', '111323', '131123', '131321', '112313', '132113', '132311', '211313',
+    '231113', '231311', '112133', '112331', '132131', '113123', '113321', '133121', '313121', '211331',
+    '231131', '213113', '213311', '213131', '311123', '311321', '331121', '312113', '312311', '332111',
+    '314111', '221411', '431111', '111224', '111422', '121124', '121421', '141122', '141221', '112214',
+    '112412', '122114', '122411', '142112', '142211', '241211', '221114', '413111', '241112', '134111',
+    '111242', '121142', '121241', '114212', '124112', '124211', '411212', '421112', '421211', '212141',
+    '214121', '412121', '111143', '111341', '131141', '114113', '114311', '411113', '411311', '113141',
+    '114131', '311141', '411131', '211412', '211214', '211232', '2331112',
+)
+
+def _barras_por_valor(anchos: Tuple[str, ...]) -> Tuple[Tuple[Tuple[int, int], ...], ...]:
+    """(desplazamiento, ancho) de cada barra de cada valor, a partir de su tabla de anchos"""
+    tabla = []
+    for patron in anchos:
+        barras = []
+        posicion = 0
+        for i, ancho in enumerate(map(int, patron)):
+            if i % 2 == 0:
+                barras.append((posicion, ancho))
+            posicion += ancho
+        tabla.append(tuple(barras))
+    return tuple(tabla)
+
+class Code128(Simbologia):
+    """
+    Code128 con los juegos A, B y C. El juego C (pares de dígitos) se usa
+    para tramos de 4 o más dígitos al inicio o al final y de 6 o más en el
+    medio; A solo cuando aparece un carácter de control antes que una
+    minúscula. Como python-barcode, ñ, ò, ó y ô son FNC1-FNC4.
+    """
+    
+    nombre = 'code128'
+    descripcion = 'Code128'
+    zpl_comando = 'BC'
+    epl_comando = '1'
+    
+    BARRAS = _barras_por_valor(ANCHOS_CODE128)
+    INICIO = {'A': 103, 'B': 104, 'C': 105}
+    CAMBIO = {'A': 101, 'B': 100, 'C': 99}
+    FNC = {'\xf1': (102, 102), '\xf2': (97, 97), '\xf3': (96, 96), '\xf4': (101, 100)}
+    
+    def normalizar(self, codigo: str) -> str:
+        invalidos = sorted({ch for ch in codigo if ord(ch) > 127 and ch not in self.FNC})
+        if invalidos:
+            raise ValueError(f"caracteres no admitidos: {' '.join(repr(ch) for ch in invalidos)}")
+        return codigo
+    
+    @staticmethod
+    def _juego_texto(codigo: str, i: int) -> str:
+        """A si un carácter de control aparece antes que una minúscula; si no, B"""
+        for caracter in codigo[i:]:
+            if caracter < ' ':
+                return 'A'
+            if '`' <= caracter <= '\x7f':
+                return 'B'
+        return 'B'
+    
+    def valores(self, codigo: str) -> List[int]:
+        """Valores de símbolo desde el inicio hasta el dígito de control, sin el stop"""
+        largo = len(codigo)
+        digitos = [0] * (largo + 1)
+        for i in range(largo - 1, -1, -1):
+            if '0' <= codigo[i] <= '9':
+                digitos[i] = digitos[i + 1] + 1
+        
+        juego = 'C' if digitos[0] >= 4 or digitos[0] == largo == 2 else self._juego_texto(codigo, 0)
+        valores = [self.INICIO[juego]]
+        i = 0
+        while i < largo:
+            caracter = codigo[i]
+            if juego == 'C':
+                if digitos[i] >= 2:
+                    valores.append((ord(caracter) - 48) * 10 + ord(codigo[i + 1]) - 48)
+                    i += 2
+                    continue
+                if caracter == '\xf1':
+                    valores.append(102)
+                    i += 1
+                    continue
+                juego = self._juego_texto(codigo, i)
+                valores.append(self.CAMBIO[juego])
+                continue
+            
+            tramo = digitos[i]
+            if tramo >= 6 or (tramo >= 4 and i + tramo == largo):
+                if tramo % 2:
+                    valores.append(ord(caracter) - 32)
+                    i += 1
+                valores.append(self.CAMBIO['C'])
+                juego = 'C'
+                continue
+            
+            fnc = self.FNC.get(caracter)
+            if fnc is not None:
+                valores.append(fnc[0] if juego == 'A' else fnc[1])
+            else:
+                n = ord(caracter)
+                if n > 127:
+                    raise ValueError(f"carácter no admitido en Code128: {caracter!r}")
+                if (n < 32 and juego == 'B') or (n >= 96 and juego == 'A'):
+                    juego = 'A' if n < 32 else 'B'
+                    valores.append(self.CAMBIO[juego])
+                valores.append(n + 64 if n < 32 else n - 32)
+            i += 1
+        
+        control = valores[0]
+        for peso, valor in enumerate(valores[1:], start=1):
+            control += peso * valor
+        valores.append(control % 103)
+        return valores
+    
+    def codificar(self, codigo: str) -> Modulos:
+        barras_valor = self.BARRAS
+        barras = []
+        posicion = 0
+        for valor in self.valores(codigo):
+            for desplazamiento, ancho in barras_valor[valor]:
+                barras.append((0, posicion + desplazamiento, ancho))
+            posicion += 11
+        for desplazamiento, ancho in barras_valor[106]:
+            barras.append((0, posicion + desplazamiento, ancho))
+        return Modulos(posicion + 13, 1, tuple(barras))
+
+# EAN-13: patrones L (impar), G (par) y R de cada dígito y paridad según el primero
+PATRONES_EAN_L = ('0001101', '0011001', '0010011', '0111101', '0100011',
+                  '0110001', '0101111', '0111011', '0110111', '0001011')
+PATRONES_EAN_R = tuple(''.join('1' if m == '0' else '0' for m in patron) for patron in PATRONES_EAN_L)
+PATRONES_EAN_G = tuple(patron[::-1] for patron in PATRONES_EAN_R)
+PARIDAD_EAN = ('LLLLLL', 'LLGLGG', 'LLGGLG', 'LLGGGL', 'LGLLGG', 'LGGLLG', 'LGGGLL', 'LGLGLG', 'LGLGGL', 'LGGLGL')
+
+def digito_control_ean(digitos: str) -> str:
+    """Dígito de control de un EAN-13 (o de un UPC-A con un 0 adelante) sobre sus 12 primeros dígitos"""
+    suma = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(digitos[:12]))
+    return str((10 - suma % 10) % 10)
+
+class EAN13(Simbologia):
+    """EAN-13: 12 dígitos más el de control (se calcula si no viene, se verifica si viene)"""
+    
+    nombre = 'ean13'
+    descripcion = 'EAN-13'
+    zpl_comando = 'BE'
+    epl_comando = 'E30'
+    digitos = 13
+    ejemplo = '000000000000'
+    
+    BARRAS = {juego: tuple(tuple((i, ancho) for _, i, ancho in corridas_patron(patron)) for patron in patrones)
+              for juego, patrones in (('L', PATRONES_EAN_L), ('G', PATRONES_EAN_G), ('R', PATRONES_EAN_R))}
+    
+    def normalizar(self, codigo: str) -> str:
+        if not codigo.isdigit() or not codigo.isascii() or len(codigo) not in (self.digitos - 1, self.digitos):
+            raise ValueError(f"debe tener {self.digitos - 1} o {self.digitos} dígitos")
+        control = digito_control_ean(self.a_ean13(codigo))
+        if len(codigo) == self.digitos and codigo[-1] != control:
+            raise ValueError(f"el dígito de control debería ser {control}")
+        return codigo[:self.digitos - 1] + control
+    
+    def a_ean13(self, codigo: str) -> str:
+        return codigo
+    
+    def codificar(self, codigo: str) -> Modulos:
+        ean = self.a_ean13(self.normalizar(codigo))
+        barras = [(0, 0, 1), (0, 2, 1)]
+        posicion = 3
+        for juego, digito in zip(PARIDAD_EAN[int(ean[0])], ean[1:7]):
+            barras.extend((0, posicion + i, ancho) for i, ancho in self.BARRAS[juego][int(digito)])
+            posicion += 7
+        barras += [(0, posicion + 1, 1), (0, posicion + 3, 1)]
+        posicion += 5
+        for digito in ean[7:]:
+            barras.extend((0, posicion + i, ancho) for i, ancho in self.BARRAS['R'][int(digito)])
+            posicion += 7
+        barras += [(0, posicion, 1), (0, posicion + 2, 1)]
+        return Modulos(posicion + 3, 1, tuple(barras))
+    
+    def dato_termica(self, codigo: str) -> str:
+        # Las impresoras calculan el dígito de control
+        return codigo[:self.digitos - 1]
+
+class UPCA(EAN13):
+    """UPC-A: 11 dígitos más el de control; se codifica como un EAN-13 que empieza con 0"""
+    
+    nombre = 'upca'
+    descripcion = 'UPC-A'
+    zpl_comando = 'BU'
+    epl_comando = 'UA0'
+    digitos = 12
+    ejemplo = '00000000000'
+    
+    def a_ean13(self, codigo: str) -> str:
+        return '0' + codigo
+
+# QR (modo byte, UTF-8, corrección de errores M): codewords de corrección por
+# bloque y cantidad de bloques de cada versión (índice 0 sin uso)
+QR_ECC_POR_BLOQUE = (
+    0, 10, 16, 26, 18, 24, 16, 18, 22, 22, 26, 30, 22, 22, 24, 24, 28, 28, 26, 26, 26,
+    26, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28,
+)
+QR_BLOQUES = (
+    0, 1, 1, 1, 2, 2, 4, 4, 4, 5, 5, 5, 8, 9, 9, 10, 10, 11, 13, 14, 16,
+    17, 17, 18, 20, 21, 23, 25, 26, 28, 29, 31, 33, 35, 37, 38, 40, 43, 45, 47, 49,
+)
+
+# Aritmética en GF(256) con el polinomio 0x11D, por tablas de logaritmos
+GF_EXP = [0] * 512
+GF_LOG = [0] * 256
+_x = 1
+for _i in range(255):
+    GF_EXP[_i] = _x
+    GF_LOG[_x] = _i
+    _x <<= 1
+    if _x & 0x100:
+        _x ^= 0x11D
+for _i in range(255, 512):
+    GF_EXP[_i] = GF_EXP[_i - 255]
+del _x, _i
+
+@lru_cache(maxsize=None)
+def divisor_reed_solomon(grado: int) -> Tuple[int, ...]:
+    """Coeficientes del polinomio generador de `grado` codewords de corrección"""
+    divisor = [0] * (grado - 1) + [1]
+    raiz = 1
+    for _ in range(grado):
+        for j in range(grado):
+            divisor[j] = GF_EXP[GF_LOG[divisor[j]] + GF_LOG[raiz]] if divisor[j] and raiz else 0
+            if j + 1 < grado:
+                divisor[j] ^= divisor[j + 1]
+        raiz = GF_EXP[GF_LOG[raiz] + 1]
+    return tuple(divisor)
+
+def resto_reed_solomon(datos: List[int], grado: int) -> List[int]:
+    divisor = divisor_reed_solomon(grado)
+    log_divisor = [GF_LOG[c] if c else None for c in divisor]
+    resto = [0] * grado
+    for byte in datos:
+        factor = byte ^ resto.pop(0)
+        resto.append(0)
+        if factor:
+            log_factor = GF_LOG[factor]
+            for i, log_c in enumerate(log_divisor):
+                if log_c is not None:
+                    resto[i] ^= GF_EXP[log_c + log_factor]
+    return resto
+
+TRAMOS_QR = re.compile(r'0{5,}|1{5,}')
+
+MASCARAS_QR = (
+    lambda x, y: (x + y) % 2 == 0,
+    lambda x, y: y % 2 == 0,
+    lambda x, y: x % 3 == 0,
+    lambda x, y: (x + y) % 3 == 0,
+    lambda x, y: (x // 3 + y // 2) % 2 == 0,
+    lambda x, y: x * y % 2 + x * y % 3 == 0,
+    lambda x, y: (x * y % 2 + x * y % 3) % 2 == 0,
+    lambda x, y: ((x + y) % 2 + x * y % 3) % 2 == 0,
+)
+
+class QR(Simbologia):
+    """
+    Código QR en modo byte (UTF-8) con corrección de errores M, en la menor
+    versión (1-40) en la que cabe el valor, con la máscara de menor penalización.
+    """
+    
+    nombre = 'qr'
+    descripcion = 'QR'
+    bidimensional = True
+    texto_legible = False
+    zpl_comando = 'BQ'
+    zona_silencio = 4
+    
+    @staticmethod
+    def modulos_crudos(version: int) -> int:
+        """Módulos disponibles para datos y corrección en una versión"""
+        resultado = (16 * version + 128) * version + 64
+        if version >= 2:
+            alineacion = version // 7 + 2
+            resultado -= (25 * alineacion - 10) * alineacion - 55
+            if version >= 7:
+                resultado -= 36
+        return resultado
+    
+    @classmethod
+    def capacidad(cls, version: int) -> int:
+        """Codewords de datos de una versión"""
+        return cls.modulos_crudos(version) // 8 - QR_ECC_POR_BLOQUE[version] * QR_BLOQUES[version]
+    
+    def version(self, datos: bytes) -> int:
+        for version in range(1, 41):
+            bits = 4 + (8 if version <= 9 else 16) + 8 * len(datos)
+            if bits <= self.capacidad(version) * 8:
+                return version
+        raise ValueError(f"demasiado largo para un QR ({len(datos)} bytes)")
+    
+    def normalizar(self, codigo: str) -> str:
+        self.version(codigo.encode('utf-8'))
+        return codigo
+    
+    def codewords(self, datos: bytes, version: int) -> List[int]:
+        """Datos con relleno, repartidos en bloques con su corrección e intercalados"""
+        bits = [0, 1, 0, 0]
+        largo = 8 if version <= 9 else 16
+        bits += [(len(datos) >> i) & 1 for i in range(largo - 1, -1, -1)]
+        for byte in datos:
+            bits += [(byte >> i) & 1 for i in range(7, -1, -1)]
+        capacidad = self.capacidad(version)
+        bits += [0] * min(4, capacidad * 8 - len(bits))
+        bits += [0] * (-len(bits) % 8)
+        palabras = [int(''.join(map(str, bits[i:i + 8])), 2) for i in range(0, len(bits), 8)]
+        relleno = (0xEC, 0x11)
+        palabras += [relleno[i % 2] for i in range(capacidad - len(palabras))]
+        
+        bloques = QR_BLOQUES[version]
+        ecc = QR_ECC_POR_BLOQUE[version]
+        crudas = self.modulos_crudos(version) // 8
+        cortos = bloques - crudas % bloques
+        largo_corto = crudas // bloques
+        datos_bloques = []
+        correccion = []
+        k = 0
+        for i in range(bloques):
+            n = largo_corto - ecc + (0 if i < cortos else 1)
+            datos_bloques.append(palabras[k:k + n])
+            correccion.append(resto_reed_solomon(palabras[k:k + n], ecc))
+            k += n
+        
+        resultado = []
+        for i in range(largo_corto - ecc + 1):
+            for bloque in datos_bloques:
+                if i < len(bloque):
+                    resultado.append(bloque[i])
+        for i in range(ecc):
+            for bloque in correccion:
+                resultado.append(bloque[i])
+        return resultado
+    
+    @staticmethod
+    def patrones_funcion(version: int) -> Tuple[List[List[bool]], List[List[bool]]]:
+        """Matriz con los patrones fijos (buscadores, sincronismo, alineación) y la máscara de cuáles son"""
+        lado = version * 4 + 17
+        modulos = [[False] * lado for _ in range(lado)]
+        funcion = [[False] * lado for _ in range(lado)]
+        
+        def fijar(x: int, y: int, oscuro: bool) -> None:
+            modulos[y][x] = oscuro
+            funcion[y][x] = True
+        
+        for i in range(lado):
+            fijar(6, i, i % 2 == 0)
+            fijar(i, 6, i % 2 == 0)
+        for cx, cy in ((3, 3), (lado - 4, 3), (3, lado - 4)):
+            for dy in range(-4, 5):
+                for dx in range(-4, 5):
+                    x, y = cx + dx, cy + dy
+                    if 0 <= x < lado and 0 <= y < lado:
+                        fijar(x, y, max(abs(dx), abs(dy)) not in (2, 4))
+        if version > 1:
+            cantidad = version // 7 + 2
+            paso = (version * 8 + cantidad * 3 + 5) // (cantidad * 4 - 4) * 2
+            posiciones = [6] + sorted(lado - 7 - i * paso for i in range(cantidad - 1))
+            ultima = len(posiciones) - 1
+            for i, cx in enumerate(posiciones):
+                for j, cy in enumerate(posiciones):
+                    if (i, j) in ((0, 0), (0, ultima), (ultima, 0)):
+                        continue
+                    for dy in range(-2, 3):
+                        for dx in range(-2, 3):
+                            fijar(cx + dx, cy + dy, max(abs(dx), abs(dy)) != 1)
+        # Reserva el formato (se escribe al elegir la máscara) y el módulo oscuro fijo
+        for i in range(9):
+            if i != 6:
+                fijar(8, i, False)
+                fijar(i, 8, False)
+        for i in range(8):
+            fijar(lado - 1 - i, 8, False)
+            fijar(8, lado - 1 - i, False)
+        fijar(8, lado - 8, True)
+        if version >= 7:
+            resto = version
+            for _ in range(12):
+                resto = (resto << 1) ^ ((resto >> 11) * 0x1F25)
+            bits = version << 12 | resto
+            for i in range(18):
+                oscuro = (bits >> i) & 1 == 1
+                fijar(lado - 11 + i % 3, i // 3, oscuro)
+                fijar(i // 3, lado - 11 + i % 3, oscuro)
+        return modulos, funcion
+    
+    @staticmethod
+    def escribir_formato(modulos: List[List[bool]], mascara: int) -> None:
+        lado = len(modulos)
+        # Nivel M = 00 en los dos bits de corrección
+        datos = mascara
+        resto = datos
+        for _ in range(10):
+            resto = (resto << 1) ^ ((resto >> 9) * 0x537)
+        bits = (datos << 10 | resto) ^ 0x5412
+        
+        def bit(i: int) -> bool:
+            return (bits >> i) & 1 == 1
+        
+        for i in range(6):
+            modulos[i][8] = bit(i)
+        modulos[7][8] = bit(6)
+        modulos[8][8] = bit(7)
+        modulos[8][7] = bit(8)
+        for i in range(9, 15):
+            modulos[8][14 - i] = bit(i)
+        for i in range(8):
+            modulos[8][lado - 1 - i] = bit(i)
+        for i in range(8, 15):
+            modulos[lado - 15 + i][8] = bit(i)
+    
+    @staticmethod
+    def penalizacion(filas: List[str]) -> int:
+        """Penalización de la norma (filas como texto '1'/'0'): tramos, bloques 2x2, falsos buscadores y balance"""
+        lado = len(filas)
+        columnas = [''.join(columna) for columna in zip(*filas)]
+        puntos = 0
+        for linea in filas + columnas:
+            for tramo in TRAMOS_QR.findall(linea):
+                puntos += len(tramo) - 2
+            for patron in ('10111010000', '00001011101'):
+                inicio = linea.find(patron)
+                while inicio != -1:
+                    puntos += 40
+                    inicio = linea.find(patron, inicio + 1)
+        # Bloques 2x2 de un mismo color, con las filas como enteros: cada bit contra su vecino
+        enteros = [int(fila, 2) for fila in filas]
+        pares = (1 << (lado - 1)) - 1
+        for fila, siguiente in zip(enteros, enteros[1:]):
+            oscuros = fila & (fila >> 1) & siguiente & (siguiente >> 1)
+            claros = ~(fila | (fila >> 1) | siguiente | (siguiente >> 1))
+            puntos += 3 * bin((oscuros | claros) & pares).count('1')
+        oscuros = sum(fila.count('1') for fila in filas)
+        puntos += abs(oscuros * 100 // (lado * lado) - 50) // 5 * 10
+        return puntos
+    
+    @classmethod
+    @lru_cache(maxsize=None)
+    def plantilla(cls, version: int) -> Tuple:
+        """
+        Lo fijo de cada versión, calculado una vez: filas con los patrones
+        de función (como enteros, un bit por módulo), el orden de colocación
+        de los bits de datos y, por máscara, los bits que invierte y los de
+        su información de formato
+        """
+        base, funcion = cls.patrones_funcion(version)
+        lado = len(base)
+        
+        # Recorrido en zigzag de a dos columnas, de derecha a izquierda, salteando la columna 6
+        posiciones = []
+        derecha = lado - 1
+        while derecha >= 1:
+            if derecha == 6:
+                derecha = 5
+            subiendo = (derecha + 1) & 2 == 0
+            for vertical in range(lado):
+                y = lado - 1 - vertical if subiendo else vertical
+                for x in (derecha, derecha - 1):
+                    if not funcion[y][x]:
+                        posiciones.append((x, y))
+            derecha -= 2
+        
+        def a_enteros(matriz: List[List[bool]]) -> Tuple[int, ...]:
+            return tuple(int(''.join('1' if m else '0' for m in fila), 2) for fila in matriz)
+        
+        mascaras = []
+        formatos = []
+        for numero, mascara in enumerate(MASCARAS_QR):
+            invertidos = [[False] * lado for _ in range(lado)]
+            for x, y in posiciones:
+                invertidos[y][x] = mascara(x, y)
+            mascaras.append(a_enteros(invertidos))
+            formato = [[False] * lado for _ in range(lado)]
+            cls.escribir_formato(formato, numero)
+            formatos.append(a_enteros(formato))
+        return lado, a_enteros(base), tuple(posiciones), tuple(mascaras), tuple(formatos)
+    
+    def codificar(self, codigo: str) -> Modulos:
+        datos = codigo.encode('utf-8')
+        version = self.version(datos)
+        lado, base, posiciones, mascaras, formatos = self.plantilla(version)
+        
+        filas = list(base)
+        bit = 0
+        for palabra in self.codewords(datos, version):
+            for desplazamiento in range(7, -1, -1):
+                if (palabra >> desplazamiento) & 1:
+                    x, y = posiciones[bit]
+                    filas[y] |= 1 << (lado - 1 - x)
+                bit += 1
+        
+        mejor = None
+        ancho_binario = f'0{lado}b'
+        for mascara, formato in zip(mascaras, formatos):
+            candidata = [format(fila ^ invertir | bits_formato, ancho_binario)
+                         for fila, invertir, bits_formato in zip(filas, mascara, formato)]
+            puntos = self.penalizacion(candidata)
+            if mejor is None or puntos < mejor[0]:
+                mejor = (puntos, candidata)
+        
+        barras = []
+        for y, fila in enumerate(mejor[1]):
+            barras.extend(corridas_patron(fila, y))
+        return Modulos(lado, lado, tuple(barras))
+
+SIMBOLOGIAS = {simbologia.nombre: simbologia for simbologia in (Code128(), EAN13(), UPCA(), QR())}
+SIMBOLOGIA_DEFECTO = 'code128'
+
+def obtener_simbologia(nombre: Optional[str] = None) -> Simbologia:
+    """Simbología registrada por nombre (la de defecto si no se indica); ValueError si no existe"""
+    simbologia = SIMBOLOGIAS.get(nombre or SIMBOLOGIA_DEFECTO)
+    if simbologia is None:
+        raise ValueError(f"simbología desconocida {nombre!r}; debe ser una de: {', '.join(SIMBOLOGIAS)}")
+    return simbologia
+
+@lru_cache(maxsize=1024)
+def codificar_codigo(codigo: str, simbologia: str = SIMBOLOGIA_DEFECTO) -> Modulos:
+    """Módulos del código en la simbología indicada; el resultado es compartido y no debe modificarse"""
+    try:
+        return obtener_simbologia(simbologia).codificar(codigo)
+    except Exception as e:
+        raise ValueError(f"Error generando código de barras para '{codigo}': {str(e)}")
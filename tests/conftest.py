@@ -0,0 +1,72 @@
+"""
+Configuración común de las pruebas.
+
+La aplicación se importa con sus bases SQLite, cachés y archivos generados
+dentro de un directorio temporal: LabelConfig lee el entorno al importarse,
+así que las variables se fijan antes del import.
+"""
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+DIRECTORIO_PRUEBAS = tempfile.mkdtemp(prefix='etiquetas_pruebas_')
+os.environ.update({
+    'SESIONES_DB': os.path.join(DIRECTORIO_PRUEBAS, 'sesiones.sqlite3'),
+    'CATALOGO_DB': os.path.join(DIRECTORIO_PRUEBAS, 'catalogo.sqlite3'),
+    'CACHE_ARTEFACTOS_DIR': os.path.join(DIRECTORIO_PRUEBAS, 'cache'),
+    'CACHE_ZIPS_DIR': os.path.join(DIRECTORIO_PRUEBAS, 'zips'),
+    'MODO_ENTREGA': 'disco',
+    'PDF_WORKERS': '0',
+    'SECRET_KEY': 'clave-de-pruebas',
+})
+# pdfs_generados es relativo al directorio actual
+os.chdir(DIRECTORIO_PRUEBAS)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as aplicacion  # noqa: E402
+
+
+@pytest.fixture(scope='session', autouse=True)
+def esperar_trabajos():
+    """Los trabajos encolados terminan dentro del directorio temporal, aunque una prueba falle"""
+    yield
+    if aplicacion.gestor_trabajos._executor is not None:
+        aplicacion.gestor_trabajos._executor.shutdown(wait=True)
+
+
+@pytest.fixture
+def cliente():
+    aplicacion.app.config['TESTING'] = True
+    return aplicacion.app.test_client()
+
+
+@pytest.fixture
+def metrica():
+    """Valor actual de una serie de /metrics (0 si todavía no existe)"""
+    def leer(nombre: str, **etiquetas) -> float:
+        serie = nombre + aplicacion._formatear_etiquetas(tuple(sorted(etiquetas.items())))
+        for linea in aplicacion.metricas.exportar().splitlines():
+            if linea.startswith(serie + ' '):
+                return float(linea.rsplit(' ', 1)[1])
+        return 0.0
+    return leer
+
+
+@pytest.fixture
+def codigo_unico():
+    """Códigos que ninguna otra prueba usó, para no depender de la caché compartida"""
+    return lambda: f"{uuid.uuid4().int % 10 ** 10:010d}"
+
+
+def generar(cliente, productos, **opciones):
+    """POST /api/labels de etiquetas de código de barras (las opciones reemplazan a las de defecto)"""
+    cuerpo = {'tipo_etiqueta': 'codigo_barras', 'productos': productos}
+    cuerpo.update(opciones)
+    return cliente.post('/api/labels', json=cuerpo)
+
+
+def nombre_adjunto(respuesta) -> str:
+    return respuesta.headers['Content-Disposition'].split('filename=', 1)[1].strip('"')
@@ -0,0 +1,166 @@
+"""API JSON de generación: síncrona, asíncrona y validación"""
+import io
+import time
+import zipfile
+
+from conftest import aplicacion, generar, nombre_adjunto
+
+
+def esperar_trabajo(cliente, estado_url: str, limite: float = 30.0) -> dict:
+    fin = time.monotonic() + limite
+    while True:
+        resumen = cliente.get(estado_url).get_json()
+        if resumen['estado'] in ('completado', 'error') or time.monotonic() > fin:
+            return resumen
+        time.sleep(0.05)
+
+
+# Síncrona
+
+def test_sincrono_un_producto_entrega_el_pdf(cliente, codigo_unico):
+    codigo = codigo_unico()
+    respuesta = generar(cliente, [{'sku': 'PERF-1', 'codigo': codigo, 'cantidad': 3}])
+    assert respuesta.status_code == 200
+    assert respuesta.mimetype == 'application/pdf'
+    assert respuesta.data.startswith(b'%PDF')
+    # El nombre de descarga no lleva el prefijo del lote
+    assert nombre_adjunto(respuesta) == f"PERF-1_{codigo}_etiquetas.pdf"
+
+
+def test_sincrono_varios_productos_entrega_un_zip(cliente, codigo_unico):
+    productos = [{'sku': f"PERF-{i}", 'codigo': codigo_unico(), 'cantidad': 1} for i in range(3)]
+    respuesta = generar(cliente, productos)
+    assert respuesta.status_code == 200
+    assert respuesta.mimetype == 'application/zip'
+    with zipfile.ZipFile(io.BytesIO(respuesta.data)) as archivo:
+        nombres = sorted(archivo.namelist())
+        assert nombres == sorted(f"{p['sku']}_{p['codigo']}_etiquetas.pdf" for p in productos)
+        assert all(archivo.read(nombre).startswith(b'%PDF') for nombre in nombres)
+
+
+def test_sincrono_personalizado_empaquetado_en_un_pdf(cliente):
+    respuesta = generar(cliente, [
+        {'nombre_producto': 'Eau de Parfum', 'valor': '45.000', 'sku': 'EDP-50', 'cantidad': 2},
+        {'nombre_producto': 'Body Mist', 'otro': '250 ml', 'codigo': 'https://example.com/p/1', 'cantidad': 1},
+    ], tipo_etiqueta='personalizado')
+    assert respuesta.status_code == 200
+    assert respuesta.mimetype == 'application/pdf'
+    assert respuesta.data.startswith(b'%PDF')
+
+
+# Asíncrona
+
+def test_asincrono_encola_y_se_descarga(cliente, codigo_unico):
+    productos = [{'sku': f"ASYNC-{i}", 'codigo': codigo_unico(), 'cantidad': 2} for i in range(2)]
+    respuesta = generar(cliente, productos, asincrono=True)
+    assert respuesta.status_code == 202
+    resumen = respuesta.get_json()
+    assert resumen['estado'] in ('pendiente', 'en_proceso', 'completado')
+
+    resumen = esperar_trabajo(cliente, resumen['estado_url'])
+    assert resumen['estado'] == 'completado'
+    assert resumen['etiquetas_generadas'] == 4
+    assert all(archivo['generado'] for archivo in resumen['archivos'])
+
+    descarga = cliente.get(resumen['descarga_url'])
+    assert descarga.status_code == 200
+    assert descarga.mimetype == 'application/zip'
+
+    # Cada archivo también se descarga por separado
+    individual = cliente.get(resumen['archivos'][0]['url'])
+    assert individual.status_code == 200
+    assert individual.data.startswith(b'%PDF')
+
+
+def test_trabajo_inexistente(cliente):
+    assert cliente.get('/api/labels/no-existe').status_code == 404
+    assert cliente.get('/api/labels/no-existe/descarga').status_code == 404
+
+
+# Validación
+
+def test_cuerpo_invalido(cliente):
+    respuesta = cliente.post('/api/labels', data='no es json', content_type='text/plain')
+    assert respuesta.status_code == 400
+    assert respuesta.get_json()['errores']
+
+
+def test_opciones_invalidas(cliente):
+    casos = [
+        {'tipo_etiqueta': 'otro', 'productos': []},
+        {'tipo_etiqueta': 'codigo_barras', 'productos': 'A1'},
+        {'tipo_etiqueta': 'codigo_barras', 'productos': [], 'formato': 'png'},
+        {'tipo_etiqueta': 'codigo_barras', 'productos': [], 'perfil': 'no_existe'},
+    ]
+    for cuerpo in casos:
+        respuesta = cliente.post('/api/labels', json=cuerpo)
+        assert respuesta.status_code == 400, cuerpo
+        assert respuesta.get_json()['errores'], cuerpo
+
+
+def test_productos_invalidos(cliente):
+    casos = [
+        [{'sku': '', 'codigo': '123', 'cantidad': 1}],
+        [{'sku': 'A1', 'codigo': '', 'cantidad': 1}],
+        [{'sku': 'A1', 'codigo': '123', 'cantidad': 0}],
+        [{'sku': 'A1', 'codigo': '123', 'cantidad': 'diez'}],
+        [{'sku': 'A1', 'codigo': '4006381333932', 'cantidad': 1, 'simbologia': 'ean13'}],
+        [{'sku': 'A1', 'codigo': '123', 'cantidad': 1, 'simbologia': 'pdf417'}],
+    ]
+    for productos in casos:
+        respuesta = generar(cliente, productos)
+        assert respuesta.status_code == 400, productos
+        assert respuesta.get_json()['errores'], productos
+
+
+def test_lote_que_excede_los_limites(cliente, monkeypatch):
+    monkeypatch.setattr(aplicacion.LabelConfig, 'MAX_ETIQUETAS_LOTE', 10)
+    respuesta = generar(cliente, [{'sku': 'A1', 'codigo': '123', 'cantidad': 11}])
+    assert respuesta.status_code == 400
+    assert respuesta.get_json()['errores']
+
+
+
+# Descargas y errores
+
+def test_zip_al_vuelo_con_la_misma_cabecera_que_el_de_cache(cliente, monkeypatch, codigo_unico):
+    productos = [{'sku': f"HDR-{i}", 'codigo': codigo_unico(), 'cantidad': 1} for i in range(2)]
+    assert generar(cliente, productos).status_code == 200
+
+    def sin_cache(pdfs):
+        raise OSError("disco lleno")
+    monkeypatch.setattr(aplicacion.cache_zips, 'obtener', sin_cache)
+    al_vuelo = generar(cliente, productos)
+    assert al_vuelo.status_code == 200
+    assert al_vuelo.headers['Content-Disposition'].startswith('attachment; filename=etiquetas_')
+    with zipfile.ZipFile(io.BytesIO(al_vuelo.data)) as archivo:
+        assert len(archivo.namelist()) == 2
+
+
+def test_cabecera_adjunto_como_send_file():
+    for nombre in ('etiquetas_1.zip', 'etiquetas con espacios.zip', 'Colonia Ñandú.zip'):
+        with aplicacion.app.test_request_context():
+            esperada = aplicacion.send_file(io.BytesIO(b''), as_attachment=True,
+                                            download_name=nombre).headers['Content-Disposition']
+        assert aplicacion.cabecera_adjunto(nombre) == esperada
+
+
+def test_errores_de_la_api_en_json(cliente, monkeypatch):
+    respuesta = cliente.get('/api/labels')
+    assert respuesta.status_code == 405
+    assert respuesta.get_json()['errores']
+
+    respuesta = cliente.get('/api/no-existe')
+    assert respuesta.status_code == 404
+    assert respuesta.get_json()['errores']
+
+    def falla(*args, **kwargs):
+        raise RuntimeError("falla inesperada")
+    monkeypatch.setitem(aplicacion.app.config, 'PROPAGATE_EXCEPTIONS', False)
+    monkeypatch.setattr(aplicacion, 'validar_productos', falla)
+    respuesta = generar(cliente, [{'sku': 'A1', 'codigo': '123', 'cantidad': 1}])
+    assert respuesta.status_code == 500
+    assert respuesta.get_json()['errores']
+
+    # Fuera de la API se mantiene la redirección al inicio
+    assert cliente.get('/no-existe').status_code == 302
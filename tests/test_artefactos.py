@@ -0,0 +1,76 @@
+"""Ciclo de vida de los archivos generados: TTL, cuota y borrado por lote, con el estado en el disco"""
+import os
+import time
+
+from conftest import aplicacion
+
+LOTE_A = 'aaaaaaaaaaaa'
+LOTE_B = 'bbbbbbbbbbbb'
+
+
+def gestor(directorio, ttl=3600, cuota_bytes=0, activos=()):
+    return aplicacion.GestorArtefactos([str(directorio)], ttl, cuota_bytes, 0, lambda: set(activos))
+
+
+def escribir(directorio, nombre: str, tamaño: int = 100, hace: float = 0.0) -> str:
+    """Archivo de `tamaño` bytes usado por última vez hace `hace` segundos"""
+    ruta = os.path.join(directorio, nombre)
+    with open(ruta, 'wb') as f:
+        f.write(b'x' * tamaño)
+    momento = time.time() - hace
+    os.utime(ruta, (momento, momento))
+    return ruta
+
+
+def test_barrido_por_ttl(tmp_path):
+    viejo = escribir(tmp_path, f"{LOTE_A}_viejo.pdf", hace=7200)
+    reciente = escribir(tmp_path, f"{LOTE_A}_reciente.pdf", hace=60)
+    protegido = escribir(tmp_path, f"{LOTE_B}_activo.pdf", hace=7200)
+    sin_lote = escribir(tmp_path, 'etiquetas_antiguas.pdf', hace=7200)
+
+    assert gestor(tmp_path, activos=[LOTE_B + '0' * 20]).barrer() == 2
+    assert not os.path.exists(viejo) and not os.path.exists(sin_lote)
+    assert os.path.exists(reciente) and os.path.exists(protegido)
+
+
+def test_un_acceso_en_otro_worker_renueva_el_archivo(tmp_path):
+    ruta = escribir(tmp_path, f"{LOTE_A}_etiquetas.pdf", hace=7200)
+    modificado = os.stat(ruta).st_mtime_ns
+    # Cada worker tiene su gestor; el uso queda en el disco, no en el proceso
+    gestor(tmp_path).tocar(ruta)
+    assert os.stat(ruta).st_mtime_ns == modificado
+    assert gestor(tmp_path).barrer() == 0
+    assert os.path.exists(ruta)
+
+
+def test_cuota_borra_los_menos_usados(tmp_path):
+    rutas = [escribir(tmp_path, f"{LOTE_A}_{i}.pdf", hace=600 - i * 100) for i in range(4)]
+    protegido = escribir(tmp_path, f"{LOTE_B}_activo.pdf", hace=900)
+    # Una escritura atómica en curso no se cuenta ni se borra
+    temporal = escribir(tmp_path, f"{'c' * 64}.pdf.1234.tmp", tamaño=1000, hace=900)
+
+    gestion = gestor(tmp_path, cuota_bytes=300, activos=[LOTE_B])
+    assert gestion.barrer() == 2
+    assert [os.path.exists(ruta) for ruta in rutas] == [False, False, True, True]
+    assert os.path.exists(protegido) and os.path.exists(temporal)
+    assert gestion.estadisticas()['bytes'] == 300
+
+
+def test_registrar_sobre_la_cuota_adelanta_el_barrido(tmp_path):
+    escribir(tmp_path, f"{LOTE_A}_1.pdf", tamaño=200)
+    gestion = gestor(tmp_path, cuota_bytes=300)
+    gestion.registrar(escribir(tmp_path, f"{LOTE_A}_2.pdf", tamaño=50))
+    assert not gestion._despertar.is_set()
+    gestion.registrar(escribir(tmp_path, f"{LOTE_A}_3.pdf", tamaño=100))
+    assert gestion._despertar.is_set()
+
+
+def test_eliminar_lote(tmp_path):
+    del_lote = [escribir(tmp_path, f"{LOTE_A}_{nombre}")
+                for nombre in ('uno.pdf', 'dos.pdf', 'dos.pdf.vista.json', 'dos.pdf.vista-1-120.png')]
+    otro_lote = escribir(tmp_path, f"{LOTE_B}_uno.pdf")
+    cache = escribir(tmp_path, f"{'a' * 64}.pdf")
+
+    assert gestor(tmp_path).eliminar_lote(LOTE_A + 'f' * 20) == 4
+    assert not any(os.path.exists(ruta) for ruta in del_lote)
+    assert os.path.exists(otro_lote) and os.path.exists(cache)
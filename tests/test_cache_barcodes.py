@@ -0,0 +1,70 @@
+"""Caché LRU de códigos de barras: aciertos, fallos, expulsiones y presupuesto en bytes"""
+from conftest import aplicacion
+
+
+def test_aciertos_y_fallos():
+    cache = aplicacion.CacheLRU(100)
+    assert cache.obtener(('a',)) is None
+    cache.guardar(('a',), 'A', 10)
+    assert cache.obtener(('a',)) == 'A'
+    assert cache.obtener(('a',)) == 'A'
+
+    estadisticas = cache.estadisticas()
+    assert (estadisticas['hits'], estadisticas['misses'], estadisticas['evictions']) == (2, 1, 0)
+    assert (estadisticas['entradas'], estadisticas['bytes'], estadisticas['max_bytes']) == (1, 10, 100)
+
+
+def test_expulsa_la_menos_usada_recientemente():
+    cache = aplicacion.CacheLRU(30)
+    for clave in 'abc':
+        cache.guardar((clave,), clave.upper(), 10)
+    # Usar 'a' la vuelve la más reciente: la siguiente expulsión se lleva a 'b'
+    cache.obtener(('a',))
+    cache.guardar(('d',), 'D', 10)
+
+    assert ('b',) not in cache
+    assert all((clave,) in cache for clave in 'acd')
+    estadisticas = cache.estadisticas()
+    assert estadisticas['evictions'] == 1
+    assert estadisticas['bytes'] == 30
+
+    # Una entrada grande expulsa varias hasta respetar el presupuesto
+    cache.guardar(('e',), 'E', 25)
+    assert [(clave,) in cache for clave in 'acde'] == [False, False, False, True]
+    assert cache.estadisticas()['evictions'] == 4
+    assert cache.estadisticas()['bytes'] == 25
+
+
+def test_reemplazo_y_entradas_mayores_al_presupuesto():
+    cache = aplicacion.CacheLRU(20)
+    cache.guardar(('a',), 'A', 10)
+    cache.guardar(('a',), 'A2', 15)
+    assert cache.estadisticas()['bytes'] == 15
+    assert cache.obtener(('a',)) == 'A2'
+
+    # Lo que no cabe nunca no se guarda ni expulsa nada
+    cache.guardar(('b',), 'B', 21)
+    assert ('b',) not in cache
+    assert ('a',) in cache
+    assert cache.estadisticas()['evictions'] == 0
+
+
+def test_codigo_repetido_sale_de_la_cache(codigo_unico, monkeypatch):
+    monkeypatch.setattr(aplicacion, 'cache_barcodes', aplicacion.CacheLRU(1024 * 1024))
+    codigo = codigo_unico()
+
+    primera = aplicacion.generar_barcode(codigo).getvalue()
+    segunda = aplicacion.generar_barcode(codigo).getvalue()
+    assert segunda == primera
+
+    # raster y vector tienen claves separadas; el raster reutiliza la geometría vectorial
+    estadisticas = aplicacion.cache_barcodes.estadisticas()
+    assert estadisticas['entradas'] == 2
+    assert estadisticas['hits'] == 1
+    assert estadisticas['misses'] == 2
+
+
+def test_endpoint_de_estadisticas(cliente):
+    respuesta = cliente.get('/cache/estadisticas')
+    assert respuesta.status_code == 200
+    assert set(respuesta.get_json()) == {'hits', 'misses', 'evictions', 'entradas', 'bytes', 'max_bytes'}
@@ -0,0 +1,27 @@
+"""Cachés de artefactos: PDFs por contenido y ZIPs de descarga conjunta"""
+from conftest import generar
+
+
+def test_pdf_repetido_sale_de_la_cache_de_artefactos(cliente, metrica, codigo_unico):
+    producto = {'sku': 'CACHE-1', 'codigo': codigo_unico(), 'cantidad': 5}
+    aciertos = metrica('etiquetas_cache_artefactos_total', resultado='hit')
+
+    primera = generar(cliente, [producto])
+    assert metrica('etiquetas_cache_artefactos_total', resultado='hit') == aciertos
+
+    # El SKU no se imprime: otro SKU con el mismo código comparte el PDF
+    segunda = generar(cliente, [dict(producto, sku='CACHE-2')])
+    assert metrica('etiquetas_cache_artefactos_total', resultado='hit') == aciertos + 1
+    assert segunda.data == primera.data
+
+
+def test_zip_repetido_sale_de_la_cache_de_zips(cliente, metrica, codigo_unico):
+    productos = [{'sku': f"ZIP-{i}", 'codigo': codigo_unico(), 'cantidad': 1} for i in range(2)]
+    aciertos = metrica('etiquetas_cache_zips_total', resultado='hit')
+
+    primera = generar(cliente, productos)
+    assert metrica('etiquetas_cache_zips_total', resultado='hit') == aciertos
+
+    segunda = generar(cliente, productos)
+    assert metrica('etiquetas_cache_zips_total', resultado='hit') == aciertos + 1
+    assert segunda.data == primera.data
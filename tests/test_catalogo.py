@@ -0,0 +1,34 @@
+"""Catálogo de productos: reimpresión por SKU o por código"""
+from conftest import generar, nombre_adjunto
+
+
+def test_reimpresion_por_sku_desde_el_catalogo(cliente, codigo_unico):
+    codigo = codigo_unico()
+    assert generar(cliente, [{'sku': 'REIMP-1', 'codigo': codigo, 'cantidad': 1}]).status_code == 200
+
+    respuesta = cliente.post('/api/labels/reprint', json={
+        'tipo_etiqueta': 'codigo_barras', 'productos': [{'sku': 'REIMP-1', 'cantidad': 7}],
+    })
+    assert respuesta.status_code == 200
+    assert respuesta.data.startswith(b'%PDF')
+    assert nombre_adjunto(respuesta) == f"REIMP-1_{codigo}_etiquetas.pdf"
+
+    # También por código de barras
+    respuesta = cliente.post('/api/labels/reprint', json={
+        'tipo_etiqueta': 'codigo_barras', 'productos': [{'sku': codigo, 'cantidad': 1}], 'formato': 'zpl',
+    })
+    assert respuesta.status_code == 200
+    assert '^PQ1' in respuesta.data.decode('utf-8')
+
+
+def test_reimpresion_de_sku_desconocido(cliente):
+    respuesta = cliente.post('/api/labels/reprint', json={
+        'tipo_etiqueta': 'codigo_barras', 'productos': [{'sku': 'NO-EXISTE', 'cantidad': 1}],
+    })
+    assert respuesta.status_code == 400
+    assert 'NO-EXISTE' in respuesta.get_json()['errores'][0]
+
+    respuesta = cliente.post('/api/labels/reprint', json={
+        'tipo_etiqueta': 'codigo_barras', 'productos': [{'sku': 'REIMP-1', 'cantidad': 0}],
+    })
+    assert respuesta.status_code == 400
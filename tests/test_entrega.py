@@ -0,0 +1,47 @@
+"""Entrega de archivos: modo 'memoria' y archivos que ya no están"""
+import os
+import runpy
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import aplicacion
+
+
+def test_archivo_inexistente_responde_410(cliente):
+    respuesta = cliente.get('/descargar/0123456789ab_no_existe.pdf')
+    assert respuesta.status_code == 410
+    assert respuesta.get_json()['errores']
+
+
+def test_modo_memoria(cliente, monkeypatch, codigo_unico):
+    monkeypatch.setattr(aplicacion.LabelConfig, 'MODO_ENTREGA', 'memoria')
+    productos = [{'sku': f"MEM-{i}", 'codigo': codigo_unico(), 'cantidad': 1, 'simbologia': 'code128',
+                  'tipo': 'codigo_barras'} for i in range(2)]
+    trabajo = aplicacion.gestor_trabajos.ejecutar(productos, 'codigo_barras', None, False, 'pdf', 'pruebas')
+    assert trabajo.estado == 'completado'
+
+    nombre = trabajo.pdfs[0]['nombre_archivo']
+    assert not os.path.exists(os.path.join('pdfs_generados', nombre))
+    assert cliente.get(f"/descargar/{nombre}").data.startswith(b'%PDF')
+
+    # Otro worker (o el mismo, después de expulsarlo del LRU) ya no lo tiene
+    monkeypatch.setattr(aplicacion, 'almacen_memoria', aplicacion.CacheLRU(aplicacion.almacen_memoria.max_bytes))
+    respuesta = cliente.get(f"/descargar/{nombre}")
+    assert respuesta.status_code == 410
+    assert respuesta.get_json()['errores']
+
+
+@pytest.mark.parametrize('modo, workers, admitido', [
+    ('memoria', 1, True), ('memoria', 3, False), ('disco', 3, True),
+])
+def test_gunicorn_rechaza_memoria_con_varios_workers(monkeypatch, modo, workers, admitido):
+    monkeypatch.setenv('MODO_ENTREGA', modo)
+    monkeypatch.setenv('GUNICORN_PRECARGA', '0')
+    configuracion = runpy.run_path(os.path.join(os.path.dirname(aplicacion.__file__), 'gunicorn.conf.py'))
+    servidor = SimpleNamespace(cfg=SimpleNamespace(workers=workers))
+    if admitido:
+        configuracion['on_starting'](servidor)
+    else:
+        with pytest.raises(RuntimeError, match='un solo worker'):
+            configuracion['on_starting'](servidor)
@@ -0,0 +1,85 @@
+"""Importación de productos desde CSV/XLSX: errores numerados por fila del archivo"""
+import io
+
+import pytest
+
+from conftest import aplicacion
+
+
+def leer_csv(texto: str):
+    return aplicacion.leer_filas_csv(io.BytesIO(texto.encode('utf-8')))
+
+
+def test_csv_numera_por_fila_y_omite_vacias():
+    # BOM, punto y coma y encabezados con mayúsculas, como los exporta una planilla
+    texto = "﻿SKU;Codigo;Cantidad\nA1;123;2\n;;\nA2;;1\nA3;456;0\n\nA1;789;1\n"
+    productos, errores = aplicacion.importar_productos(leer_csv(texto), 'codigo_barras')
+
+    assert [p['sku'] for p in productos] == ['A1']
+    # Las filas 3 (separadores solos) y 6 (en blanco) se omiten sin correr la numeración
+    assert errores == [
+        "El código de barras del producto 4 es obligatorio.",
+        "La cantidad del producto 5 debe ser 1 o superior.",
+        "El SKU del producto 7 está repetido.",
+    ]
+
+
+def test_csv_personalizado():
+    texto = "cantidad,nombre_producto,valor\n2,Café,$10\nx,Té,$5\n"
+    productos, errores = aplicacion.importar_productos(leer_csv(texto), 'personalizado')
+    assert [p['nombre_producto'] for p in productos] == ['Café']
+    assert errores == ["La cantidad del producto 3 debe ser un número válido."]
+
+
+def test_maximo_de_filas(monkeypatch):
+    monkeypatch.setattr(aplicacion.LabelConfig, 'MAX_FILAS_IMPORTACION', 2)
+    texto = "sku,codigo,cantidad\n" + "".join(f"S{i},12{i},1\n" for i in range(3))
+    productos, errores = aplicacion.importar_productos(leer_csv(texto), 'codigo_barras')
+    assert len(productos) == 2
+    assert errores == ["El lote supera el máximo de 2 productos."]
+
+
+def test_xlsx_numera_por_fila():
+    openpyxl = pytest.importorskip('openpyxl')
+    libro = openpyxl.Workbook()
+    hoja = libro.active
+    hoja.append(['sku', 'codigo', 'cantidad'])
+    hoja.append(['B1', 12345, 3])
+    hoja.append([None, None, None])
+    hoja.append(['B2', '999', 'muchas'])
+    archivo = io.BytesIO()
+    libro.save(archivo)
+    archivo.seek(0)
+
+    filas = aplicacion.leer_filas_importacion('lote.xlsx', archivo)
+    productos, errores = aplicacion.importar_productos(filas, 'codigo_barras')
+    # Las celdas numéricas llegan como texto
+    assert productos[0]['codigo'] == '12345'
+    assert productos[0]['cantidad'] == 3
+    assert errores == ["La cantidad del producto 4 debe ser un número válido."]
+
+
+def test_endpoint_rechaza_otros_formatos(cliente):
+    respuesta = cliente.post('/importar-productos', data={
+        'tipo_etiqueta': 'codigo_barras', 'archivo': (io.BytesIO(b'sku\tcodigo'), 'lote.txt'),
+    })
+    assert respuesta.status_code == 302
+    with cliente.session_transaction() as sesion:
+        mensajes = [mensaje for _, mensaje in sesion['_flashes']]
+    assert mensajes == ["No se pudo leer el archivo: Formato no soportado. Use un archivo .csv o .xlsx."]
+
+
+def test_endpoint_carga_el_lote_valido(cliente, monkeypatch):
+    encolados = []
+
+    def encolar(productos, *args):
+        encolados.append(productos)
+        return aplicacion.Trabajo(productos, *args)
+
+    monkeypatch.setattr(aplicacion.gestor_trabajos, 'encolar', encolar)
+    csv = "sku,codigo,cantidad\nC1,123,1\n\nC2,456,2\n"
+    respuesta = cliente.post('/importar-productos', data={
+        'tipo_etiqueta': 'codigo_barras', 'archivo': (io.BytesIO(csv.encode('utf-8')), 'lote.csv'),
+    })
+    assert respuesta.status_code == 302
+    assert [[p['sku'] for p in productos] for productos in encolados] == [['C1', 'C2']]
@@ -0,0 +1,27 @@
+"""Métricas de /metrics: la etapa de envío mide la escritura del cuerpo"""
+import time
+
+from conftest import aplicacion, generar
+
+
+def test_envio_se_mide_al_terminar_el_cuerpo(cliente, metrica, monkeypatch, codigo_unico):
+    envios = metrica('etiquetas_etapa_segundos_count', etapa='envio')
+    suma = metrica('etiquetas_etapa_segundos_sum', etapa='envio')
+
+    # Un cuerpo lento: el tiempo de escritura tiene que quedar en la etapa
+    original = aplicacion.generar_zip_stream
+
+    def zip_lento(pdfs):
+        for bloque in original(pdfs):
+            time.sleep(0.05)
+            yield bloque
+    monkeypatch.setattr(aplicacion, 'generar_zip_stream', zip_lento)
+    monkeypatch.setattr(aplicacion.cache_zips, 'obtener', lambda pdfs: None)
+
+    productos = [{'sku': f"ENV-{i}", 'codigo': codigo_unico(), 'cantidad': 1} for i in range(2)]
+    respuesta = generar(cliente, productos)
+    assert respuesta.status_code == 200
+    respuesta.close()
+
+    assert metrica('etiquetas_etapa_segundos_count', etapa='envio') == envios + 1
+    assert metrica('etiquetas_etapa_segundos_sum', etapa='envio') - suma >= 0.05
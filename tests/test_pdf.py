@@ -0,0 +1,62 @@
+"""PDF de códigos de barras: reutilización de Form XObjects y cantidad de páginas"""
+import re
+
+import pytest
+
+from conftest import aplicacion
+
+
+def contar(ruta, patron: bytes) -> int:
+    with open(ruta, 'rb') as f:
+        return len(re.findall(patron, f.read()))
+
+
+def paginas(ruta) -> int:
+    return contar(ruta, rb'/Type /Page\b')
+
+
+def formularios(ruta) -> int:
+    return contar(ruta, rb'/Subtype /Form\b')
+
+
+@pytest.mark.parametrize('sobrantes', [0, 1, 5])
+def test_cantidad_de_paginas(tmp_path, sobrantes):
+    layout = aplicacion.obtener_layout()
+    cantidad = layout.por_pagina * 2 + sobrantes
+    ruta = tmp_path / 'etiquetas.pdf'
+    aplicacion.generar_pdf_codigo_barras('12345678', cantidad, str(ruta), layout=layout)
+    assert paginas(ruta) == layout.paginas(cantidad)
+
+
+def test_un_formulario_por_etiqueta_distinta(tmp_path):
+    layout = aplicacion.obtener_layout()
+    ruta = tmp_path / 'etiquetas.pdf'
+    aplicacion.generar_pdf_codigo_barras('12345678', layout.por_pagina * 5 + 3, str(ruta), layout=layout)
+    # Marco, etiqueta y página llena se definen una vez aunque haya seis hojas
+    assert formularios(ruta) == 3
+
+    productos = [
+        {'codigo': '11111111', 'cantidad': layout.por_pagina + 1},
+        {'codigo': '22222222', 'cantidad': 2},
+        {'codigo': '11111111', 'cantidad': 1},
+    ]
+    ruta = tmp_path / 'masivo.pdf'
+    aplicacion.generar_pdf_codigo_barras_masivo(productos, str(ruta), layout=layout)
+    # Marco, dos etiquetas y una sola página llena (la del primer código)
+    assert formularios(ruta) == 4
+    assert paginas(ruta) == layout.paginas(sum(p['cantidad'] for p in productos))
+
+
+def test_mismas_paginas_sin_formularios(tmp_path, monkeypatch):
+    layout = aplicacion.obtener_layout()
+    cantidad = layout.por_pagina * 3 + 7
+    con = tmp_path / 'con.pdf'
+    aplicacion.generar_pdf_codigo_barras('12345678', cantidad, str(con), layout=layout)
+
+    monkeypatch.setattr(aplicacion.LabelConfig, 'USAR_FORM_XOBJECTS', False)
+    sin = tmp_path / 'sin.pdf'
+    aplicacion.generar_pdf_codigo_barras('12345678', cantidad, str(sin), layout=layout)
+
+    assert formularios(sin) == 0
+    assert paginas(sin) == paginas(con) == layout.paginas(cantidad)
+    assert con.stat().st_size < sin.stat().st_size
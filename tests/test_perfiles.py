@@ -0,0 +1,60 @@
+"""Perfiles de hoja: tablas de posiciones precalculadas y selección por lote"""
+import re
+
+import pytest
+
+from conftest import aplicacion, generar
+
+PERFILES = sorted(aplicacion.LAYOUTS_HOJA)
+
+
+@pytest.mark.parametrize('perfil', PERFILES)
+def test_posiciones_dentro_de_la_hoja_y_sin_solaparse(perfil):
+    layout = aplicacion.obtener_layout(perfil)
+    assert len(layout.posiciones) == layout.por_pagina == layout.labels_per_row * layout.labels_per_col
+    # Los orígenes se redondean a 0,1 pt
+    for x, y in layout.posiciones:
+        assert -0.05 <= x and x + layout.label_width <= layout.page_width + 0.05
+        assert -0.05 <= y and y + layout.label_height <= layout.page_height + 0.05
+
+    # Orden de llenado: de izquierda a derecha y de arriba hacia abajo
+    filas = [layout.posiciones[i:i + layout.labels_per_row]
+             for i in range(0, layout.por_pagina, layout.labels_per_row)]
+    for fila in filas:
+        assert len({y for _, y in fila}) == 1
+        for (x1, _), (x2, _) in zip(fila, fila[1:]):
+            assert x2 - x1 == pytest.approx(layout.label_width + layout.spacing_x, abs=0.1)
+    for anterior, siguiente in zip(filas, filas[1:]):
+        assert anterior[0][1] - siguiente[0][1] == pytest.approx(layout.label_height + layout.spacing_y, abs=0.1)
+
+
+@pytest.mark.parametrize('perfil', PERFILES)
+def test_marco_encierra_todos_los_espacios(perfil):
+    layout = aplicacion.obtener_layout(perfil)
+    x, y, ancho, alto = layout.marco_rect
+    for px, py in layout.posiciones:
+        assert x - 0.05 <= px and px + layout.label_width <= x + ancho + 0.05
+        assert y - 0.05 <= py and py + layout.label_height <= y + alto + 0.05
+
+    # Cada separación interior es una línea, o dos si hay espaciado entre etiquetas
+    bordes_x = (layout.labels_per_row - 1) * (2 if layout.spacing_x else 1)
+    bordes_y = (layout.labels_per_col - 1) * (2 if layout.spacing_y else 1)
+    assert len(layout.marco_lineas) == bordes_x + bordes_y
+
+
+def test_perfil_desconocido():
+    with pytest.raises(ValueError):
+        aplicacion.obtener_layout('a4_inexistente')
+
+
+def test_api_usa_el_perfil_pedido(cliente, codigo_unico):
+    layout = aplicacion.obtener_layout('carta_66x25')
+    cantidad = layout.por_pagina + 1
+    respuesta = generar(cliente, [{'sku': 'PERFIL-1', 'codigo': codigo_unico(), 'cantidad': cantidad}],
+                        perfil='carta_66x25')
+    assert respuesta.status_code == 200
+    assert len(re.findall(rb'/Type /Page\b', respuesta.data)) == layout.paginas(cantidad) == 2
+
+    respuesta = generar(cliente, [{'sku': 'PERFIL-2', 'codigo': '123', 'cantidad': 1}], perfil='a4_inexistente')
+    assert respuesta.status_code == 400
+    assert respuesta.get_json()['errores'][0].startswith('perfil debe ser uno de:')
@@ -0,0 +1,81 @@
+"""Generación de PDFs por producto en el pool de procesos: orden de resultados y filas con error"""
+import os
+from concurrent.futures import Future
+
+import pytest
+
+from conftest import aplicacion
+
+
+@pytest.fixture(autouse=True)
+def directorio_pdfs():
+    # Lo crea generar_pdfs, que aquí no interviene
+    os.makedirs('pdfs_generados', exist_ok=True)
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """Pool real de dos procesos, cerrado al terminar la prueba"""
+    monkeypatch.setattr(aplicacion.LabelConfig, 'PDF_WORKERS', 2)
+    monkeypatch.setattr(aplicacion, '_pool_procesos', None)
+    yield
+    if aplicacion._pool_procesos is not None:
+        aplicacion._pool_procesos.shutdown(wait=True)
+
+
+def producto(sku, codigo, cantidad=3, simbologia='code128'):
+    return {'sku': sku, 'codigo': codigo, 'cantidad': cantidad, 'simbologia': simbologia, 'tipo': 'codigo_barras'}
+
+
+def test_resultados_en_el_orden_de_los_productos(pool, codigo_unico):
+    # Cantidades decrecientes: los primeros terminan últimos
+    productos = [producto(f"POOL-{i}", codigo_unico(), cantidad=400 - i * 100) for i in range(4)]
+    avisos = []
+    resultados = aplicacion.generar_pdfs_codigo_barras(productos, 'lotepool1',
+                                                       al_terminar=lambda idx, r: avisos.append(idx))
+
+    assert aplicacion._pool_procesos is not None
+    assert [r['titulo'] for r in resultados] == [aplicacion.nombre_pdf_codigo_barras(p, 'lotepool1')[1]
+                                                 for p in productos]
+    assert [r['cantidad'] for r in resultados] == [400, 300, 200, 100]
+    assert all(r['generado'] for r in resultados)
+    assert avisos == [0, 1, 2, 3]
+
+
+def test_fila_con_error_en_su_posicion(pool, codigo_unico):
+    productos = [
+        producto('OK-1', codigo_unico()),
+        producto('MAL-1', 'no-es-ean', simbologia='ean13'),
+        producto('OK-2', codigo_unico()),
+    ]
+    resultados = aplicacion.generar_pdfs_codigo_barras(productos, 'lotepool2')
+
+    assert [r['generado'] for r in resultados] == [True, False, True]
+    assert resultados[1]['archivo'] == ''
+    assert resultados[1]['error']
+    assert 'MAL-1' in resultados[1]['titulo']
+
+
+def test_falla_del_proceso_se_reporta_como_fila(monkeypatch, codigo_unico):
+    class PoolCaido:
+        """Pool cuyo segundo trabajo muere con el proceso, sin llegar a retornar"""
+        def __init__(self):
+            self.enviados = 0
+
+        def submit(self, funcion, *args):
+            futuro = Future()
+            self.enviados += 1
+            if self.enviados == 2:
+                futuro.set_exception(RuntimeError('proceso terminado'))
+            else:
+                futuro.set_result(funcion(*args))
+            return futuro
+
+    monkeypatch.setattr(aplicacion.LabelConfig, 'PDF_WORKERS', 2)
+    monkeypatch.setattr(aplicacion, 'obtener_pool_procesos', PoolCaido)
+    productos = [producto(f"CAIDO-{i}", codigo_unico()) for i in range(3)]
+    resultados = aplicacion.generar_pdfs_codigo_barras(productos, 'lotepool3')
+
+    assert [r['generado'] for r in resultados] == [True, False, True]
+    assert resultados[1]['error'] == 'proceso terminado'
+    assert resultados[1]['nombre_archivo'] == aplicacion.nombre_pdf_codigo_barras(productos[1], 'lotepool3')[0]
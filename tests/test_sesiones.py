@@ -0,0 +1,95 @@
+"""Sesión guardada en el servidor (InterfazSesionSQLite): firma, expiración y purga"""
+import sqlite3
+
+import pytest
+
+from conftest import aplicacion
+
+
+@pytest.fixture
+def interfaz():
+    interfaz = aplicacion.app.session_interface
+    assert isinstance(interfaz, aplicacion.InterfazSesionSQLite)
+    return interfaz
+
+
+def filas_sesion(interfaz, sid=None):
+    with sqlite3.connect(interfaz.ruta_db) as conexion:
+        if sid is None:
+            return conexion.execute("SELECT COUNT(*) FROM sesiones").fetchone()[0]
+        return conexion.execute("SELECT COUNT(*) FROM sesiones WHERE id = ?", (sid,)).fetchone()[0]
+
+
+def cookie_sesion(cliente):
+    return cliente.get_cookie(aplicacion.app.config['SESSION_COOKIE_NAME'])
+
+
+def test_ida_y_vuelta(cliente, interfaz):
+    productos = [{'sku': f"SKU{i}", 'codigo': f"{i:08d}", 'cantidad': 1} for i in range(200)]
+    with cliente.session_transaction() as sesion:
+        sesion['tipo_etiqueta'] = 'codigo_barras'
+        sesion['productos'] = productos
+
+    # La cookie solo lleva el id firmado, no los datos
+    cookie = cookie_sesion(cliente)
+    assert cookie is not None
+    assert len(cookie.value) < 100
+    sid = aplicacion.Signer(aplicacion.app.secret_key, salt='sesion-servidor').unsign(cookie.value).decode()
+    assert filas_sesion(interfaz, sid) == 1
+
+    with cliente.session_transaction() as sesion:
+        assert sesion['tipo_etiqueta'] == 'codigo_barras'
+        assert sesion['productos'] == productos
+
+
+def test_cookie_alterada_abre_sesion_nueva(cliente, interfaz):
+    with cliente.session_transaction() as sesion:
+        sesion['tipo_etiqueta'] = 'personalizado'
+    cookie = cookie_sesion(cliente)
+
+    sid, firma = cookie.value.rsplit('.', 1)
+    cliente.set_cookie(cookie.key, f"{sid}.{firma[::-1]}")
+    with cliente.session_transaction() as sesion:
+        assert 'tipo_etiqueta' not in sesion
+
+    cliente.set_cookie(cookie.key, 'id-sin-firma')
+    with cliente.session_transaction() as sesion:
+        assert 'tipo_etiqueta' not in sesion
+
+
+def test_sesion_vencida(cliente, interfaz, monkeypatch):
+    monkeypatch.setattr(interfaz, 'ttl', -1)
+    with cliente.session_transaction() as sesion:
+        sesion['tipo_etiqueta'] = 'codigo_barras'
+    with cliente.session_transaction() as sesion:
+        assert 'tipo_etiqueta' not in sesion
+
+
+def test_purga_de_sesiones_vencidas(cliente, interfaz, monkeypatch):
+    monkeypatch.setattr(interfaz, 'ttl', -1)
+    with cliente.session_transaction() as sesion:
+        sesion['tipo_etiqueta'] = 'codigo_barras'
+    assert filas_sesion(interfaz) >= 1
+
+    # La siguiente escritura (pasado el intervalo de purga) borra todas las vencidas
+    monkeypatch.setattr(interfaz, 'ttl', 3600)
+    monkeypatch.setattr(interfaz, '_ultima_purga', 0.0)
+    otro = aplicacion.app.test_client()
+    with otro.session_transaction() as sesion:
+        sesion['tipo_etiqueta'] = 'personalizado'
+    with sqlite3.connect(interfaz.ruta_db) as conexion:
+        vencidas = conexion.execute("SELECT COUNT(*) FROM sesiones WHERE expira <= strftime('%s', 'now')").fetchone()[0]
+    assert vencidas == 0
+    assert filas_sesion(interfaz) >= 1
+
+
+def test_sesion_vacia_borra_fila_y_cookie(cliente, interfaz):
+    with cliente.session_transaction() as sesion:
+        sesion['tipo_etiqueta'] = 'codigo_barras'
+    cookie = cookie_sesion(cliente)
+    sid = aplicacion.Signer(aplicacion.app.secret_key, salt='sesion-servidor').unsign(cookie.value).decode()
+
+    respuesta = cliente.get('/reiniciar')
+    assert respuesta.status_code == 302
+    assert filas_sesion(interfaz, sid) == 0
+    assert cookie_sesion(cliente) is None
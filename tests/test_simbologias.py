@@ -0,0 +1,481 @@
+"""
+Codificadores de simbologías, verificados con decodificadores escritos aparte
+a partir de las normas (ISO/IEC 15417 para Code128, ISO/IEC 15420 para
+EAN/UPC, ISO/IEC 18004 para QR) y con vectores conocidos.
+"""
+import pytest
+
+import simbologias
+from conftest import aplicacion
+
+
+def fila_modulos(modulos) -> str:
+    """Símbolo lineal como texto '1'/'0', un carácter por módulo"""
+    fila = ['0'] * modulos.ancho
+    for _, inicio, largo in modulos.barras:
+        fila[inicio:inicio + largo] = '1' * largo
+    return ''.join(fila)
+
+
+def matriz_modulos(modulos):
+    """Símbolo 2D como matriz de booleanos [fila][columna]"""
+    matriz = [[False] * modulos.ancho for _ in range(modulos.filas)]
+    for fila, inicio, largo in modulos.barras:
+        for x in range(inicio, inicio + largo):
+            matriz[fila][x] = True
+    return matriz
+
+
+def modulos_de_matriz(matriz):
+    return simbologias.Modulos(len(matriz[0]), len(matriz), tuple(
+        (i, j, 1) for i, fila in enumerate(matriz) for j, oscuro in enumerate(fila) if oscuro))
+
+
+# Code128
+
+def anchos_a_modulos(anchos: str) -> str:
+    return ''.join(('1' if i % 2 == 0 else '0') * int(ancho) for i, ancho in enumerate(anchos))
+
+
+PATRONES_CODE128 = {anchos_a_modulos(anchos): valor for valor, anchos in enumerate(simbologias.ANCHOS_CODE128[:106])}
+FNC_CODE128 = {102: '\xf1', 97: '\xf2', 96: '\xf3'}
+
+
+def decodificar_code128(modulos: str) -> str:
+    """Texto de un Code128 ('1'/'0' sin zona silenciosa); AssertionError si el símbolo no es válido"""
+    assert modulos.endswith(anchos_a_modulos('2331112')), "falta el stop"
+    cuerpo = modulos[:-13]
+    assert len(cuerpo) % 11 == 0
+    valores = [PATRONES_CODE128[cuerpo[i:i + 11]] for i in range(0, len(cuerpo), 11)]
+
+    *valores, control = valores
+    assert control == (valores[0] + sum(peso * valor for peso, valor in enumerate(valores[1:], start=1))) % 103
+    juego = {103: 'A', 104: 'B', 105: 'C'}[valores[0]]
+    texto = []
+    for valor in valores[1:]:
+        if juego == 'C' and valor < 100:
+            texto.append(f"{valor:02d}")
+        elif valor in FNC_CODE128:
+            texto.append(FNC_CODE128[valor])
+        elif (juego, valor) in (('A', 101), ('B', 100)):
+            texto.append('\xf4')
+        elif valor in (99, 100, 101):
+            juego = {99: 'C', 100: 'B', 101: 'A'}[valor]
+        elif juego == 'A':
+            texto.append(chr(valor + 32) if valor < 64 else chr(valor - 64))
+        else:
+            texto.append(chr(valor + 32))
+    return ''.join(texto)
+
+
+def test_tabla_code128():
+    anchos = simbologias.ANCHOS_CODE128
+    assert len(anchos) == 107
+    assert len(set(anchos)) == 107
+    for patron in anchos[:106]:
+        assert len(patron) == 6 and sum(map(int, patron)) == 11
+        # Paridad de la norma: la suma de los anchos de barra es par
+        assert sum(map(int, patron[::2])) % 2 == 0
+    # Valores de la norma: 0, los tres inicios y el stop
+    assert anchos[0] == '212222'
+    assert anchos[103:] == ('211412', '211214', '211232', '2331112')
+
+
+@pytest.mark.parametrize('codigo', [
+    'SILK-12345', '12', '123', '1234', '12345678', '1234567', 'A1234567B', 'ab12cd3456',
+    'x', 'lower CASE 99', 'ABC\tDEF', 'ab\x01cd', '\x00\x1f', '~`{|}', '\xf10101234567890128',
+    'A\xf2B\xf3C\xf4D', '\x01\xf4',
+])
+def test_code128_ida_y_vuelta(codigo):
+    assert decodificar_code128(fila_modulos(simbologias.codificar_codigo(codigo, 'code128'))) == codigo
+
+
+def test_code128_usa_el_juego_c_para_los_digitos():
+    # Inicio C, 6 pares de dígitos, control y stop
+    modulos = simbologias.codificar_codigo('123456789012', 'code128')
+    assert modulos.ancho == 11 * 8 + 13
+    assert simbologias.SIMBOLOGIAS['code128'].valores('123456789012')[0] == 105
+
+
+def test_code128_decodifica_los_simbolos_de_python_barcode():
+    # Otro codificador puede elegir otros cambios de juego, pero la tabla es la misma
+    barcode = pytest.importorskip('barcode')
+    for codigo in ('SILK-12345', '12345678', 'Perfume 100ml'):
+        assert decodificar_code128(barcode.get_barcode_class('code128')(codigo).build()[0]) == codigo
+
+
+def test_code128_rechaza_caracteres_fuera_de_ascii():
+    with pytest.raises(ValueError):
+        simbologias.SIMBOLOGIAS['code128'].normalizar('Ñandú')
+
+
+# EAN-13 y UPC-A
+
+IMPARES_EAN = ('0001101', '0011001', '0010011', '0111101', '0100011',
+               '0110001', '0101111', '0111011', '0110111', '0001011')
+PARIDADES_EAN = ('LLLLLL', 'LLGLGG', 'LLGGLG', 'LLGGGL', 'LGLLGG', 'LGGLLG', 'LGGGLL', 'LGLGLG', 'LGLGGL', 'LGGLGL')
+
+
+def decodificar_ean13(modulos: str) -> str:
+    assert len(modulos) == 95
+    assert modulos[:3] == modulos[-3:] == '101' and modulos[45:50] == '01010'
+    complemento = {'0': '1', '1': '0'}
+    digitos = []
+    paridad = ''
+    for i in range(6):
+        patron = modulos[3 + 7 * i:10 + 7 * i]
+        if patron in IMPARES_EAN:
+            digitos.append(IMPARES_EAN.index(patron))
+            paridad += 'L'
+        else:
+            # G: el patrón R (complemento de L) al revés
+            digitos.append(IMPARES_EAN.index(''.join(complemento[m] for m in patron[::-1])))
+            paridad += 'G'
+    for i in range(6):
+        patron = modulos[50 + 7 * i:57 + 7 * i]
+        digitos.append(IMPARES_EAN.index(''.join(complemento[m] for m in patron)))
+    return str(PARIDADES_EAN.index(paridad)) + ''.join(map(str, digitos))
+
+
+def control_ean_valido(ean: str) -> bool:
+    return sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(ean)) % 10 == 0
+
+
+@pytest.mark.parametrize('datos, control', [
+    ('400638133393', '1'),
+    ('501234567890', '0'),
+    ('978014300723', '4'),
+    ('000000000000', '0'),
+    ('590123412345', '7'),
+])
+def test_digito_de_control_ean13(datos, control):
+    ean13 = simbologias.SIMBOLOGIAS['ean13']
+    assert simbologias.digito_control_ean(datos) == control
+    assert ean13.normalizar(datos) == datos + control
+    assert ean13.normalizar(datos + control) == datos + control
+    otro = str((int(control) + 1) % 10)
+    with pytest.raises(ValueError):
+        ean13.normalizar(datos + otro)
+    assert decodificar_ean13(fila_modulos(simbologias.codificar_codigo(datos, 'ean13'))) == datos + control
+
+
+@pytest.mark.parametrize('datos, control', [
+    ('03600029145', '2'),
+    ('01234567890', '5'),
+    ('72527273070', '6'),
+])
+def test_digito_de_control_upca(datos, control):
+    upca = simbologias.SIMBOLOGIAS['upca']
+    assert upca.normalizar(datos) == datos + control
+    with pytest.raises(ValueError):
+        upca.normalizar(datos + str((int(control) + 5) % 10))
+    # Un UPC-A es un EAN-13 que empieza con 0
+    decodificado = decodificar_ean13(fila_modulos(simbologias.codificar_codigo(datos, 'upca')))
+    assert decodificado == '0' + datos + control
+    assert control_ean_valido(decodificado)
+
+
+@pytest.mark.parametrize('simbologia, codigo', [
+    ('ean13', '12345678901'), ('ean13', '12345678901234'), ('ean13', '40063813339a'),
+    ('ean13', '４００６３８１３３３９３'), ('upca', '0360002914'), ('upca', '0360002914523'),
+])
+def test_ean_upc_largo_o_caracteres_invalidos(simbologia, codigo):
+    with pytest.raises(ValueError):
+        simbologias.SIMBOLOGIAS[simbologia].normalizar(codigo)
+
+
+def test_ean13_coincide_con_python_barcode():
+    barcode = pytest.importorskip('barcode')
+    for datos in ('400638133393', '501234567890', '978014300723'):
+        esperado = barcode.get_barcode_class('ean13')(datos).build()[0]
+        assert fila_modulos(simbologias.codificar_codigo(datos, 'ean13')) == esperado
+
+
+# QR
+
+# Por versión, con corrección M: codewords de corrección por bloque y
+# (bloques, codewords de datos por bloque) de cada grupo (ISO/IEC 18004, tabla 9)
+BLOQUES_QR_M = {
+    1: (10, [(1, 16)]), 2: (16, [(1, 28)]), 3: (26, [(1, 44)]), 4: (18, [(2, 32)]),
+    5: (24, [(2, 43)]), 6: (16, [(4, 27)]), 7: (18, [(4, 31)]), 8: (22, [(2, 38), (2, 39)]),
+    9: (22, [(3, 36), (2, 37)]), 10: (26, [(4, 43), (1, 44)]), 11: (30, [(1, 50), (4, 51)]),
+    12: (22, [(6, 36), (2, 37)]), 13: (22, [(8, 37), (1, 38)]), 14: (24, [(4, 40), (5, 41)]),
+}
+# Centros de los patrones de alineación (tabla E.1)
+ALINEACION_QR = {
+    1: [], 2: [6, 18], 3: [6, 22], 4: [6, 26], 5: [6, 30], 6: [6, 34], 7: [6, 22, 38],
+    8: [6, 24, 42], 9: [6, 26, 46], 10: [6, 28, 50], 11: [6, 30, 54], 12: [6, 32, 58],
+    13: [6, 34, 62], 14: [6, 26, 46, 66],
+}
+MASCARAS_QR = (
+    lambda i, j: (i + j) % 2 == 0,
+    lambda i, j: i % 2 == 0,
+    lambda i, j: j % 3 == 0,
+    lambda i, j: (i + j) % 3 == 0,
+    lambda i, j: (i // 2 + j // 3) % 2 == 0,
+    lambda i, j: (i * j) % 2 + (i * j) % 3 == 0,
+    lambda i, j: ((i * j) % 2 + (i * j) % 3) % 2 == 0,
+    lambda i, j: ((i + j) % 2 + (i * j) % 3) % 2 == 0,
+)
+
+
+def bch(datos: int, generador: int, grado: int) -> int:
+    resto = datos << grado
+    for bit in range(resto.bit_length() - 1, grado - 1, -1):
+        if resto >> bit & 1:
+            resto ^= generador << (bit - grado)
+    return datos << grado | resto
+
+
+def multiplicar_gf(a: int, b: int) -> int:
+    producto = 0
+    while b:
+        if b & 1:
+            producto ^= a
+        a <<= 1
+        if a & 0x100:
+            a ^= 0x11D
+        b >>= 1
+    return producto
+
+
+def sindromes(bloque, ecc: int):
+    """Valor del bloque (datos + corrección) en α^0..α^(ecc-1): todos 0 si no hay errores"""
+    resultado = []
+    raiz = 1
+    for _ in range(ecc):
+        valor = 0
+        for palabra in bloque:
+            valor = multiplicar_gf(valor, raiz) ^ palabra
+        resultado.append(valor)
+        raiz = multiplicar_gf(raiz, 2)
+    return resultado
+
+
+def posiciones_formato(lado: int):
+    """Las dos copias de los 15 bits de formato, del más significativo al menos"""
+    alrededor = [(8, j) for j in (0, 1, 2, 3, 4, 5, 7, 8)] + [(i, 8) for i in (7, 5, 4, 3, 2, 1, 0)]
+    partido = [(lado - 1 - i, 8) for i in range(7)] + [(8, lado - 8 + j) for j in range(8)]
+    return alrededor, partido
+
+
+FORMATOS_QR = {bch(datos, 0x537, 10) ^ 0x5412: datos for datos in range(32)}
+
+
+def reservados_qr(version: int):
+    """Módulos de función (no de datos) de una versión, como conjunto de (fila, columna)"""
+    lado = 17 + 4 * version
+    reservados = set()
+    for filas, columnas in ((range(9), range(9)), (range(9), range(lado - 8, lado)), (range(lado - 8, lado), range(9))):
+        reservados |= {(i, j) for i in filas for j in columnas}
+    reservados |= {(6, k) for k in range(lado)} | {(k, 6) for k in range(lado)}
+    centros = ALINEACION_QR[version]
+    for ci in centros:
+        for cj in centros:
+            if (ci, cj) in ((6, 6), (6, centros[-1]), (centros[-1], 6)):
+                continue
+            reservados |= {(ci + di, cj + dj) for di in range(-2, 3) for dj in range(-2, 3)}
+    if version >= 7:
+        for a in range(6):
+            for b in range(lado - 11, lado - 8):
+                reservados |= {(a, b), (b, a)}
+    return reservados
+
+
+def decodificar_qr(modulos) -> str:
+    """Texto de un QR en modo byte; AssertionError si el formato, la corrección o los datos no cierran"""
+    matriz = matriz_modulos(modulos)
+    lado = len(matriz)
+    version = (lado - 17) // 4
+    assert lado == 17 + 4 * version and version in BLOQUES_QR_M
+
+    def bit(i, j):
+        return 1 if matriz[i][j] else 0
+
+    # Formato: las dos copias (15 bits, el primero el más significativo) deben coincidir
+    alrededor, partido = posiciones_formato(lado)
+    primera = int(''.join(str(bit(i, j)) for i, j in alrededor), 2)
+    segunda = int(''.join(str(bit(i, j)) for i, j in partido), 2)
+    assert primera == segunda
+    assert bit(lado - 8, 8) == 1, "falta el módulo oscuro fijo"
+    datos_formato = FORMATOS_QR[primera]
+    assert datos_formato >> 3 == 0b00, "el nivel de corrección no es M"
+    mascara = MASCARAS_QR[datos_formato & 7]
+
+    if version >= 7:
+        esperado = bch(version, 0x1F25, 12)
+        leido = sum(bit(k // 3, lado - 11 + k % 3) << k for k in range(18))
+        assert leido == esperado
+
+    # Bits de datos en zigzag, de a dos columnas desde la derecha, salteando la columna 6
+    reservados = reservados_qr(version)
+    bits = []
+    derecha = lado - 1
+    subiendo = True
+    while derecha > 0:
+        if derecha == 6:
+            derecha -= 1
+        for i in (range(lado - 1, -1, -1) if subiendo else range(lado)):
+            for j in (derecha, derecha - 1):
+                if (i, j) not in reservados:
+                    bits.append(bit(i, j) ^ mascara(i, j))
+        derecha -= 2
+        subiendo = not subiendo
+
+    ecc, grupos = BLOQUES_QR_M[version]
+    largos = [largo for cantidad, largo in grupos for _ in range(cantidad)]
+    total = sum(largos) + ecc * len(largos)
+    assert len(bits) // 8 == total
+    palabras = [int(''.join(map(str, bits[k:k + 8])), 2) for k in range(0, total * 8, 8)]
+
+    # Desintercalado: primero los datos de todos los bloques, después la corrección
+    bloques = [[] for _ in largos]
+    posicion = 0
+    for k in range(max(largos)):
+        for bloque, largo in zip(bloques, largos):
+            if k < largo:
+                bloque.append(palabras[posicion])
+                posicion += 1
+    for _ in range(ecc):
+        for bloque in bloques:
+            bloque.append(palabras[posicion])
+            posicion += 1
+    for bloque in bloques:
+        assert sindromes(bloque, ecc) == [0] * ecc
+
+    datos = [palabra for bloque, largo in zip(bloques, largos) for palabra in bloque[:largo]]
+    flujo = ''.join(f"{palabra:08b}" for palabra in datos)
+    assert flujo[:4] == '0100', "no está en modo byte"
+    largo_cuenta = 8 if version <= 9 else 16
+    cantidad = int(flujo[4:4 + largo_cuenta], 2)
+    inicio = 4 + largo_cuenta
+    contenido = bytes(int(flujo[inicio + 8 * k:inicio + 8 * k + 8], 2) for k in range(cantidad))
+    fin = inicio + 8 * cantidad
+    assert set(flujo[fin:fin + 4]) <= {'0'}, "falta el terminador"
+    relleno = datos[(fin + 4 + 7) // 8:]
+    assert relleno == [(0xEC, 0x11)[k % 2] for k in range(len(relleno))]
+    return contenido.decode('utf-8')
+
+
+@pytest.mark.parametrize('codigo, version', [
+    ('A', 1),
+    ('https://example.com/p/1', 2),
+    ('Ñandú 100 ml · Eau de Parfum', 3),
+    ('x' * 62, 4),
+    ('SILK-' * 24, 7),
+    ('SILK-' * 30, 8),
+    ('0123456789' * 21, 10),
+    ('https://silk.example/p?' + 'q' * 227, 11),
+    ('ü' * 170, 14),
+])
+def test_qr_ida_y_vuelta(codigo, version):
+    modulos = simbologias.codificar_codigo(codigo, 'qr')
+    assert modulos.ancho == modulos.filas == 17 + 4 * version
+    assert decodificar_qr(modulos) == codigo
+
+
+def test_qr_el_decodificador_detecta_un_modulo_cambiado():
+    # Sin esta comprobación, un decodificador que no verificara nada pasaría las pruebas de arriba
+    modulos = simbologias.codificar_codigo('https://example.com/p/1', 'qr')
+    matriz = matriz_modulos(modulos)
+    matriz[-1][-1] = not matriz[-1][-1]
+    with pytest.raises(AssertionError):
+        decodificar_qr(modulos_de_matriz(matriz))
+
+
+def penalizacion_qr(matriz) -> int:
+    """Penalización de la norma (sección 7.8.3), contada directamente sobre la matriz"""
+    lado = len(matriz)
+    lineas = [''.join('1' if m else '0' for m in fila) for fila in matriz]
+    lineas += [''.join(linea[j] for linea in lineas[:lado]) for j in range(lado)]
+    puntos = 0
+    for linea in lineas:
+        inicio = 0
+        for k in range(1, lado + 1):
+            if k == lado or linea[k] != linea[inicio]:
+                if k - inicio >= 5:
+                    puntos += 3 + (k - inicio - 5)
+                inicio = k
+        for patron in ('10111010000', '00001011101'):
+            puntos += 40 * sum(linea.startswith(patron, k) for k in range(lado))
+    for i in range(lado - 1):
+        for j in range(lado - 1):
+            if matriz[i][j] == matriz[i][j + 1] == matriz[i + 1][j] == matriz[i + 1][j + 1]:
+                puntos += 3
+    oscuros = sum(map(sum, matriz))
+    puntos += abs(oscuros * 100 // (lado * lado) - 50) // 5 * 10
+    return puntos
+
+
+def con_otra_mascara(matriz, version: int, actual: int, nueva: int):
+    """La misma matriz con la máscara `nueva` en lugar de `actual` (datos y formato)"""
+    lado = len(matriz)
+    reservados = reservados_qr(version)
+    otra = [fila[:] for fila in matriz]
+    for i in range(lado):
+        for j in range(lado):
+            if (i, j) not in reservados and MASCARAS_QR[actual](i, j) != MASCARAS_QR[nueva](i, j):
+                otra[i][j] = not otra[i][j]
+    formato = f"{bch(nueva, 0x537, 10) ^ 0x5412:015b}"
+    for posiciones in posiciones_formato(lado):
+        for (i, j), valor in zip(posiciones, formato):
+            otra[i][j] = valor == '1'
+    return otra
+
+
+@pytest.mark.parametrize('codigo', ['A', 'https://example.com/p/1', 'SILK-' * 30])
+def test_qr_elige_la_mascara_de_menor_penalizacion(codigo):
+    modulos = simbologias.codificar_codigo(codigo, 'qr')
+    matriz = matriz_modulos(modulos)
+    version = (modulos.ancho - 17) // 4
+    alrededor, _ = posiciones_formato(modulos.ancho)
+    actual = FORMATOS_QR[int(''.join('1' if matriz[i][j] else '0' for i, j in alrededor), 2)] & 7
+
+    alternativas = [con_otra_mascara(matriz, version, actual, mascara) for mascara in range(8)]
+    penalizaciones = [penalizacion_qr(alternativa) for alternativa in alternativas]
+    assert penalizaciones[actual] == min(penalizaciones)
+    # Las otras siete también son símbolos válidos: solo cambia la legibilidad
+    for alternativa in alternativas:
+        assert decodificar_qr(modulos_de_matriz(alternativa)) == codigo
+
+
+def test_qr_demasiado_largo():
+    with pytest.raises(ValueError):
+        simbologias.SIMBOLOGIAS['qr'].normalizar('x' * 3000)
+
+
+def test_qr_con_zona_silenciosa_de_cuatro_modulos():
+    config = aplicacion.LabelConfig.BARCODE_CONFIG
+    modulos = simbologias.codificar_codigo('https://example.com/p/1', 'qr')
+    geometria = aplicacion.generar_barcode_vectorial('https://example.com/p/1', 'qr')
+    margen = min(min(x for x, _, _, _ in geometria['barras']), min(y for _, y, _, _ in geometria['barras']))
+    assert margen >= 4 * config['module_width'] - 1e-9
+    assert geometria['ancho'] >= (modulos.ancho + 8) * config['module_width'] - 1e-9
+
+    # En la impresora térmica, el símbolo y su zona silenciosa entran en el cuadrado de la etiqueta
+    layout = aplicacion.obtener_layout()
+    producto = {'codigo': 'https://example.com/p/1', 'simbologia': 'qr', 'nombre_producto': 'X', 'cantidad': 1}
+    termica = aplicacion.geometria_termica_personalizada(producto, layout)
+    dx, _, lado = aplicacion.caja_codigo_personalizado(layout.label_width, layout.label_height)
+    x_caja, lado_caja = aplicacion.a_puntos_termica(dx), aplicacion.a_puntos_termica(lado)
+    assert termica['x'] - x_caja >= 4 * termica['modulo']
+    assert x_caja + lado_caja - termica['x'] - modulos.ancho * termica['modulo'] >= 4 * termica['modulo']
+
+
+# Registro
+
+def test_simbologia_desconocida():
+    with pytest.raises(ValueError):
+        simbologias.obtener_simbologia('pdf417')
+    with pytest.raises(ValueError):
+        simbologias.codificar_codigo('123', 'pdf417')
+    assert simbologias.obtener_simbologia('').nombre == simbologias.SIMBOLOGIA_DEFECTO
+    assert simbologias.obtener_simbologia(None).nombre == simbologias.SIMBOLOGIA_DEFECTO
+
+
+def test_simbologia_sin_codificar_no_se_puede_instanciar():
+    class Incompleta(simbologias.Simbologia):
+        nombre = 'incompleta'
+
+    with pytest.raises(TypeError):
+        Incompleta()
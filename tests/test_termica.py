@@ -0,0 +1,32 @@
+"""Salida para impresoras térmicas: ZPL y EPL"""
+from conftest import generar, nombre_adjunto
+
+
+def test_zpl(cliente):
+    respuesta = generar(cliente, [
+        {'sku': 'ZPL-1', 'codigo': 'SILK_01^A', 'cantidad': 3},
+        {'sku': 'ZPL-2', 'codigo': '400638133393', 'cantidad': 1, 'simbologia': 'ean13'},
+    ], formato='zpl')
+    assert respuesta.status_code == 200
+    assert nombre_adjunto(respuesta).endswith('.zpl')
+    zpl = respuesta.data.decode('utf-8')
+    assert zpl.count('^XA') == zpl.count('^XZ') == 2
+    assert '^BCN' in zpl and '^BEN' in zpl
+    # Los caracteres de control de ZPL van escapados con ^FH
+    assert '^FDSILK_5F01_5EA^FS' in zpl
+    assert '^PQ3' in zpl and '^PQ1' in zpl
+
+
+def test_epl(cliente):
+    respuesta = generar(cliente, [
+        {'nombre_producto': 'Colonia Ñandú', 'valor': '12.990', 'cantidad': 4},
+    ], tipo_etiqueta='personalizado', formato='epl')
+    assert respuesta.status_code == 200
+    assert nombre_adjunto(respuesta).endswith('.epl')
+    epl = respuesta.data.decode('cp850')
+    lineas = epl.split('\r\n')
+    assert lineas[0] == 'I8,1,001'
+    assert 'N' in lineas and 'P4' in lineas
+    # Texto en mayúsculas y en la página de códigos 850, con acentos y eñes
+    assert '"COLONIA ÑANDÚ"' in epl
+    assert '"$12.990"' in epl
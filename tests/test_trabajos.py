@@ -0,0 +1,33 @@
+"""Trabajos en segundo plano: estado compartido en SQLite y trabajos perdidos"""
+from conftest import aplicacion
+
+
+def test_estado_visible_desde_otro_gestor(codigo_unico):
+    # Otro worker de gunicorn tiene su propio gestor, pero lee el mismo registro
+    registro = aplicacion.gestor_trabajos.registro
+    assert registro is not None
+    productos = [{'sku': 'REG-1', 'codigo': codigo_unico(), 'cantidad': 2, 'simbologia': 'code128',
+                  'tipo': 'codigo_barras'}]
+    trabajo = aplicacion.gestor_trabajos.ejecutar(productos, 'codigo_barras', None, False, 'pdf', 'pruebas')
+    assert trabajo.estado == 'completado'
+
+    otro = aplicacion.GestorTrabajos(1, registro=aplicacion.RegistroTrabajos(registro.ruta_db, registro.ttl))
+    restaurado = otro.obtener(trabajo.id)
+    assert restaurado is not None
+    assert restaurado.estado == 'completado'
+    assert restaurado.etiquetas_generadas == 2
+    assert [pdf['nombre_archivo'] for pdf in restaurado.pdfs] == [pdf['nombre_archivo'] for pdf in trabajo.pdfs]
+
+
+def test_trabajo_perdido_no_se_vuelve_a_encolar(cliente, monkeypatch):
+    encolados = []
+    monkeypatch.setattr(aplicacion.gestor_trabajos, 'encolar', lambda *args, **kwargs: encolados.append(args))
+    with cliente.session_transaction() as sesion:
+        sesion['tipo_etiqueta'] = 'codigo_barras'
+        sesion['productos'] = [{'sku': 'A1', 'codigo': '123', 'cantidad': 1, 'tipo': 'codigo_barras'}]
+        sesion['trabajo_id'] = 'trabajo-que-no-existe'
+
+    respuesta = cliente.get('/generar-etiquetas')
+    assert respuesta.status_code == 200
+    assert 'ya no está disponible' in respuesta.get_data(as_text=True)
+    assert encolados == []
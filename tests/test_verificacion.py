@@ -0,0 +1,81 @@
+"""Verificación previa de lotes: límites, SKUs repetidos y todos los errores en una sola respuesta"""
+import io
+
+from conftest import aplicacion, generar
+
+CODIGO_LARGO = 'SILK-' * 12
+
+
+def producto(sku: str, codigo: str = '123456', cantidad: int = 1) -> dict:
+    return {'sku': sku, 'codigo': codigo, 'cantidad': cantidad, 'simbologia': 'code128', 'tipo': 'codigo_barras'}
+
+
+def test_limites_de_etiquetas_paginas_y_tamaño(monkeypatch):
+    lote = [producto('A1', cantidad=30), producto('A2', cantidad=30)]
+    assert aplicacion.verificar_lote(lote, 'codigo_barras') == []
+
+    monkeypatch.setattr(aplicacion.LabelConfig, 'MAX_ETIQUETAS_LOTE', 59)
+    monkeypatch.setattr(aplicacion.LabelConfig, 'MAX_PAGINAS_LOTE', 1)
+    monkeypatch.setattr(aplicacion.LabelConfig, 'MAX_BYTES_LOTE', 1000)
+    errores = aplicacion.verificar_lote(lote, 'codigo_barras')
+    assert len(errores) == 3
+    assert '60 etiquetas' in errores[0]
+    assert 'páginas' in errores[1] and 'MB' in errores[2]
+
+    # ZPL/EPL no tiene páginas
+    errores = aplicacion.verificar_lote(lote, 'codigo_barras', formato='zpl')
+    assert not any('páginas' in error for error in errores)
+
+
+def test_sku_repetido_y_codigo_ilegible():
+    lote = [producto('A1'), producto('A2', CODIGO_LARGO), producto('A1')]
+    errores = aplicacion.verificar_lote(lote, 'codigo_barras')
+    assert errores == [
+        "El código de barras del producto 2 es demasiado largo para una etiqueta de "
+        f"{aplicacion.obtener_layout(None).medidas_etiqueta}: no sería legible.",
+        "El SKU del producto 3 está repetido (producto 1).",
+    ]
+    # Con los números de fila de origen
+    errores = aplicacion.verificar_lote(lote, 'codigo_barras', numeros=[4, 7, 9])
+    assert 'producto 7' in errores[0] and 'producto 9' in errores[1] and 'producto 4' in errores[1]
+
+
+def test_api_errores_de_filas_y_de_lote_juntos(cliente):
+    respuesta = generar(cliente, [
+        {'sku': 'A1', 'codigo': '123', 'cantidad': 0},
+        {'sku': 'A2', 'codigo': CODIGO_LARGO, 'cantidad': 1},
+    ])
+    assert respuesta.status_code == 400
+    errores = respuesta.get_json()['errores']
+    assert len(errores) == 2
+    assert 'producto 1' in errores[0]
+    assert 'producto 2' in errores[1] and 'demasiado largo' in errores[1]
+
+
+def test_asistente_errores_de_filas_y_de_lote_juntos(cliente):
+    with cliente.session_transaction() as sesion:
+        sesion['tipo_etiqueta'] = 'codigo_barras'
+        sesion['num_productos'] = 2
+    respuesta = cliente.post('/ingresar-productos', data={
+        'sku_0': '', 'codigo_0': '123', 'cantidad_0': '1',
+        'sku_1': 'A2', 'codigo_1': CODIGO_LARGO, 'cantidad_1': '1',
+    })
+    assert respuesta.status_code == 200
+    pagina = respuesta.get_data(as_text=True)
+    assert 'El SKU del producto 1 es obligatorio.' in pagina
+    assert 'El código de barras del producto 2 es demasiado largo' in pagina
+    with cliente.session_transaction() as sesion:
+        assert 'productos' not in sesion
+
+
+def test_importacion_numera_por_fila_del_archivo(cliente):
+    csv = f"sku,codigo,cantidad\nA1,123,1\nA2,123,x\nA3,{CODIGO_LARGO},1\n"
+    respuesta = cliente.post('/importar-productos', data={
+        'tipo_etiqueta': 'codigo_barras', 'archivo': (io.BytesIO(csv.encode('utf-8')), 'lote.csv'),
+    })
+    assert respuesta.status_code == 302
+    with cliente.session_transaction() as sesion:
+        mensajes = [mensaje for _, mensaje in sesion['_flashes']]
+    assert len(mensajes) == 2
+    assert 'producto 3' in mensajes[0]
+    assert 'producto 4' in mensajes[1] and 'demasiado largo' in mensajes[1]
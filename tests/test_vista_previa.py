@@ -0,0 +1,55 @@
+"""Vistas previas PNG: compartidas entre workers a través de los archivos junto al PDF"""
+import os
+
+import pytest
+
+from conftest import aplicacion
+
+
+@pytest.fixture
+def otro_worker(monkeypatch):
+    """Cachés del proceso vacías, como las de un worker que no generó el archivo"""
+    def reiniciar():
+        monkeypatch.setattr(aplicacion, 'descriptores_vista_previa', aplicacion.CacheLRU(1024 * 1024))
+        monkeypatch.setattr(aplicacion, 'cache_vistas_previas', aplicacion.CacheLRU(1024 * 1024))
+    return reiniciar
+
+
+def generar_pdf(codigo: str, cantidad: int) -> str:
+    productos = [{'sku': 'VP-1', 'codigo': codigo, 'cantidad': cantidad, 'simbologia': 'code128',
+                  'tipo': 'codigo_barras'}]
+    trabajo = aplicacion.gestor_trabajos.ejecutar(productos, 'codigo_barras', None, False, 'pdf', 'pruebas')
+    assert trabajo.estado == 'completado'
+    assert trabajo.pdfs[0]['vista_previa']
+    return trabajo.pdfs[0]['nombre_archivo']
+
+
+def test_vista_previa_desde_otro_worker(cliente, otro_worker, codigo_unico):
+    nombre = generar_pdf(codigo_unico(), 3)
+    assert os.path.isfile(aplicacion.ruta_vista_previa(nombre, 'vista.json'))
+
+    otro_worker()
+    respuesta = cliente.get(f"/vista-previa/{nombre}?ancho=120")
+    assert respuesta.status_code == 200
+    assert respuesta.data.startswith(b'\x89PNG')
+    ruta_png = aplicacion.ruta_vista_previa(nombre, 'vista-1-120.png')
+    with open(ruta_png, 'rb') as f:
+        assert f.read() == respuesta.data
+
+    # Sin la miniatura en disco ni en memoria, se vuelve a dibujar desde el descriptor
+    otro_worker()
+    os.remove(ruta_png)
+    segunda = cliente.get(f"/vista-previa/{nombre}?ancho=120")
+    assert segunda.status_code == 200
+    assert segunda.data == respuesta.data
+
+    assert cliente.get(f"/vista-previa/{nombre}?pagina=2").status_code == 404
+    assert cliente.get('/vista-previa/0123456789ab_no_existe.pdf').status_code == 404
+
+
+def test_vista_previa_se_borra_con_su_lote(cliente, codigo_unico):
+    nombre = generar_pdf(codigo_unico(), 1)
+    assert cliente.get(f"/vista-previa/{nombre}").status_code == 200
+    lote = aplicacion.lote_archivo(nombre)
+    aplicacion.gestor_artefactos.eliminar_lote(lote)
+    assert not [archivo for archivo in os.listdir('pdfs_generados') if archivo.startswith(lote)]
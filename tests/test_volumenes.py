@@ -0,0 +1,77 @@
+"""Tiradas grandes en volúmenes: cortes en fin de página y nombres _volNN"""
+import os
+import re
+
+import pytest
+
+from conftest import aplicacion
+
+
+@pytest.fixture
+def layout(monkeypatch):
+    """Volúmenes de dos páginas del perfil por defecto"""
+    monkeypatch.setattr(aplicacion.LabelConfig, 'PAGINAS_POR_VOLUMEN', 2)
+    os.makedirs('pdfs_generados', exist_ok=True)
+    return aplicacion.obtener_layout()
+
+
+def cantidades(productos, layout):
+    return [[(p['sku'], p['cantidad']) for p in volumen]
+            for volumen in aplicacion.dividir_en_volumenes(productos, layout)]
+
+
+def paginas(ruta) -> int:
+    with open(ruta, 'rb') as f:
+        return len(re.findall(rb'/Type /Page\b', f.read()))
+
+
+def test_cortes_en_el_limite(layout):
+    capacidad = 2 * layout.por_pagina
+    assert cantidades([{'sku': 'A', 'cantidad': capacidad}], layout) == [[('A', capacidad)]]
+    assert cantidades([{'sku': 'A', 'cantidad': capacidad + 1}], layout) == [[('A', capacidad)], [('A', 1)]]
+    # Un producto que cruza el límite se parte; el siguiente volumen sigue donde quedó
+    assert cantidades([{'sku': 'A', 'cantidad': capacidad - 10}, {'sku': 'B', 'cantidad': 30},
+                       {'sku': 'C', 'cantidad': 5}], layout) == [
+        [('A', capacidad - 10), ('B', 10)],
+        [('B', 20), ('C', 5)],
+    ]
+
+
+def test_sin_limite_un_solo_volumen(layout, monkeypatch):
+    monkeypatch.setattr(aplicacion.LabelConfig, 'PAGINAS_POR_VOLUMEN', 0)
+    productos = [{'sku': 'A', 'cantidad': layout.por_pagina * 50}]
+    assert cantidades(productos, layout) == [[('A', layout.por_pagina * 50)]]
+
+
+def test_nombres_por_producto(layout, codigo_unico):
+    grande = {'sku': 'GRANDE', 'codigo': codigo_unico(), 'cantidad': layout.por_pagina * 4 + 1,
+              'simbologia': 'code128', 'tipo': 'codigo_barras'}
+    chico = dict(grande, sku='CHICO', codigo=codigo_unico(), cantidad=3)
+    resultados = aplicacion.generar_pdfs_codigo_barras([grande, chico], 'lotevol1')
+
+    assert [r['nombre_archivo'] for r in resultados] == [
+        f"lotevol1_GRANDE_{grande['codigo']}_etiquetas_vol01.pdf",
+        f"lotevol1_GRANDE_{grande['codigo']}_etiquetas_vol02.pdf",
+        f"lotevol1_GRANDE_{grande['codigo']}_etiquetas_vol03.pdf",
+        f"lotevol1_CHICO_{chico['codigo']}_etiquetas.pdf",
+    ]
+    assert [r['titulo'] for r in resultados] == ['GRANDE (vol. 1)', 'GRANDE (vol. 2)', 'GRANDE (vol. 3)', 'CHICO']
+    assert [r['cantidad'] for r in resultados] == [layout.por_pagina * 2, layout.por_pagina * 2, 1, 3]
+    assert [paginas(r['archivo']) for r in resultados] == [2, 2, 1, 1]
+
+
+def test_nombres_empaquetado(layout, codigo_unico):
+    productos = [{'sku': f"PAQ-{i}", 'codigo': codigo_unico(), 'cantidad': layout.por_pagina * 2,
+                  'simbologia': 'code128', 'tipo': 'codigo_barras'} for i in range(2)]
+    productos[1]['cantidad'] += 1
+    resultados = aplicacion.generar_pdfs_combinados(productos, 'codigo_barras', layout, 'lotevol2')
+
+    assert [re.sub(r'_\d{8}_\d{6}', '', r['nombre_archivo']) for r in resultados] == [
+        'lotevol2_etiquetas_codigo_barras_vol01.pdf',
+        'lotevol2_etiquetas_codigo_barras_vol02.pdf',
+        'lotevol2_etiquetas_codigo_barras_vol03.pdf',
+    ]
+    assert [r['titulo'] for r in resultados] == [
+        f'Etiquetas Código de Barras (vol. {n} de 3)' for n in (1, 2, 3)]
+    assert [r['productos_count'] for r in resultados] == [1, 1, 1]
+    assert [paginas(r['archivo']) for r in resultados] == [2, 2, 1]